@@ -1,46 +1,82 @@
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, Optional
 
-import streamlit as st
-import google.generativeai as genai
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import tempfile
-import datetime as dt
+from report_schema import REPORT_SCHEMA, parse_report_json, preview_partial_json, report_to_markdown
+from services.llm import ModelClient, get_model_client
+from services.pdf import render_report_pdf
+
+
+# Bump whenever the prompts change so cached reports are not reused.
+PROMPT_VERSION = 2
+
+STRUCTURED_CONFIG = {"response_mime_type": "application/json", "response_schema": REPORT_SCHEMA}
+
+LANGUAGE_NAMES = {"tr": "Turkish", "en": "English"}
 
 
 class ReportGenerator:
-    def __init__(self) -> None:
-        api_key = st.secrets.get("gemini", {}).get("api_key")
-        if not api_key:
-            raise RuntimeError("Gemini API anahtarı bulunamadı. secrets.toml dosyasını doldurun.")
-        genai.configure(api_key=api_key)
-        self.gemini_model = genai.GenerativeModel("gemini-2.5-flash")
+    uses_model = True
+
+    def __init__(self, client: Optional[ModelClient] = None, lang: str = "tr") -> None:
+        # The client is process-wide: constructing a generator per click is cheap.
+        self.client = client or get_model_client()
+        self.model_name = self.client.model_name
+        self.lang = lang
 
     def _create_prompt(self, user_data: Dict[str, Any], report_type: str) -> str:
         return (
             "You are an expert neurocognitive analyst. Create a concise, structured "
-            f"{report_type} report using the provided JSON data. "
-            "Use headings, bullet points, and short paragraphs."
+            f"{report_type} report in {LANGUAGE_NAMES.get(self.lang, 'Turkish')} using the provided JSON data. "
+            "Return JSON with: sections (title + short markdown body, bullet points allowed), "
+            "insights (one-sentence findings), riskFlags (label + severity low/medium/high) "
+            "and recommendations (actionable, one sentence each)."
             "\n\nUSER_DATA:\n" + str(user_data)
         )
 
-    def generate_report_text(self, user_data: Dict[str, Any], report_type: str) -> str:
+    def _create_commentary_prompt(self, user_data: Dict[str, Any], report_type: str) -> str:
+        return (
+            "You are an expert neurocognitive analyst. In "
+            f"{LANGUAGE_NAMES.get(self.lang, 'Turkish')}, write a short interpretive commentary "
+            f"(at most three paragraphs, no headings) for a {report_type} report on the provided JSON data."
+            "\n\nUSER_DATA:\n" + str(user_data)
+        )
+
+    def stream_report_text(self, user_data: Dict[str, Any], report_type: str, timeout: Optional[float] = None) -> Iterator[str]:
+        """Yield raw JSON chunks of the structured report as Gemini produces them."""
         prompt = self._create_prompt(user_data, report_type)
-        resp = self.gemini_model.generate_content(prompt)
-        return resp.text or "Report generation failed."
-
-    def generate_pdf(self, report_text: str) -> str:
-        fd, path = tempfile.mkstemp(prefix="neuroai_report_", suffix=".pdf")
-        c = canvas.Canvas(path, pagesize=A4)
-        width, height = A4
-        text_obj = c.beginText(40, height - 60)
-        text_obj.setFont("Helvetica", 11)
-        for line in report_text.splitlines() or [""]:
-            for chunk in [line[i:i+100] for i in range(0, len(line), 100)]:
-                text_obj.textLine(chunk)
-        text_obj.textLine("")
-        text_obj.textLine(f"Generated at: {dt.datetime.utcnow().isoformat()}Z")
-        c.drawText(text_obj)
-        c.showPage()
-        c.save()
-        return path
\ No newline at end of file
+        yield from self.client.stream(prompt, timeout=timeout, generation_config=STRUCTURED_CONFIG)
+
+    def stream_commentary(self, user_data: Dict[str, Any], report_type: str, timeout: Optional[float] = None) -> Iterator[str]:
+        prompt = self._create_commentary_prompt(user_data, report_type)
+        yield from self.client.stream(prompt, timeout=timeout)
+
+    def preview(self, raw: str) -> str:
+        return preview_partial_json(raw)
+
+    def finalize(self, user_data: Dict[str, Any], report_type: str, raw: str) -> Dict[str, Any]:
+        """Validate the streamed output; raises ValueError if it does not match the schema."""
+        return parse_report_json(raw)
+
+    def generate_report(self, user_data: Dict[str, Any], report_type: str) -> Dict[str, Any]:
+        prompt = self._create_prompt(user_data, report_type)
+        return self.finalize(user_data, report_type, self.client.generate(prompt, generation_config=STRUCTURED_CONFIG))
+
+    def generate_report_text(self, user_data: Dict[str, Any], report_type: str) -> str:
+        return report_to_markdown(self.generate_report(user_data, report_type), self.lang)
+
+    def generate_pdf(self, report_text: str) -> bytes:
+        return render_report_pdf(report_text)
+
+
+REPORT_ENGINES = ("template", "hybrid", "gemini")
+
+
+def build_report_generator(engine: str = "gemini", lang: str = "tr") -> Any:
+    """`template`: local metrics only; `hybrid`: template + Gemini commentary;
+    `gemini`: the full LLM report."""
+    from report_engine import TemplateReportGenerator
+
+    if engine == "template":
+        return TemplateReportGenerator(lang)
+    if engine == "hybrid":
+        return TemplateReportGenerator(lang, enrich_with=ReportGenerator(lang=lang))
+    return ReportGenerator(lang=lang)
@@ -1,10 +1,59 @@
+import time
+import requests
 import streamlit as st
 from typing import Any, Dict
 from services.firebase import get_pyrebase_auth, get_firestore_client
+from services.identity import AuthError, get_token_verifier
+from services.cache import get_cache
+from services.profile import cache_profile
+from services.tracing import span
 from google.cloud import firestore as gfs
 import datetime as dt
 
 
+# ID tokens live an hour; refresh this long before they expire.
+REFRESH_AHEAD_SECONDS = 300
+
+
+def _store_tokens(tokens: Dict[str, Any]) -> None:
+    # Verified once here; later reruns only compare `exp` with the clock.
+    claims = get_token_verifier().verify(tokens["idToken"])
+    st.session_state.auth_tokens = {
+        "idToken": tokens["idToken"],
+        "refreshToken": tokens["refreshToken"],
+        "uid": claims["sub"],
+        "exp": claims["exp"],
+    }
+
+
+def _sign_out() -> None:
+    st.session_state.is_authenticated = False
+    st.session_state.user = None
+    st.session_state.auth_tokens = None
+
+
+def ensure_valid_session() -> None:
+    """Called on every rerun: keeps the ID token fresh, signs out if the refresh is rejected."""
+    # Built on the first rerun so a missing project id fails at startup, not at the first login.
+    get_token_verifier()
+    tokens = st.session_state.get("auth_tokens")
+    if not st.session_state.get("is_authenticated") or not tokens:
+        return
+    if tokens["exp"] - time.time() > REFRESH_AHEAD_SECONDS:
+        return
+    try:
+        refreshed = get_pyrebase_auth().refresh(tokens["refreshToken"])
+        _store_tokens(refreshed)
+        if st.session_state.auth_tokens["uid"] != tokens["uid"]:
+            raise AuthError("uid mismatch")
+    except AuthError:
+        _sign_out()
+        st.warning("Oturumunuzun süresi doldu, lütfen tekrar giriş yapın.")
+    except requests.RequestException:
+        # Network trouble or a 5xx says nothing about the session: keep it, the next rerun retries.
+        pass
+
+
 def _set_session_user(uid: str, email: str, profile: Dict[str, Any]) -> None:
     st.session_state.is_authenticated = True
     st.session_state.user = {
@@ -15,7 +64,8 @@ def _set_session_user(uid: str, email: str, profile: Dict[str, Any]) -> None:
     st.session_state.active_page = "Dashboard"
 
 
-def _upsert_user_profile(uid: str, email: str, profile: Dict[str, Any]) -> None:
+def _upsert_user_profile(uid: str, email: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Write the initial user document and return it without server timestamps."""
     db = get_firestore_client()
     user_ref = db.collection("users").document(uid)
     base = {
@@ -28,8 +78,6 @@ def _upsert_user_profile(uid: str, email: str, profile: Dict[str, Any]) -> None:
             "educationLevel": profile.get("educationLevel", "Diğer"),
             "medicalConditions": profile.get("medicalConditions", ""),
             "familyMedicalHistory": profile.get("familyMedicalHistory", ""),
-            "createdAt": gfs.SERVER_TIMESTAMP,
-            "lastLogin": gfs.SERVER_TIMESTAMP,
         },
         "preferences": {
             "theme": profile.get("theme", "light"),
@@ -37,7 +85,10 @@ def _upsert_user_profile(uid: str, email: str, profile: Dict[str, Any]) -> None:
             "dataSharing": bool(profile.get("dataSharing", False)),
         },
     }
-    user_ref.set(base, merge=True)
+    stamped = {**base, "profile": {**base["profile"], "createdAt": gfs.SERVER_TIMESTAMP, "lastLogin": gfs.SERVER_TIMESTAMP}}
+    user_ref.set(stamped, merge=True)
+    get_cache().invalidate("profile", uid)
+    return base
 
 
 def _update_last_login(uid: str) -> None:
@@ -81,7 +132,8 @@ def render_auth_page() -> None:
                     st.error("Email ve şifre zorunludur.")
                 else:
                     user = auth.create_user_with_email_and_password(email_r, password_r)
-                    uid = user.get("localId") or user.get("uid")
+                    uid = user["localId"]
+                    _store_tokens(user)
                     medical = ", ".join([*medical_sel, *( [medical_other] if medical_other else [] )])
                     family = ", ".join([*family_sel, *( [family_other] if family_other else [] )])
                     profile = {
@@ -93,7 +145,7 @@ def render_auth_page() -> None:
                         "medicalConditions": medical,
                         "familyMedicalHistory": family,
                     }
-                    _upsert_user_profile(uid, email_r, profile)
+                    cache_profile(uid, _upsert_user_profile(uid, email_r, profile))
                     _set_session_user(uid, email_r, profile)
                     st.success("Kayıt başarılı. Yönlendiriliyorsunuz…")
                     st.rerun()
@@ -112,23 +164,29 @@ def render_auth_page() -> None:
         with colA:
             if st.button("Giriş Yap", type="primary"):
                 try:
-                    user = auth.sign_in_with_email_and_password(email, password)
-                    uid = user.get("localId") or user.get("uid")
-                    db = get_firestore_client()
-                    doc = db.collection("users").document(uid).get()
-                    profile = {}
-                    if doc.exists:
-                        data = doc.to_dict()
-                        profile = data.get("profile", {})
-                    else:
-                        profile = {"firstName": "", "lastName": ""}
-                    _update_last_login(uid)
+                    with span("auth.login") as login_span:
+                        user = auth.sign_in_with_email_and_password(email, password)
+                        uid = user["localId"]
+                        _store_tokens(user)
+                        db = get_firestore_client()
+                        doc = db.collection("users").document(uid).get()
+                        login_span.set_attribute("profile_found", doc.exists)
+                        profile = {}
+                        if doc.exists:
+                            data = doc.to_dict()
+                            profile = data.get("profile", {})
+                            # Later pages read the profile from this session cache.
+                            cache_profile(uid, data)
+                        else:
+                            profile = {"firstName": "", "lastName": ""}
+                            cache_profile(uid, {})
+                        _update_last_login(uid)
                     _set_session_user(uid, email, profile)
                     st.success("Giriş başarılı. Yönlendiriliyorsunuz…")
                     st.rerun()
                 except Exception as e:
                     msg = str(e)
-                    if "EMAIL_NOT_FOUND" in msg or "INVALID_LOGIN_CREDENTIALS" in msg:
+                    if any(code in msg for code in ("EMAIL_NOT_FOUND", "INVALID_PASSWORD", "INVALID_LOGIN_CREDENTIALS")):
                         st.error("Email veya şifre hatalı.")
                     else:
                         st.error(f"Giriş başarısız: {e}")
@@ -0,0 +1,182 @@
+"""Headless monthly report generation for many participants.
+
+    python batch_reports.py --uids u1 u2 --month 2026-09 --out out/2026-09
+    python batch_reports.py --cohort "profile.educationLevel==Lisans" --out out/lisans
+
+Each user runs through collect → Gemini → PDF on a bounded thread pool; the
+Gemini calls share one token bucket. `manifest.json` in the output directory
+records every finished user, so re-running the same command resumes.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ai import PROMPT_VERSION, REPORT_ENGINES, build_report_generator
+from report_schema import report_to_markdown
+from reports import _collect_user_data, _log_report
+from services.firebase import get_firestore_client
+from services.rate_limit import TokenBucket
+from services.report_cache import compute_report_key
+from services.storage import store_report_pdf
+
+
+STAGES = ("collect", "generate", "pdf")
+
+
+def _month_range(month: Optional[str]) -> Tuple[datetime, datetime]:
+    if month:
+        start = datetime.strptime(month, "%Y-%m")
+    else:
+        first_this = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        start = (first_this - timedelta(days=1)).replace(day=1)
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(microseconds=1)
+    return start, end
+
+
+def _parse_value(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def _cohort_uids(expr: str) -> List[str]:
+    field, sep, value = expr.partition("==")
+    if not sep:
+        raise SystemExit("--cohort biçimi: alan==değer (örn. profile.educationLevel==Lisans)")
+    db = get_firestore_client()
+    query = db.collection("users").where(field.strip(), "==", _parse_value(value.strip()))
+    return [d.id for d in query.stream()]
+
+
+class Manifest:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def is_done(self, uid: str) -> bool:
+        entry = self.entries.get(uid, {})
+        return entry.get("status") == "done" and os.path.exists(entry.get("file", ""))
+
+    def record(self, uid: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.entries[uid] = entry
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+
+
+def _run_one(uid: str, args: argparse.Namespace, limiter: TokenBucket,
+             start: datetime, end: datetime) -> Dict[str, Any]:
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    data = _collect_user_data(uid, start, end, args.types)
+    timings["collect"] = time.perf_counter() - t0
+    if not data["results"] and not args.include_empty:
+        return {"status": "skipped", "reason": "no results in range", "timings": timings}
+
+    t1 = time.perf_counter()
+    # Per user: a hybrid generator records whether its commentary was lost.
+    gen = build_report_generator(args.engine, args.lang)
+    if gen.uses_model:
+        limiter.acquire()
+    structured = gen.generate_report(data, args.report_type)
+    if getattr(gen, "degraded", False):
+        # Failed rather than done, so re-running the command retries this user.
+        raise RuntimeError("Gemini yorumu alınamadı")
+    timings["generate"] = time.perf_counter() - t1
+
+    t2 = time.perf_counter()
+    pdf_key, pdf_url, pdf = store_report_pdf(report_to_markdown(structured, args.lang), gen.generate_pdf)
+    path = os.path.join(args.out, f"{uid}_{args.report_type}_{start:%Y-%m}.pdf")
+    with open(path, "wb") as f:
+        f.write(pdf)
+    timings["pdf"] = time.perf_counter() - t2
+
+    if not args.no_log:
+        key = compute_report_key(data, args.report_type, gen.model_name, PROMPT_VERSION)
+        _log_report(uid, args.report_type, structured, key, gen.model_name, start, end, args.types or [], args.lang,
+                    pdf_key, pdf_url)
+    return {"status": "done", "file": path, "results": len(data["results"]), "timings": timings}
+
+
+def _summary(samples: List[Dict[str, float]], done: int, elapsed: float) -> str:
+    lines = [f"done={done} elapsed={elapsed:.1f}s throughput={done / elapsed * 60 if elapsed else 0:.1f} reports/min"]
+    for stage in STAGES:
+        values = [s[stage] for s in samples if stage in s]
+        if values:
+            p50, p95 = np.percentile(values, [50, 95])
+            lines.append(f"{stage:>8}: n={len(values)} mean={np.mean(values):.3f}s p50={p50:.3f}s p95={p95:.3f}s")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="NeuroAI toplu rapor üretimi")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--uids", nargs="+", help="kullanıcı kimlikleri")
+    src.add_argument("--uids-file", help="her satırda bir kullanıcı kimliği")
+    src.add_argument("--cohort", help="users sorgusu: alan==değer")
+    parser.add_argument("--out", required=True, help="PDF ve manifest dizini")
+    parser.add_argument("--month", help="YYYY-MM (varsayılan: geçen ay)")
+    parser.add_argument("--report-type", default="general", choices=["general", "performance", "trend"])
+    parser.add_argument("--engine", default="gemini", choices=REPORT_ENGINES, help="template: Gemini'siz, milisaniyeler")
+    parser.add_argument("--lang", default="tr", choices=["tr", "en"])
+    parser.add_argument("--types", nargs="*", help="test türü filtresi")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate-per-minute", type=float, default=30.0, help="Gemini istek sınırı")
+    parser.add_argument("--include-empty", action="store_true", help="aralıkta sonucu olmayanlar için de rapor üret")
+    parser.add_argument("--no-log", action="store_true", help="reports koleksiyonuna yazma")
+    args = parser.parse_args()
+
+    if args.uids:
+        uids = args.uids
+    elif args.uids_file:
+        with open(args.uids_file, "r", encoding="utf-8") as f:
+            uids = [line.strip() for line in f if line.strip()]
+    else:
+        uids = _cohort_uids(args.cohort)
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = Manifest(os.path.join(args.out, "manifest.json"))
+    pending = [u for u in dict.fromkeys(uids) if not manifest.is_done(u)]
+    start, end = _month_range(args.month)
+    print(f"{len(uids)} kullanıcı, {len(uids) - len(pending)} zaten tamam, aralık {start:%Y-%m-%d}..{end:%Y-%m-%d}")
+
+    limiter = TokenBucket(args.rate_per_minute / 60.0, max(1, args.workers))
+    samples: List[Dict[str, float]] = []
+    done = failed = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="batch-report") as pool:
+        futures = {pool.submit(_run_one, uid, args, limiter, start, end): uid for uid in pending}
+        for future in as_completed(futures):
+            uid = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                entry = {"status": "failed", "error": str(e)}
+            manifest.record(uid, entry)
+            if entry["status"] == "done":
+                done += 1
+                samples.append(entry["timings"])
+            elif entry["status"] == "failed":
+                failed += 1
+                print(f"HATA {uid}: {entry['error']}")
+    print(_summary(samples, done, time.perf_counter() - started))
+    if failed:
+        print(f"{failed} kullanıcı başarısız; komutu tekrar çalıştırmak yalnızca bunları dener.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""In-process stand-ins for Firestore and Identity Toolkit used by the load test.
+
+They cover the subset of the client API this app calls: documents
+(get/set/update, `DELETE_FIELD`), subcollections, `add`, write batches, `Increment`, and
+`where` / `order_by` / `start_after` / `limit` / `stream` / `count` queries,
+including collection-group queries. Install them with `install()`; the Gemini side uses the existing
+`StubBackend`.
+"""
+import base64
+import copy
+import datetime as dt
+import hashlib
+import itertools
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.cloud import firestore as gfs
+
+from services import identity, llm
+from services.firebase import set_firestore_client
+
+
+def _resolve(value: Any) -> Any:
+    if value is gfs.SERVER_TIMESTAMP:
+        return dt.datetime.now(dt.timezone.utc)
+    if isinstance(value, gfs.Increment):
+        return value.value
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v) for v in value]
+    return value
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        elif isinstance(value, gfs.Increment):
+            target[key] = (target.get(key) or 0) + value.value
+        else:
+            target[key] = value
+
+
+def _field(doc: Dict[str, Any], path: str) -> Any:
+    node: Any = doc
+    for part in path.split("."):
+        if not isinstance(node, dict):
+            return None
+        node = node.get(part)
+    return node
+
+
+class Snapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]], path: str = "") -> None:
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+        self.path = path
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class DocumentRef:
+    def __init__(self, db: "InMemoryFirestore", collection: str, doc_id: str) -> None:
+        self.db, self.parent, self.id = db, collection, doc_id
+
+    def collection(self, name: str) -> "CollectionRef":
+        return CollectionRef(self.db, f"{self.parent}/{self.id}/{name}")
+
+    def get(self, transaction: Any = None) -> Snapshot:
+        with self.db.lock:
+            return Snapshot(self.id, copy.deepcopy(self.db.data.get(self.parent, {}).get(self.id)),
+                            f"{self.parent}/{self.id}")
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        with self.db.lock:
+            docs = self.db.data.setdefault(self.parent, {})
+            if merge and self.id in docs:
+                _merge(docs[self.id], copy.deepcopy(data))
+                docs[self.id] = _resolve(docs[self.id])
+            else:
+                docs[self.id] = _resolve(copy.deepcopy(data))
+
+    def update(self, changes: Dict[str, Any]) -> None:
+        with self.db.lock:
+            doc = self.db.data.get(self.parent, {}).get(self.id)
+            if doc is None:
+                raise KeyError(f"{self.parent}/{self.id} yok")
+            for path, value in changes.items():
+                *parents, leaf = path.split(".")
+                node = doc
+                for part in parents:
+                    node = node.setdefault(part, {})
+                if value is gfs.DELETE_FIELD:
+                    node.pop(leaf, None)
+                elif isinstance(value, gfs.Increment):
+                    node[leaf] = (node.get(leaf) or 0) + value.value
+                else:
+                    node[leaf] = _resolve(copy.deepcopy(value))
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "!=": lambda a, b: a is not None and a != b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a is not None and a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(v in a for v in b),
+}
+
+
+class _Count:
+    def __init__(self, value: int) -> None:
+        self.alias, self.value = "count", value
+
+
+class CountQuery:
+    def __init__(self, query: "Query") -> None:
+        self.query = query
+
+    def get(self) -> List[List[_Count]]:
+        return [[_Count(sum(1 for _ in self.query.stream()))]]
+
+
+class Query:
+    def __init__(self, db: "InMemoryFirestore", collection: str, group: bool = False) -> None:
+        self.db = db
+        self.collection = collection
+        self.group = group
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.orders: List[Tuple[str, bool]] = []
+        self.max_docs: Optional[int] = None
+        self.after: Optional[Snapshot] = None
+
+    def _copy(self) -> "Query":
+        q = Query(self.db, self.collection, self.group)
+        q.filters, q.orders, q.max_docs, q.after = list(self.filters), list(self.orders), self.max_docs, self.after
+        return q
+
+    def where(self, field: str, op: str, value: Any) -> "Query":
+        if op not in _OPS:
+            raise ValueError(f"unsupported operator {op!r}; supported: {', '.join(_OPS)}")
+        q = self._copy()
+        q.filters.append((field, op, value))
+        return q
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "Query":
+        q = self._copy()
+        q.orders.append((field, direction == gfs.Query.DESCENDING))
+        return q
+
+    def limit(self, n: int) -> "Query":
+        q = self._copy()
+        q.max_docs = n
+        return q
+
+    def start_after(self, snapshot: Snapshot) -> "Query":
+        q = self._copy()
+        q.after = snapshot
+        return q
+
+    def count(self) -> CountQuery:
+        return CountQuery(self)
+
+    def _documents(self) -> List[Tuple[str, str, Dict[str, Any]]]:
+        if not self.group:
+            return [(f"{self.collection}/{doc_id}", doc_id, doc)
+                    for doc_id, doc in self.db.data.get(self.collection, {}).items()]
+        return [(f"{path}/{doc_id}", doc_id, doc) for path, docs in self.db.data.items()
+                if path.rsplit("/", 1)[-1] == self.collection for doc_id, doc in docs.items()]
+
+    def stream(self) -> Iterator[Snapshot]:
+        with self.db.lock:
+            items = [x for x in self._documents() if all(_OPS[op](_field(x[2], f), v) for f, op, v in self.filters)]
+            items.sort(key=lambda x: x[0])
+            for field, descending in reversed(self.orders):
+                items = [x for x in items if _field(x[2], field) is not None]
+                items.sort(key=lambda x: _field(x[2], field), reverse=descending)
+            if self.after is not None:
+                paths = [x[0] for x in items]
+                items = items[paths.index(self.after.path) + 1:] if self.after.path in paths else []
+            if self.max_docs is not None:
+                items = items[:self.max_docs]
+            snapshots = [Snapshot(doc_id, copy.deepcopy(doc), path) for path, doc_id, doc in items]
+        return iter(snapshots)
+
+
+class CollectionRef(Query):
+    def document(self, doc_id: Optional[str] = None) -> DocumentRef:
+        return DocumentRef(self.db, self.collection, doc_id or f"auto{next(self.db.ids):012d}")
+
+    def add(self, data: Dict[str, Any]) -> Tuple[dt.datetime, DocumentRef]:
+        ref = self.document()
+        ref.set(data)
+        return dt.datetime.now(dt.timezone.utc), ref
+
+
+class WriteBatch:
+    def __init__(self, db: "InMemoryFirestore") -> None:
+        self.db = db
+        self.ops: List[Tuple[str, DocumentRef, Dict[str, Any], bool]] = []
+
+    def set(self, ref: DocumentRef, data: Dict[str, Any], merge: bool = False) -> None:
+        self.ops.append(("set", ref, copy.deepcopy(data), merge))
+
+    def update(self, ref: DocumentRef, changes: Dict[str, Any]) -> None:
+        self.ops.append(("update", ref, copy.deepcopy(changes), False))
+
+    def commit(self) -> None:
+        with self.db.lock:
+            for op, ref, data, merge in self.ops:
+                ref.set(data, merge=merge) if op == "set" else ref.update(data)
+        self.ops = []
+
+
+class Transaction(WriteBatch):
+    """Enough of the client Transaction for `gfs.transactional`: holding the store lock from
+    begin to commit serialises transactions, so they never need the Aborted retry path."""
+
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, db: "InMemoryFirestore") -> None:
+        super().__init__(db)
+        self._id: Optional[bytes] = None
+
+    def _clean_up(self) -> None:
+        self.ops = []
+        self._id = None
+
+    def _begin(self, retry_id: Any = None) -> None:
+        self.db.lock.acquire()
+        self._id = str(next(self.db.ids)).encode()
+
+    def _commit(self) -> List[Any]:
+        try:
+            self.commit()
+        finally:
+            self._id = None
+            self.db.lock.release()
+        return []
+
+    def _rollback(self) -> None:
+        if self._id is not None:
+            self._clean_up()
+            self.db.lock.release()
+
+
+class InMemoryFirestore:
+    def __init__(self) -> None:
+        self.data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+
+    def collection(self, name: str) -> CollectionRef:
+        return CollectionRef(self, name)
+
+    def collection_group(self, name: str) -> Query:
+        return Query(self, name, group=True)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self) -> Transaction:
+        return Transaction(self)
+
+
+def _b64(obj: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+
+
+class FakeIdentityClient:
+    """Accepts any password and mints unsigned, emulator-style ID tokens."""
+
+    def __init__(self, project_id: str, latency_seconds: float = 0.0) -> None:
+        self.project_id = project_id
+        self.latency_seconds = latency_seconds
+        self.emails: Dict[str, str] = {}
+
+    def _tokens(self, email: str) -> Dict[str, Any]:
+        time.sleep(self.latency_seconds)
+        uid = "u" + hashlib.sha1(email.encode()).hexdigest()[:12]
+        self.emails[uid] = email
+        now = int(time.time())
+        claims = {"aud": self.project_id, "iss": f"https://securetoken.google.com/{self.project_id}",
+                  "sub": uid, "iat": now, "exp": now + 3600, "email": email}
+        token = f"{_b64({'alg': 'none', 'typ': 'JWT'})}.{_b64(claims)}."
+        return {"localId": uid, "idToken": token, "refreshToken": f"refresh-{uid}", "expiresIn": "3600"}
+
+    def sign_in(self, email: str, password: str) -> Dict[str, Any]:
+        return self._tokens(email)
+
+    sign_up = sign_in
+
+    def send_password_reset(self, email: str) -> None:
+        pass
+
+    def refresh(self, refresh_token: str) -> Dict[str, Any]:
+        email = self.emails.get(refresh_token.partition("refresh-")[2])
+        if not refresh_token.startswith("refresh-") or email is None:
+            raise identity.AuthError("INVALID_REFRESH_TOKEN")
+        return self._tokens(email)
+
+
+def install(project_id: str, model_client: Any, identity_latency: float = 0.0) -> InMemoryFirestore:
+    """Point the process-wide Firestore, identity and model clients at offline fakes."""
+    db = InMemoryFirestore()
+    set_firestore_client(db)
+    identity._client = FakeIdentityClient(project_id, identity_latency)
+    identity._verifier = identity.TokenVerifier(project_id, emulator=True)
+    llm._client = model_client
+    return db
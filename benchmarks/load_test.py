@@ -0,0 +1,318 @@
+"""Concurrent-session load test of one Streamlit server process, fully offline.
+
+    python -m benchmarks.load_test --concurrency 1 2 4 8 16 --gemini-latency 2.0
+
+Starts a single `streamlit run benchmarks/load_test_app.py` server (app.py with
+Firestore and Identity Toolkit replaced by the in-memory fakes in
+`benchmarks.fakes`, Gemini by `StubBackend`) and drives it over the same
+websocket protocol the browser uses. Each simulated user logs in, runs a full
+Stroop test (5 practice + 20 trials), opens Sonuçlar and generates a report on
+Raporlar; the sessions of one concurrency level run at the same time against
+that one process, so they share its GIL, report queue and caches. For every
+level the harness prints rerun latency percentiles and throughput; a final
+pass measures the server's resident memory per live session.
+"""
+import argparse
+import contextlib
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import requests
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.sync.client import connect
+
+from benchmarks import fakes
+from services import rate_limit
+from services.llm import CircuitBreaker, ModelClient, StubBackend
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+SERVER_SCRIPT = os.path.join(ROOT, "benchmarks", "load_test_app.py")
+PROJECT_ID = "neuroai-loadtest"
+# tests.py draws the Stroop word in its ink colour; the scripted user answers from it.
+INK_BY_HEX = {"#FF0000": "KIRMIZI", "#0000FF": "MAVI", "#00FF00": "YESIL", "#FFFF00": "SARI",
+              "#800080": "MOR", "#000000": "SIYAH"}
+_INK_RE = re.compile(r"color: (#[0-9A-Fa-f]{6}); font-size: 72px")
+_DONE = (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_WITH_COMPILE_ERROR)
+
+
+def server_args(argv: Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gemini-latency", type=float, default=2.0)
+    parser.add_argument("--gemini-first-token", type=float, default=0.3)
+    parser.add_argument("--identity-latency", type=float, default=0.05)
+    return parser.parse_args(argv)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install_fakes_once(args: argparse.Namespace) -> None:
+    """Offline Firestore, identity and Gemini for the server process (first rerun only)."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        client = ModelClient(StubBackend(args.gemini_latency, args.gemini_first_token),
+                             breaker=CircuitBreaker(failure_threshold=1000))
+        fakes.install(PROJECT_ID, client, args.identity_latency)
+        # Scripted users are not abusive; keep the limiter in the path but out of the way.
+        rate_limit._user_limiter = rate_limit.UserRateLimiter(
+            rate_limit.InProcessBucketStore(), {action: (6000.0, 1000) for action in rate_limit.DEFAULT_USER_LIMITS})
+        _installed = True
+
+
+class Server:
+    """One `streamlit run` process serving load_test_app.py on a free local port."""
+
+    def __init__(self, args: argparse.Namespace, startup_timeout: float = 60.0) -> None:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        cmd = [sys.executable, "-m", "streamlit", "run", SERVER_SCRIPT,
+               "--server.headless", "true", "--server.port", str(self.port), "--server.address", "127.0.0.1",
+               "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false", "--",
+               "--gemini-latency", str(args.gemini_latency), "--gemini-first-token", str(args.gemini_first_token),
+               "--identity-latency", str(args.identity_latency)]
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+        self.process = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                if requests.get(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1).ok:
+                    break
+            except requests.RequestException:
+                pass
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError("streamlit sunucusu başlatılamadı")
+            time.sleep(0.2)
+        self.url = f"ws://127.0.0.1:{self.port}/_stcore/stream"
+
+    def rss_bytes(self) -> Optional[int]:
+        try:
+            with open(f"/proc/{self.process.pid}/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def close(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class Session:
+    """One scripted user on its own websocket; every interaction is a timed rerun.
+
+    Like the browser, a rerun carries only the widgets the user changed; the
+    server keeps every other widget's value from the previous run.
+    """
+
+    def __init__(self, url: str, index: int, timeout: float) -> None:
+        self.url = url
+        self.index = index
+        self.timeout = timeout
+        self.ws: Any = None
+        self.query_string = ""
+        # (element type, element proto, in sidebar) of the last finished run, in page order
+        self.elements: List[Tuple[str, Any, bool]] = []
+        self.latencies: List[Tuple[str, float]] = []
+
+    def __enter__(self) -> "Session":
+        self.ws = connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=self.timeout).__enter__()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.ws.__exit__(*exc)
+
+    def _rerun(self, widgets: Sequence[WidgetState]) -> None:
+        """Send one rerun request and read until the script finishes without a pending st.rerun()."""
+        msg = BackMsg()
+        msg.rerun_script.query_string = self.query_string
+        msg.rerun_script.widget_states.widgets.extend(widgets)
+        self.ws.send(msg.SerializeToString())
+        deadline = time.monotonic() + self.timeout
+        elements: List[Tuple[str, Any, bool]] = []
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(self.ws.recv(timeout=max(0.0, deadline - time.monotonic())))
+            kind = fwd.WhichOneof("type")
+            if kind == "new_session":
+                elements = []  # st.rerun() started the script again; only the last run is on screen
+            elif kind == "page_info_changed":
+                self.query_string = fwd.page_info_changed.query_string
+            elif kind == "script_finished" and fwd.script_finished in _DONE:
+                break
+            elif kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                element_type = element.WhichOneof("type")
+                elements.append((element_type, getattr(element, element_type), fwd.metadata.delta_path[0] == 1))
+        self.elements = elements
+
+    def _timed(self, step: str, *widgets: WidgetState) -> None:
+        t0 = time.perf_counter()
+        self._rerun(widgets)
+        self.latencies.append((step, time.perf_counter() - t0))
+        for element_type, proto, _ in self.elements:
+            if element_type == "exception":
+                raise RuntimeError(f"{step}: {proto.message}")
+
+    def _widget(self, element_type: str, label: str, sidebar: bool = False) -> Any:
+        for t, proto, in_sidebar in self.elements:
+            if t == element_type and proto.label == label and in_sidebar == sidebar:
+                return proto
+        raise LookupError(f"{element_type} {label!r} not on page")
+
+    def _button(self, label: str) -> WidgetState:
+        return WidgetState(id=self._widget("button", label).id, trigger_value=True)
+
+    def _text(self, label: str, value: str) -> WidgetState:
+        return WidgetState(id=self._widget("text_input", label).id, string_value=value)
+
+    def _select(self, label: str, option: str, sidebar: bool = False) -> WidgetState:
+        return WidgetState(id=self._widget("selectbox", label, sidebar).id, string_value=option)
+
+    def _navigate(self, page: str) -> None:
+        nav = next(proto for t, proto, in_sidebar in self.elements if t == "selectbox" and in_sidebar)
+        self._timed(f"nav:{page}", self._select(nav.label, page, sidebar=True))
+
+    def login(self) -> None:
+        self._timed("open")
+        self._timed("login", self._text("Email", f"user{self.index}@loadtest.local"),
+                    self._text("Şifre", "load-test"), self._button("Giriş Yap"))
+
+    def stroop(self) -> None:
+        self._navigate("Bilişsel Testler")
+        self._timed("test:select", self._select("Test Türü Seçin", "Stroop Testi"))
+        self._timed("test:start", self._button("Testi Başlat"))
+        self._timed("test:instructions", self._button("Denemeye Başla"))
+        self._answer_all("test:practice")
+        self._timed("test:main", self._button("Ana Teste Başla"))
+        self._answer_all("test:trial")
+
+    def _ink(self) -> Optional[str]:
+        for element_type, proto, _ in self.elements:
+            m = _INK_RE.search(proto.body) if element_type == "markdown" else None
+            if m:
+                return INK_BY_HEX[m.group(1).upper()]
+        return None
+
+    def _answer_all(self, step: str) -> None:
+        ink = self._ink()
+        while ink is not None:
+            self._timed(step, self._button(ink))
+            ink = self._ink()
+
+    def results(self) -> None:
+        self._navigate("Sonuçlar")
+
+    def report(self) -> None:
+        self._navigate("Raporlar")
+        # The page polls the job with sleep + st.rerun(); the step ends when polling stops.
+        self._timed("report:generate", self._button("Rapor Oluştur"))
+
+    def run_scenario(self) -> List[Tuple[str, float]]:
+        self.login()
+        self.stroop()
+        self.results()
+        self.report()
+        return self.latencies
+
+
+def _percentiles(values: List[float]) -> str:
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50={p50 * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms p99={p99 * 1000:7.1f}ms"
+
+
+def run_level(url: str, concurrency: int, timeout: float, offset: int) -> Dict[str, Any]:
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def one(index: int) -> List[Tuple[str, float]]:
+        session = Session(url, index, timeout)
+        try:
+            with session:
+                return session.run_scenario()
+        except Exception as e:
+            with lock:
+                errors.append(f"session {index}: {e!r}")
+            return session.latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = [s for result in pool.map(one, range(offset, offset + concurrency)) for s in result]
+    elapsed = time.perf_counter() - started
+    return {"concurrency": concurrency, "elapsed": elapsed, "samples": samples, "errors": errors,
+            "completed": concurrency - len(errors)}
+
+
+def measure_session_memory(server: Server, n: int, timeout: float, offset: int) -> Optional[float]:
+    """Server RSS growth per live session after a full scenario; None where /proc is unavailable."""
+    before = server.rss_bytes()
+    with contextlib.ExitStack() as alive:
+        for i in range(n):
+            alive.enter_context(Session(server.url, offset + i, timeout)).run_scenario()
+        after = server.rss_bytes()
+    if before is None or after is None:
+        return None
+    return (after - before) / max(1, n)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--gemini-latency", type=float, default=2.0, help="stub generation time (s)")
+    parser.add_argument("--gemini-first-token", type=float, default=0.3)
+    parser.add_argument("--identity-latency", type=float, default=0.05, help="fake sign-in round trip (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-rerun timeout (s)")
+    parser.add_argument("--memory-sessions", type=int, default=3, help="0 skips the memory pass")
+    args = parser.parse_args()
+
+    server = Server(args)
+    try:
+        offset = 0
+        print(f"{'sessions':>8} {'elapsed':>8} {'sess/min':>9} {'reruns/s':>9}  rerun latency (excl. report)")
+        for level in args.concurrency:
+            result = run_level(server.url, level, args.timeout, offset)
+            offset += level
+            reruns = [d for step, d in result["samples"] if step != "report:generate"]
+            reports = [d for step, d in result["samples"] if step == "report:generate"]
+            elapsed = result["elapsed"]
+            line = (f"{level:>8} {elapsed:>7.1f}s {result['completed'] / elapsed * 60:>9.1f} "
+                    f"{len(result['samples']) / elapsed:>9.1f}  {_percentiles(reruns) if reruns else '-'}")
+            if reports:
+                line += f"  report {_percentiles(reports)}"
+            print(line, flush=True)
+            for error in result["errors"]:
+                print(f"  HATA {error}")
+
+        if args.memory_sessions:
+            per_session = measure_session_memory(server, args.memory_sessions, args.timeout, offset)
+            if per_session is None:
+                print("retained memory per session: unavailable (no /proc)")
+            else:
+                print(f"server RSS growth per live session: {per_session / 1024:.0f} KiB (n={args.memory_sessions})")
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""Script served by `benchmarks.load_test`: app.py against the offline fakes.
+
+    streamlit run benchmarks/load_test_app.py -- --gemini-latency 2.0
+
+Streamlit re-executes this file on every rerun; the fakes are installed once
+per server process.
+"""
+import runpy
+import sys
+
+from benchmarks.load_test import APP_PATH, install_fakes_once, server_args
+
+install_fakes_once(server_args(sys.argv[1:]))
+runpy.run_path(APP_PATH, run_name="__main__")
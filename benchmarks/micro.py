@@ -0,0 +1,239 @@
+"""Microbenchmarks for the scoring, metrics, data-shaping and PDF hot paths.
+
+    python -m benchmarks.micro --save-baseline   # record this machine's baseline
+    python -m benchmarks.micro                   # compare against it (exit 1 on regression)
+    python -m benchmarks.micro --sizes 10 1000 --filter frame
+
+Every case runs on synthetic users with 10, 1k and 100k results. A case is
+a regression when a one-sided Mann-Whitney U test says it got slower
+(p < --alpha) and its median grew by more than --threshold. Baselines are
+machine-specific and not committed: record one on the machine that runs the
+comparison (again after a hardware or Python change) before changing a hot
+path. Without a baseline, or with cases the baseline does not cover, the
+comparison exits 2 instead of passing.
+"""
+import argparse
+import datetime as dt
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from ai import ReportGenerator
+from dashboard import _score_frame
+from report_engine import compute_report_metrics, render_template_report
+from results import _results_frame
+from services.dates import completion_fields
+from services.llm import ModelClient, StubBackend
+from services.pdf import render_report_pdf
+from tests import (CognitiveTest, ResponseItem, evaluate_answer, generate_attention_questions,
+                   generate_memory_questions, generate_stroop_trials)
+
+
+DEFAULT_SIZES = (10, 1000, 100000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+TEST_TYPES = ("memory", "attention", "stroop")
+
+
+def synthetic_results(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    start = dt.datetime(2025, 1, 1)
+    return [
+        {
+            "id": f"r{i}",
+            "userId": "bench",
+            "testType": TEST_TYPES[i % 3],
+            "score": rng.randint(0, 20),
+            "accuracy": round(rng.uniform(30, 100), 2),
+            "averageResponseTime": round(rng.uniform(0.4, 3.0), 3),
+            **completion_fields(start + dt.timedelta(minutes=17 * i)),
+            "metadata": {"_completedAtStr": (start + dt.timedelta(minutes=17 * i)).isoformat() + "Z"},
+            "analysis": {"stroopEffect": round(rng.uniform(0, 0.3), 3)} if i % 3 == 2 else {},
+        }
+        for i in range(n)
+    ]
+
+
+def _user_data(n: int) -> Dict[str, Any]:
+    return {"profile": {"profile": {"firstName": "Bench", "age": 40, "educationLevel": "Lisans"}},
+            "results": synthetic_results(n)}
+
+
+def _answered(questions: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Any]]:
+    answers = {
+        "word_list_recall": lambda q: " ".join(q["words"][:4]),
+        "number_sequence": lambda q: q["digits"],
+        "pattern_3x3": lambda q: q["positions"],
+        "paired_associate": lambda q: str(q["answer"]),
+    }
+    return [(q, answers[q["type"]](q)) for q in questions]
+
+
+def _case_evaluate_answer(n: int) -> Callable[[], Any]:
+    random.seed(0)
+    pairs = _answered(generate_memory_questions(n))
+
+    def run() -> None:
+        for q, answer in pairs:
+            evaluate_answer("memory", q, answer, {})
+    return run
+
+
+def _case_calculate_metrics(n: int) -> Callable[[], Any]:
+    rng = random.Random(0)
+    test = CognitiveTest("stroop")
+    test.responses = [
+        ResponseItem(f"stroop_{i}", "red", rng.random() < 0.8, rng.uniform(0.4, 1.5),
+                     {"condition": "congruent" if i % 2 else "incongruent"})
+        for i in range(n)
+    ]
+    return test.calculate_metrics
+
+
+def _case_create_prompt(n: int) -> Callable[[], Any]:
+    gen = ReportGenerator(ModelClient(StubBackend(latency_seconds=0, first_token_seconds=0)))
+    data = _user_data(n)
+    return lambda: gen._create_prompt(data, "general")
+
+
+def _case_generate_pdf(n: int) -> Callable[[], Any]:
+    text = render_template_report(compute_report_metrics(_user_data(n)), "general")
+    return lambda: render_report_pdf(text)
+
+
+def _case_results_frame(n: int) -> Callable[[], Any]:
+    results = synthetic_results(n)
+    return lambda: _results_frame(results)
+
+
+def _case_score_frame(n: int) -> Callable[[], Any]:
+    results = synthetic_results(n)
+    return lambda: _score_frame(results)
+
+
+# name -> setup(n) returning the timed callable
+CASES: Dict[str, Callable[[int], Callable[[], Any]]] = {
+    "generate_memory_questions": lambda n: lambda: generate_memory_questions(n),
+    "generate_attention_questions": lambda n: lambda: generate_attention_questions(n),
+    "generate_stroop_trials": lambda n: lambda: generate_stroop_trials(n),
+    "evaluate_answer": _case_evaluate_answer,
+    "calculate_metrics": _case_calculate_metrics,
+    "results_frame": _case_results_frame,
+    "dashboard_score_frame": _case_score_frame,
+    "create_prompt": _case_create_prompt,
+    "generate_pdf": _case_generate_pdf,
+}
+
+
+def measure(fn: Callable[[], Any], rounds: int, min_round_seconds: float) -> List[float]:
+    """Per-call seconds for each round; fast calls are looped so a round is long enough to time."""
+    fn()
+    t0 = time.perf_counter()
+    fn()
+    single = time.perf_counter() - t0
+    loops = max(1, int(min_round_seconds / single)) if single > 0 else 1000
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) / loops)
+    return samples
+
+
+def mann_whitney_greater(current: List[float], baseline: List[float]) -> float:
+    """One-sided p-value that `current` tends to be larger than `baseline`
+    (normal approximation with tie correction)."""
+    n1, n2 = len(current), len(baseline)
+    combined = np.concatenate([current, baseline])
+    order = combined.argsort()
+    ranks = np.empty(len(combined))
+    ranks[order] = np.arange(1, len(combined) + 1)
+    # Average ranks over ties.
+    values, inverse, counts = np.unique(combined, return_inverse=True, return_counts=True)
+    ranks = np.array([ranks[inverse == k].mean() for k in range(len(values))])[inverse]
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    tie = float(((counts ** 3) - counts).sum()) / (n * (n - 1)) if n > 1 else 0.0
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie))
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2.0 - 0.5) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _fmt(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="results per synthetic user")
+    parser.add_argument("--filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--min-round-seconds", type=float, default=0.02)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--alpha", type=float, default=0.01)
+    parser.add_argument("--threshold", type=float, default=0.10, help="minimum median slowdown to fail (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    stored: Dict[str, List[float]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            stored = json.load(f)["cases"]
+    baseline = {} if args.save_baseline else stored
+
+    current: Dict[str, List[float]] = {}
+    regressions = 0
+    uncovered: List[str] = []
+    print(f"{'case':<40} {'median':>10} {'baseline':>10} {'change':>8} {'p':>8}")
+    for name, setup in CASES.items():
+        if args.filter not in name:
+            continue
+        for size in args.sizes:
+            key = f"{name}[{size}]"
+            samples = measure(setup(size), args.rounds, args.min_round_seconds)
+            current[key] = samples
+            median = float(np.median(samples))
+            line = f"{key:<40} {_fmt(median):>10}"
+            if key in baseline:
+                base_median = float(np.median(baseline[key]))
+                change = median / base_median - 1.0
+                p = mann_whitney_greater(samples, baseline[key])
+                regressed = p < args.alpha and change > args.threshold
+                regressions += regressed
+                line += f" {_fmt(base_median):>10} {change:>+7.1%} {p:>8.4f}" + ("  REGRESSION" if regressed else "")
+            elif not args.save_baseline:
+                uncovered.append(key)
+                line += f" {'-':>10}  NO BASELINE"
+            print(line, flush=True)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"python": platform.python_version(), "machine": platform.platform(),
+                                "recordedAt": dt.datetime.utcnow().isoformat() + "Z"},
+                       "cases": {**stored, **current}}, f, indent=1)
+        print(f"baseline written to {args.baseline}")
+    if regressions:
+        print(f"{regressions} regression(s)")
+        sys.exit(1)
+    if uncovered:
+        # A gate that cannot compare must not pass.
+        print(f"{len(uncovered)} case(s) missing from {args.baseline}; record it on this machine with "
+              f"`python -m benchmarks.micro --save-baseline` and re-run")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Offline report throughput / tail-latency benchmark against the stub model backend.
+
+    python -m benchmarks.report_throughput --reports 200 --concurrency 8 --latency 2.0
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ai import ReportGenerator
+from report_schema import report_to_markdown
+from services.llm import CircuitBreaker, ModelClient, StubBackend
+
+
+def _synthetic_user_data(n_results: int) -> Dict[str, Any]:
+    results = [
+        {"id": f"r{i}", "testType": ("memory", "attention", "stroop")[i % 3], "score": 10 + i % 10,
+         "accuracy": 50.0 + i % 50, "averageResponseTime": 1.0 + (i % 7) / 10}
+        for i in range(n_results)
+    ]
+    return {"profile": {"profile": {"firstName": "Bench", "age": 40}}, "results": results}
+
+
+def _one_report(gen: ReportGenerator, data: Dict[str, Any]) -> Dict[str, float]:
+    t0 = time.perf_counter()
+    ttft = None
+    text = ""
+    for chunk in gen.stream_report_text(data, "general"):
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+        text += chunk
+    markdown = report_to_markdown(gen.finalize(data, "general", text))
+    t1 = time.perf_counter()
+    gen.generate_pdf(markdown)
+    t2 = time.perf_counter()
+    return {"ttft": ttft or 0.0, "model": t1 - t0, "pdf": t2 - t1, "total": t2 - t0}
+
+
+def _pct(values: List[float]) -> str:
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50={p50:.3f}s p95={p95:.3f}s p99={p99:.3f}s"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=2.0, help="stub generation time (s)")
+    parser.add_argument("--first-token", type=float, default=0.3, help="stub time to first token (s)")
+    parser.add_argument("--output-chars", type=int, default=3000)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--results", type=int, default=50, help="results per synthetic user")
+    args = parser.parse_args()
+
+    backend = StubBackend(args.latency, args.first_token, args.output_chars, failure_rate=args.failure_rate)
+    client = ModelClient(backend, backoff_seconds=0.2, breaker=CircuitBreaker(failure_threshold=1000))
+    gen = ReportGenerator(client)
+    data = _synthetic_user_data(args.results)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(_one_report, gen, data) for _ in range(args.reports)]
+        samples, errors = [], 0
+        for f in futures:
+            try:
+                samples.append(f.result())
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - started
+
+    print(f"reports={len(samples)} errors={errors} concurrency={args.concurrency} elapsed={elapsed:.2f}s")
+    print(f"throughput={len(samples) / elapsed * 60:.1f} reports/min")
+    for stage in ("ttft", "model", "pdf", "total"):
+        if samples:
+            print(f"{stage:>6}: {_pct([s[stage] for s in samples])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import streamlit as st
+import pandas as pd
+from typing import Any, Dict, List
+from debug_panel import is_admin
+from services.config import secrets_section
+from services.cohort_stats import DECLINE_POINTS, OVERDUE_DAYS, cohort_summary, count_overdue, overdue_cutoff, participants_page
+
+
+PAGE_SIZE = 50
+SORT_FIELDS = {
+    "Son test": "lastTestAt",
+    "Düşüş": "declineDelta",
+    "Son doğruluk": "latestAccuracy",
+    "Test sayısı": "testCount",
+    "Ad": "displayName",
+}
+FILTERS = {"Tümü": "", "Düşüş gösterenler": "declining", f"{OVERDUE_DAYS}+ gündür test yapmayanlar": "overdue"}
+
+
+def is_clinician() -> bool:
+    """Clinic staff are listed in `[clinicians] uids` / `emails`; admins see the page too."""
+    user = st.session_state.get("user") or {}
+    cfg = secrets_section("clinicians")
+    return is_admin() or (bool(user) and (user.get("uid") in cfg.get("uids", []) or user.get("email") in cfg.get("emails", [])))
+
+
+def _participant_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    cutoff = overdue_cutoff()
+    return pd.DataFrame([
+        {
+            "Katılımcı": r.get("displayName", ""),
+            "E-posta": r.get("email", ""),
+            "Test": r.get("testCount", 0),
+            "Son test": r.get("lastTestAt"),
+            "Son tür": r.get("lastTestType", ""),
+            "Son doğruluk": r.get("latestAccuracy", 0.0),
+            "Düşüş (puan)": r.get("declineDelta", 0.0),
+            "Gecikmiş": bool(r.get("lastTestAt") and r["lastTestAt"] < cutoff),
+        }
+        for r in rows
+    ])
+
+
+def _render_summary() -> None:
+    summary = cohort_summary()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Katılımcı", summary.get("participants", 0))
+    c2.metric("Test", summary.get("tests", 0))
+    c3.metric("Düşüş gösteren", summary.get("declining", 0), help=f"Son doğruluk önceki ortalamanın {DECLINE_POINTS:g} puan altında")
+    c4.metric("Gecikmiş", count_overdue(), help=f"{OVERDUE_DAYS} günden uzun süredir test yok")
+    by_type = summary.get("byType", {})
+    if by_type:
+        st.dataframe(pd.DataFrame([
+            {"Test Türü": t, "Test": v.get("count", 0),
+             "Ort. Skor": round(v.get("scoreSum", 0) / v["count"], 2) if v.get("count") else 0.0,
+             "Ort. Doğruluk": round(v.get("accuracySum", 0.0) / v["count"], 2) if v.get("count") else 0.0}
+            for t, v in sorted(by_type.items())
+        ]), hide_index=True, use_container_width=True)
+
+
+def _page_state(view: tuple) -> Dict[str, Any]:
+    # Cursors are Firestore snapshots, so pagination stays in this session only.
+    state = st.session_state.get("_cohort_view")
+    if not state or state["view"] != view:
+        state = {"view": view, "cursors": [None], "page": 0, "rows": {}}
+        st.session_state["_cohort_view"] = state
+    return state
+
+
+def render_cohort_page() -> None:
+    st.title("👥 Kohort")
+    if not is_clinician():
+        st.error("Bu sayfa yalnızca klinik personeli içindir.")
+        return
+
+    _render_summary()
+    st.divider()
+
+    c1, c2, c3 = st.columns([2, 1, 2])
+    only = FILTERS[c3.selectbox("Filtre", list(FILTERS.keys()))]
+    # Firestore sorts a range filter's field first, so the overdue view has one fixed order.
+    overdue = only == "overdue"
+    sort_label = c1.selectbox("Sırala", list(SORT_FIELDS.keys()), disabled=overdue)
+    descending = c2.selectbox("Yön", ["Azalan", "Artan"], index=1 if sort_label == "Düşüş" else 0,
+                              disabled=overdue) == "Azalan"
+    if overdue:
+        sort_label, descending = "Son test", False
+        st.caption("Bu görünüm her zaman son test tarihine göre, en eski önce sıralanır.")
+
+    state = _page_state((SORT_FIELDS[sort_label], descending, only))
+    page = state["page"]
+    if page not in state["rows"]:
+        rows, next_cursor = participants_page(SORT_FIELDS[sort_label], descending, PAGE_SIZE, only, state["cursors"][page])
+        state["rows"][page] = rows
+        if next_cursor is not None and len(state["cursors"]) == page + 1:
+            state["cursors"].append(next_cursor)
+    rows = state["rows"][page]
+
+    if not rows:
+        st.info("Bu görünümde katılımcı yok.")
+        return
+    st.dataframe(_participant_frame(rows), hide_index=True, use_container_width=True,
+                 column_config={"Son test": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm")})
+
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    if prev_col.button("◀ Önceki", disabled=page == 0):
+        state["page"] -= 1
+        st.rerun()
+    info_col.caption(f"Sayfa {page + 1} · {len(rows)} katılımcı")
+    if next_col.button("Sonraki ▶", disabled=len(state["cursors"]) <= page + 1):
+        state["page"] += 1
+        st.rerun()
+    if st.button("Yenile"):
+        st.session_state.pop("_cohort_view", None)
+        st.rerun()
@@ -1,9 +1,11 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
+from services import metrics
+from services.cache import get_cache
 from services.firebase import get_firestore_client
+from reports import render_latest_insights
 from typing import List, Dict, Any
-from datetime import datetime
 
 
 def _fetch_user_results(uid: str) -> List[Dict[str, Any]]:
@@ -14,14 +16,29 @@ def _fetch_user_results(uid: str) -> List[Dict[str, Any]]:
         item = d.to_dict()
         item["id"] = d.id
         results.append(item)
+    metrics.firestore_read("testResults", results)
     return results
 
 
-def _normalize_date(v: Any) -> datetime:
-    try:
-        return datetime.fromisoformat(str(v).replace("Z", "+00:00"))
-    except Exception:
-        return datetime.utcnow()
+def _score_frame(results: List[Dict[str, Any]]) -> pd.DataFrame:
+    df = pd.DataFrame([
+        {
+            "Date": r["completedAtMs"],
+            "Score": r.get("score", 0),
+            "Test": r.get("testType", "")
+        }
+        for r in results if r.get("completedAtMs") is not None
+    ], columns=["Date", "Score", "Test"])
+    df["Date"] = pd.to_datetime(df["Date"], unit="ms")
+    return df
+
+
+def _user_stats(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "total_tests": len(results),
+        "test_types": len(set(r.get("testType", "") for r in results)),
+        "avg_performance": sum(r.get("score", 0) for r in results) / len(results) if results else 0,
+    }
 
 
 def render_dashboard_page() -> None:
@@ -58,7 +75,8 @@ def render_dashboard_page() -> None:
     """, unsafe_allow_html=True)
     
     uid = st.session_state.user.get("uid") if st.session_state.user else None
-    results = _fetch_user_results(uid) if uid else []
+    cache = get_cache()
+    results = cache.get("results", uid, "list", lambda: _fetch_user_results(uid)) if uid else []
     
     # Demo data if no real results
     if not results:
@@ -67,12 +85,10 @@ def render_dashboard_page() -> None:
             ("Ortalama Performans", "0", "📊")
         ]
     else:
-        total_tests = len(results)
-        test_types = len(set(r.get("testType", "") for r in results))
-        avg_performance = sum(r.get("score", 0) for r in results) / len(results) if results else 0
+        stats = cache.get("results", uid, "stats", lambda: _user_stats(results))
         demo_stats = [
-            ("Test Türü", str(test_types), "📋"),
-            ("Ortalama Performans", str(int(avg_performance)), "📊")
+            ("Test Türü", str(stats["test_types"]), "📋"),
+            ("Ortalama Performans", str(int(stats["avg_performance"])), "📊")
         ]
     
     # Statistics in 2 columns with better styling
@@ -103,14 +119,7 @@ def render_dashboard_page() -> None:
     
     if results:
         # Real data processing
-        df = pd.DataFrame([
-            {
-                "Date": (_normalize_date(r.get("metadata", {}).get("_completedAtStr") or r.get("metadata", {}).get("completedAt"))),
-                "Score": r.get("score", 0),
-                "Test": r.get("testType", "")
-            }
-            for r in results
-        ])
+        df = cache.get("results", uid, "score_frame", lambda: _score_frame(results), shared=False)
         
         # Create demo-like data for better visualization
         if len(df) < 4:
@@ -161,6 +170,15 @@ def render_dashboard_page() -> None:
     
     st.markdown("</div>", unsafe_allow_html=True)
     
+    # Insights from the last stored report (no model call)
+    if uid:
+        st.markdown("""
+        <div style='margin: 30px 0;'>
+            <h3 style='color: white; font-size: 22px; margin: 20px 0;'>💡 Son Rapor İçgörüleri</h3>
+        </div>
+        """, unsafe_allow_html=True)
+        render_latest_insights(uid)
+    
     st.divider()
     
     # Action buttons
@@ -0,0 +1,81 @@
+import contextlib
+import hashlib
+import hmac
+import os
+import time
+import streamlit as st
+import pandas as pd
+from typing import Any, Dict, Iterator
+from services import metrics
+from services.config import secrets_section
+from services.profiler import SamplingProfiler
+
+
+def is_admin() -> bool:
+    """Admins are listed in `[admin] uids` / `emails`."""
+    user = st.session_state.get("user") or {}
+    cfg = secrets_section("admin")
+    return bool(user) and (user.get("uid") in cfg.get("uids", []) or user.get("email") in cfg.get("emails", []))
+
+
+def record_rerun(rerun: Dict[str, Any]) -> None:
+    st.session_state["_last_rerun_metrics"] = rerun
+    metrics.export(secrets_section("metrics").get("dir", ".cache/metrics"))
+
+
+def _profile_requested() -> bool:
+    # ?profile=<[profiling] secret> profiles one rerun for a user who is not an admin. The
+    # parameter is removed at once, so later reruns are not profiled and the secret
+    # does not stay in the address bar.
+    token = st.query_params.get("profile")
+    if token is not None:
+        del st.query_params["profile"]
+        secret = secrets_section("profiling").get("secret", "")
+        if secret and hmac.compare_digest(str(token), secret):
+            st.session_state["_profile_next_rerun"] = True
+    return st.session_state.pop("_profile_next_rerun", False)
+
+
+@contextlib.contextmanager
+def profile_scope(page: str) -> Iterator[None]:
+    """Sample the wrapped renderer when requested; a plain pass-through otherwise."""
+    if not _profile_requested():
+        yield
+        return
+    cfg = secrets_section("profiling")
+    uid = (st.session_state.get("user") or {}).get("uid", "anon")
+    uid_hash = hashlib.sha256(uid.encode("utf-8")).hexdigest()[:10]
+    slug = "".join(ch if ch.isalnum() else "-" for ch in page)
+    path = os.path.join(cfg.get("dir", ".cache/profiles"), f"{time.strftime('%Y%m%d-%H%M%S')}_{slug}_{uid_hash}.speedscope.json")
+    profiler = SamplingProfiler(float(cfg.get("interval_seconds", 0.005)))
+    try:
+        with profiler:
+            yield
+    finally:
+        st.session_state["_last_profile"] = profiler.write(path, f"{page} · {uid_hash}")
+
+
+def render_debug_panel() -> None:
+    if not is_admin():
+        return
+    with st.sidebar.expander("🔧 Metrikler"):
+        last = st.session_state.get("_last_rerun_metrics")
+        if last:
+            st.markdown(f"**Son çalıştırma:** {last['page']} · {last['duration'] * 1000:.0f} ms")
+            for name, value in sorted(last["counters"].items()):
+                st.caption(f"{name}: {value:g}")
+            for name, values in sorted(last["timings"].items()):
+                st.caption(f"{name}: {len(values)} × {sum(values) * 1000:.0f} ms")
+        histograms = metrics.snapshot()["histograms"]
+        if histograms:
+            df = pd.DataFrame([{"metrik": h["name"], **h["labels"], "n": h["count"],
+                                "p50": h.get("p50"), "p95": h.get("p95"), "p99": h.get("p99")} for h in histograms])
+            st.dataframe(df, hide_index=True, use_container_width=True)
+        st.download_button("Prometheus", metrics.prometheus_text(), file_name="metrics.prom", mime="text/plain")
+        if st.button("Sonraki çalıştırmayı profille"):
+            st.session_state["_profile_next_rerun"] = True
+        last_profile = st.session_state.get("_last_profile")
+        if last_profile and os.path.exists(last_profile):
+            with open(last_profile, "rb") as f:
+                st.download_button("Son profil (speedscope)", f.read(), file_name=os.path.basename(last_profile),
+                                   mime="application/json")
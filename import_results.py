@@ -0,0 +1,356 @@
+"""Bulk import of historical assessments into `testResults`.
+
+    python import_results.py eski_sonuclar.csv --source klinik-2019 --dry-run
+    python import_results.py eski_sonuclar.jsonl --source klinik-2019 --committers 4
+
+Rows are streamed from CSV or JSONL, validated and turned into the same
+document shape `CognitiveTest.save_results` writes, then committed in
+batches of up to 500 writes by parallel committer threads. Each row is
+mapped to a user by `userId`, by `email` (matched against
+`users.profile.email`) or by `participantId` through `--user-map`.
+
+Required columns: testType, score, accuracy, averageResponseTime,
+completedAt (ISO 8601; without a zone it is taken as UTC). Optional:
+duration, stroopEffect, errorRate, responses (a JSON list in CSV).
+
+Document ids are derived from the source name and the row content, so an
+import that is run again overwrites instead of duplicating. The number of
+rows whose batch has committed is checkpointed; re-running the same
+command resumes after it. Participant summaries and the cohort document
+are recomputed once per imported user at the end (services.cohort_stats),
+not per row. Rejected rows are written to `<input>.rejects.jsonl`.
+
+Imported scores come from the source system, so rows are stamped
+`scoringVersion` 0 and the next `rescore_results.py` run re-evaluates
+whatever responses they carry.
+"""
+import argparse
+import csv
+import datetime as dt
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from services import cohort_stats, metrics
+from services.cache import get_cache
+from services.dates import completion_fields
+from services.firebase import get_firestore_client
+
+
+TEST_TYPES = ("memory", "attention", "stroop")
+MAX_BATCH = 500  # Firestore write limit per batch
+DEFAULT_CHECKPOINT_DIR = os.path.join(".cache", "imports")
+# Older than any tests.SCORING_VERSION, so rescore_results re-evaluates imported responses.
+IMPORTED_SCORING_VERSION = 0
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(row number, row) pairs; row numbers start at 1 and count data rows only."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            for n, row in enumerate(csv.DictReader(f), start=1):
+                yield n, {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip() != ""}
+        else:
+            n = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                n += 1
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = {"_error": f"geçersiz JSON: {e}"}
+                yield n, row if isinstance(row, dict) else {"_error": "satır bir JSON nesnesi değil"}
+
+
+def _number(row: Dict[str, Any], field: str, cast=float, lo: float = 0.0, hi: Optional[float] = None,
+            required: bool = True) -> Any:
+    if row.get(field) is None:
+        if required:
+            raise RowError(f"{field} eksik")
+        return None
+    try:
+        value = cast(row[field]) if cast is not int else int(float(row[field]))
+    except (TypeError, ValueError):
+        raise RowError(f"{field} sayı değil: {row[field]!r}")
+    if value < lo or (hi is not None and value > hi):
+        raise RowError(f"{field} aralık dışında: {value}")
+    return value
+
+
+def _completed(row: Dict[str, Any]) -> dt.datetime:
+    raw = row.get("completedAt")
+    if not raw:
+        raise RowError("completedAt eksik")
+    try:
+        ts = dt.datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    except ValueError:
+        raise RowError(f"completedAt okunamadı: {raw!r}")
+    ts = ts if ts.tzinfo else ts.replace(tzinfo=dt.timezone.utc)
+    if ts > dt.datetime.now(dt.timezone.utc):
+        raise RowError(f"completedAt gelecekte: {raw}")
+    return ts
+
+
+def _responses(row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    value = row.get("responses") or []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise RowError("responses geçerli JSON değil")
+    if not isinstance(value, list) or not all(isinstance(r, dict) for r in value):
+        raise RowError("responses bir nesne listesi olmalı")
+    for r in value:
+        if "questionId" not in r or "responseTime" not in r:
+            raise RowError("her yanıtta questionId ve responseTime olmalı")
+    return value
+
+
+def build_payload(row: Dict[str, Any], uid: str, source: str) -> Dict[str, Any]:
+    """The `testResults` document for a validated row (same fields as save_results)."""
+    if row.get("_error"):
+        raise RowError(row["_error"])
+    test_type = str(row.get("testType", "")).strip().lower()
+    if test_type not in TEST_TYPES:
+        raise RowError(f"bilinmeyen testType: {row.get('testType')!r}")
+    completed = _completed(row)
+    accuracy = round(_number(row, "accuracy", hi=100.0), 2)
+    payload: Dict[str, Any] = {
+        "userId": uid,
+        "testType": test_type,
+        "score": _number(row, "score", int),
+        "accuracy": accuracy,
+        "averageResponseTime": round(_number(row, "averageResponseTime"), 3),
+        "responses": _responses(row),
+        "scoringVersion": IMPORTED_SCORING_VERSION,
+        **completion_fields(completed),
+        "metadata": {
+            "duration": _number(row, "duration", required=False) or 0.0,
+            "completedAt": completed,
+            "_completedAtStr": completed.astimezone(dt.timezone.utc).replace(tzinfo=None).isoformat() + "Z",
+        },
+        "analysis": {"strengths": [], "weaknesses": [], "percentileRank": 0},
+        "source": {"kind": "import", "name": source},
+    }
+    if test_type == "stroop":
+        effect = _number(row, "stroopEffect", lo=float("-inf"), required=False)
+        payload["analysis"].update({"stroopEffect": effect or 0.0,
+                                    "errorRate": _number(row, "errorRate", hi=100.0, required=False) or 100 - accuracy})
+    return payload
+
+
+def document_id(source: str, row: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(json.dumps([source, row], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"imp_{digest[:24]}"
+
+
+class UserResolver:
+    """Maps `userId` / `email` / `participantId` to uids; e-mail lookups are memoised."""
+
+    def __init__(self, db: Any, user_map: Optional[Dict[str, str]] = None) -> None:
+        self.db = db
+        self.user_map = user_map or {}
+        self._known: Dict[str, bool] = {}
+        self._by_email: Dict[str, Optional[str]] = {}
+
+    def _exists(self, uid: str) -> bool:
+        if uid not in self._known:
+            self._known[uid] = self.db.collection("users").document(uid).get().exists
+        return self._known[uid]
+
+    def resolve(self, row: Dict[str, Any]) -> str:
+        if row.get("userId"):
+            uid = str(row["userId"])
+        elif row.get("participantId"):
+            uid = self.user_map.get(str(row["participantId"]))
+            if uid is None:
+                raise RowError(f"participantId eşlemede yok: {row['participantId']}")
+        elif row.get("email"):
+            email = str(row["email"]).strip()
+            if email not in self._by_email:
+                docs = list(self.db.collection("users").where("profile.email", "==", email).limit(2).stream())
+                metrics.firestore_read("users", [d.to_dict() for d in docs])
+                if len(docs) > 1:
+                    raise RowError(f"e-posta birden fazla kullanıcıyla eşleşiyor: {email}")
+                self._by_email[email] = docs[0].id if docs else None
+            uid = self._by_email[email]
+            if uid is None:
+                raise RowError(f"e-posta ile kullanıcı bulunamadı: {email}")
+            self._known[uid] = True
+        else:
+            raise RowError("userId, email veya participantId gerekli")
+        if not self._exists(uid):
+            raise RowError(f"kullanıcı yok: {uid}")
+        return uid
+
+
+def load_user_map(path: str) -> Dict[str, str]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return {row["participantId"].strip(): row["userId"].strip() for row in csv.DictReader(f)}
+
+
+class Checkpoint:
+    """Rows committed so far and the users they touched, for one input file and source."""
+
+    def __init__(self, path: str, key: str) -> None:
+        self.path = path
+        self.state: Dict[str, Any] = {"key": key, "rows": 0, "users": [], "statsDone": False}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("key") == key:
+                self.state = stored
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def _commit(db: Any, docs: List[Tuple[str, Dict[str, Any]]]) -> int:
+    batch = db.batch()
+    results = db.collection("testResults")
+    for doc_id, payload in docs:
+        batch.set(results.document(doc_id), payload)
+    batch.commit()
+    for _, payload in docs:
+        metrics.firestore_write("testResults", payload)
+    return len(docs)
+
+
+def run(path: str, source: str, fmt: Optional[str], resolver: UserResolver, checkpoint: Optional[Checkpoint],
+        batch_size: int = MAX_BATCH, committers: int = 4, dry_run: bool = False,
+        rejects_path: Optional[str] = None) -> Dict[str, int]:
+    db = resolver.db
+    state = checkpoint.state if checkpoint and not dry_run else {"rows": 0, "users": [], "statsDone": False}
+    skip = state["rows"]
+    counters = {"resumedAfter": skip, "read": 0, "written": 0, "rejected": 0}
+    users: Set[str] = set(state["users"])
+    rejects = open(rejects_path, "a" if skip else "w", encoding="utf-8") if rejects_path else None
+
+    # Batches commit out of order; the checkpoint only advances over a contiguous prefix of them.
+    pending: Dict[Any, Tuple[int, int, Set[str]]] = {}
+    finished: Dict[int, Tuple[int, Set[str]]] = {}
+    next_seq, watermark = 0, 0
+
+    def settle(block: bool) -> None:
+        nonlocal watermark
+        if not pending:
+            return
+        done, _ = wait(list(pending), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for fut in done:
+            seq, last_row, batch_users = pending.pop(fut)
+            counters["written"] += fut.result()
+            finished[seq] = (last_row, batch_users)
+        advanced = False
+        while watermark in finished:
+            last_row, batch_users = finished.pop(watermark)
+            users.update(batch_users)
+            state.update(rows=last_row, statsDone=False)
+            watermark += 1
+            advanced = True
+        if advanced and checkpoint and not dry_run:
+            state["users"] = sorted(users)
+            checkpoint.save()
+
+    buf: List[Tuple[str, Dict[str, Any]]] = []
+    buf_users: Set[str] = set()
+    with ThreadPoolExecutor(max_workers=committers) as pool:
+        def flush(last_row: int) -> None:
+            nonlocal next_seq, buf, buf_users
+            if dry_run:
+                users.update(buf_users)
+            elif buf:
+                while len(pending) >= 2 * committers:
+                    settle(block=True)
+                pending[pool.submit(_commit, db, buf)] = (next_seq, last_row, buf_users)
+                next_seq += 1
+            buf, buf_users = [], set()
+
+        last_row = skip
+        try:
+            for n, row in read_rows(path, fmt):
+                if n <= skip:
+                    continue
+                last_row = n
+                counters["read"] += 1
+                try:
+                    uid = resolver.resolve(row)
+                    payload = build_payload(row, uid, source)
+                except RowError as e:
+                    counters["rejected"] += 1
+                    if rejects:
+                        rejects.write(json.dumps({"row": n, "error": str(e), "data": row}, ensure_ascii=False, default=str) + "\n")
+                    continue
+                buf.append((document_id(source, row), payload))
+                buf_users.add(uid)
+                if len(buf) >= batch_size:
+                    flush(n)
+                    settle(block=False)
+            flush(last_row)
+            while pending:
+                settle(block=True)
+        finally:
+            if rejects:
+                rejects.close()
+
+    if dry_run:
+        counters["users"] = len(users)
+        return counters
+    if checkpoint:
+        state.update(rows=last_row, users=sorted(users))
+        checkpoint.save()
+    if users and not state.get("statsDone"):
+        for uid in users:
+            get_cache().invalidate("results", uid)
+        counters.update({f"stats_{k}": v for k, v in cohort_stats.refresh_users(sorted(users)).items()})
+        state["statsDone"] = True
+        if checkpoint:
+            checkpoint.save()
+    counters["users"] = len(users)
+    return counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="CSV veya JSONL dosyası")
+    parser.add_argument("--source", required=True, help="kaynak adı (örn. klinik-2019); belge kimliklerine katılır")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="varsayılan: dosya uzantısından")
+    parser.add_argument("--user-map", help="participantId,userId sütunlu CSV")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH, help=f"toplu yazma başına belge (≤ {MAX_BATCH})")
+    parser.add_argument("--committers", type=int, default=4, help="paralel commit iş parçacığı")
+    parser.add_argument("--dry-run", action="store_true", help="yalnızca doğrula, yazma")
+    parser.add_argument("--checkpoint", help=f"varsayılan: {DEFAULT_CHECKPOINT_DIR}/<dosya>.<kaynak>.json")
+    parser.add_argument("--restart", action="store_true", help="kontrol noktasını yok say, baştan başla")
+    args = parser.parse_args()
+    if not 0 < args.batch_size <= MAX_BATCH:
+        raise SystemExit(f"--batch-size 1 ile {MAX_BATCH} arasında olmalı (Firestore toplu yazma sınırı)")
+
+    key = f"{os.path.abspath(args.input)}|{args.source}"
+    checkpoint_path = args.checkpoint or os.path.join(
+        DEFAULT_CHECKPOINT_DIR, f"{os.path.basename(args.input)}.{args.source}.json")
+    checkpoint = Checkpoint(checkpoint_path, key)
+    if args.restart:
+        checkpoint.state.update(rows=0, users=[], statsDone=False)
+    if checkpoint.state["rows"] and not args.dry_run:
+        print(f"{checkpoint.state['rows']}. satırdan devam ediliyor ({checkpoint_path})")
+    resolver = UserResolver(get_firestore_client(), load_user_map(args.user_map) if args.user_map else None)
+    counters = run(args.input, args.source, args.format, resolver, checkpoint, args.batch_size, args.committers,
+                   args.dry_run, args.input + ".rejects.jsonl")
+    print(json.dumps({"source": args.source, "dryRun": args.dry_run, **counters}))
+    if counters["rejected"]:
+        print(f"Reddedilen satırlar: {args.input}.rejects.jsonl")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Deterministic, template-based report engine (no LLM round trip).
+
+Builds the "general", "performance" and "trend" reports from metrics
+computed locally, in Turkish or English. `TemplateReportGenerator` has the
+same interface as `ai.ReportGenerator`; given an `enrich_with` generator it
+appends a Gemini commentary section and degrades to the template-only
+report if the model call fails.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from jinja2 import Environment, StrictUndefined
+
+from report_schema import markdown_to_sections, report_to_markdown, validate_report
+from services.dates import completed_at
+from services.pdf import render_report_pdf
+
+
+TEMPLATE_VERSION = 1
+
+TEST_LABELS = {
+    "tr": {"memory": "Bellek", "attention": "Dikkat", "stroop": "Stroop", "reaction": "Reaksiyon"},
+    "en": {"memory": "Memory", "attention": "Attention", "stroop": "Stroop", "reaction": "Reaction"},
+}
+
+# Weekly score change beyond which a trend counts as improving / declining.
+TREND_THRESHOLD = 0.5
+LOW_ACCURACY = 60.0
+
+
+def _round(v: float, n: int = 1) -> float:
+    return round(float(v), n)
+
+
+def compute_report_metrics(user_data: Dict[str, Any], lang: str = "tr") -> Dict[str, Any]:
+    profile = user_data.get("profile", {}).get("profile", {})
+    results = user_data.get("results", [])
+    labels = TEST_LABELS.get(lang, TEST_LABELS["tr"])
+    dated = sorted(((completed_at(r), r) for r in results), key=lambda x: x[0] or datetime.min)
+    dates = [d for d, _ in dated if d]
+
+    tests: List[Dict[str, Any]] = []
+    for test_type in sorted({r.get("testType", "") for r in results}):
+        rows = [(d, r) for d, r in dated if r.get("testType", "") == test_type]
+        scores = np.array([float(r.get("score", 0)) for _, r in rows])
+        acc = np.array([float(r.get("accuracy", 0.0)) for _, r in rows])
+        rts = np.array([float(r.get("averageResponseTime", 0.0)) for _, r in rows])
+        item: Dict[str, Any] = {
+            "type": test_type,
+            "label": labels.get(test_type, test_type),
+            "n": len(rows),
+            "score_mean": _round(scores.mean()),
+            "score_best": _round(scores.max()),
+            "score_last": _round(scores[-1]),
+            "accuracy_mean": _round(acc.mean()),
+            "accuracy_first": _round(acc[0]),
+            "accuracy_last": _round(acc[-1]),
+            "rt_mean": _round(rts.mean(), 2),
+            "rt_last": _round(rts[-1], 2),
+            "slope_per_week": 0.0,
+            "direction": "stable",
+            "stroop_effect": None,
+        }
+        # Each date stays paired with its own score; undated rows do not enter the trend.
+        trend = [(d, float(r.get("score", 0))) for d, r in rows if d]
+        days = np.array([(d - dates[0]).total_seconds() / 86400.0 for d, _ in trend])
+        if len(days) >= 2 and np.ptp(days) > 0:
+            slope = float(np.polyfit(days, np.array([score for _, score in trend]), 1)[0]) * 7.0
+            item["slope_per_week"] = _round(slope, 2)
+            if slope > TREND_THRESHOLD:
+                item["direction"] = "up"
+            elif slope < -TREND_THRESHOLD:
+                item["direction"] = "down"
+        if test_type == "stroop":
+            effects = [r.get("analysis", {}).get("stroopEffect") for _, r in rows]
+            effects = [float(e) for e in effects if e is not None]
+            item["stroop_effect"] = _round(np.mean(effects), 3) if effects else None
+        tests.append(item)
+
+    ranked = sorted(tests, key=lambda t: t["accuracy_mean"])
+    return {
+        "name": profile.get("firstName", ""),
+        "total": len(results),
+        "start": min(dates).strftime("%Y-%m-%d") if dates else None,
+        "end": max(dates).strftime("%Y-%m-%d") if dates else None,
+        "tests": tests,
+        "strongest": ranked[-1]["label"] if ranked else None,
+        "weakest": ranked[0]["label"] if len(ranked) > 1 else None,
+        "low_accuracy": [t["label"] for t in tests if t["accuracy_mean"] < LOW_ACCURACY],
+        "declining": [t["label"] for t in tests if t["direction"] == "down"],
+        "improving": [t["label"] for t in tests if t["direction"] == "up"],
+        "generated": datetime.utcnow().strftime("%Y-%m-%d"),
+    }
+
+
+_TR_HEADER = """\
+{% if start %}{{ name or "Katılımcı" }} için {{ start }} – {{ end }} arasındaki {{ total }} test sonucu değerlendirildi.
+{% else %}Seçilen aralıkta test sonucu bulunmuyor.
+{% endif %}
+"""
+
+_TR_ADVICE = """\
+## Öneriler
+{% for label in low_accuracy %}
+- {{ label }} alanında doğruluk %{{ low_threshold }} altında; bu testi düzenli aralıklarla tekrarlamanız önerilir.
+{% endfor %}
+{% for label in declining %}
+- {{ label }} skorlarında düşüş eğilimi var; sürerse bir uzmana danışmanız önerilir.
+{% endfor %}
+{% if not low_accuracy and not declining %}
+- Belirgin bir risk işareti yok; düzenli test takibine devam edin.
+{% endif %}
+"""
+
+_EN_HEADER = """\
+{% if start %}{{ total }} test results for {{ name or "the participant" }} between {{ start }} and {{ end }} were evaluated.
+{% else %}There are no test results in the selected range.
+{% endif %}
+"""
+
+_EN_ADVICE = """\
+## Recommendations
+{% for label in low_accuracy %}
+- {{ label }} accuracy is below {{ low_threshold }}%; repeating this test regularly is recommended.
+{% endfor %}
+{% for label in declining %}
+- {{ label }} scores show a declining trend; consider consulting a specialist if it persists.
+{% endfor %}
+{% if not low_accuracy and not declining %}
+- No notable risk signals; keep up regular testing.
+{% endif %}
+"""
+
+TEMPLATES: Dict[str, Dict[str, str]] = {
+    "tr": {
+        "general": "# Genel Bilişsel Rapor\n\n" + _TR_HEADER + """
+## Özet
+{% for t in tests %}
+- **{{ t.label }}**: {{ t.n }} test, ortalama skor {{ t.score_mean }}, doğruluk %{{ t.accuracy_mean }}, ortalama tepki süresi {{ t.rt_mean }} sn.
+{% endfor %}
+{% if strongest %}
+
+## Güçlü ve Gelişime Açık Alanlar
+- En güçlü alan: {{ strongest }}
+{% if weakest %}- Gelişim alanı: {{ weakest }}
+{% endif %}
+{% endif %}
+
+""" + _TR_ADVICE,
+        "performance": "# Performans Raporu\n\n" + _TR_HEADER + """
+{% for t in tests %}
+## {{ t.label }}
+- Test sayısı: {{ t.n }}
+- Ortalama / en iyi / son skor: {{ t.score_mean }} / {{ t.score_best }} / {{ t.score_last }}
+- Ortalama doğruluk: %{{ t.accuracy_mean }} (son: %{{ t.accuracy_last }})
+- Ortalama tepki süresi: {{ t.rt_mean }} sn (son: {{ t.rt_last }} sn)
+{% if t.stroop_effect is not none %}- Stroop etkisi: {{ t.stroop_effect }} sn
+{% endif %}
+
+{% endfor %}
+""" + _TR_ADVICE,
+        "trend": "# Eğilim Raporu\n\n" + _TR_HEADER + """
+{% for t in tests %}
+## {{ t.label }}
+- Eğilim: {{ {"up": "yükseliyor", "down": "düşüyor", "stable": "stabil"}[t.direction] }} (haftalık skor değişimi {{ t.slope_per_week }})
+- Doğruluk: %{{ t.accuracy_first }} → %{{ t.accuracy_last }}
+
+{% endfor %}
+{% if improving %}Gelişim gösteren alanlar: {{ improving | join(", ") }}.
+{% endif %}
+
+""" + _TR_ADVICE,
+    },
+    "en": {
+        "general": "# General Cognitive Report\n\n" + _EN_HEADER + """
+## Summary
+{% for t in tests %}
+- **{{ t.label }}**: {{ t.n }} tests, mean score {{ t.score_mean }}, accuracy {{ t.accuracy_mean }}%, mean response time {{ t.rt_mean }} s.
+{% endfor %}
+{% if strongest %}
+
+## Strengths and Areas to Develop
+- Strongest area: {{ strongest }}
+{% if weakest %}- Area to develop: {{ weakest }}
+{% endif %}
+{% endif %}
+
+""" + _EN_ADVICE,
+        "performance": "# Performance Report\n\n" + _EN_HEADER + """
+{% for t in tests %}
+## {{ t.label }}
+- Tests: {{ t.n }}
+- Mean / best / last score: {{ t.score_mean }} / {{ t.score_best }} / {{ t.score_last }}
+- Mean accuracy: {{ t.accuracy_mean }}% (last: {{ t.accuracy_last }}%)
+- Mean response time: {{ t.rt_mean }} s (last: {{ t.rt_last }} s)
+{% if t.stroop_effect is not none %}- Stroop effect: {{ t.stroop_effect }} s
+{% endif %}
+
+{% endfor %}
+""" + _EN_ADVICE,
+        "trend": "# Trend Report\n\n" + _EN_HEADER + """
+{% for t in tests %}
+## {{ t.label }}
+- Trend: {{ {"up": "improving", "down": "declining", "stable": "stable"}[t.direction] }} (weekly score change {{ t.slope_per_week }})
+- Accuracy: {{ t.accuracy_first }}% → {{ t.accuracy_last }}%
+
+{% endfor %}
+{% if improving %}Improving areas: {{ improving | join(", ") }}.
+{% endif %}
+
+""" + _EN_ADVICE,
+    },
+}
+
+_env = Environment(trim_blocks=True, lstrip_blocks=True, undefined=StrictUndefined, autoescape=False)
+_compiled: Dict[str, Any] = {}
+
+
+def render_template_report(metrics: Dict[str, Any], report_type: str, lang: str = "tr") -> str:
+    lang = lang if lang in TEMPLATES else "tr"
+    report_type = report_type if report_type in TEMPLATES[lang] else "general"
+    key = f"{lang}:{report_type}"
+    if key not in _compiled:
+        _compiled[key] = _env.from_string(TEMPLATES[lang][report_type])
+    return _compiled[key].render(**metrics, low_threshold=int(LOW_ACCURACY)).strip() + "\n"
+
+
+class TemplateReportGenerator:
+    """Local report engine with the `ReportGenerator` interface."""
+
+    def __init__(self, lang: str = "tr", enrich_with: Any = None) -> None:
+        self.lang = lang
+        self.enrich_with = enrich_with
+        # Set when the last stream lost its commentary; such output must not be
+        # cached or logged under the hybrid model_name. One generator per report.
+        self.degraded = False
+        self.model_name = f"template-v{TEMPLATE_VERSION}-{lang}"
+        if enrich_with is not None:
+            self.model_name += f"+{enrich_with.model_name}"
+
+    @property
+    def uses_model(self) -> bool:
+        return self.enrich_with is not None
+
+    def _base(self, user_data: Dict[str, Any], report_type: str) -> str:
+        return render_template_report(compute_report_metrics(user_data, self.lang), report_type, self.lang)
+
+    def _enrichment_heading(self) -> str:
+        return "\n## Yapay Zekâ Yorumu\n\n" if self.lang == "tr" else "\n## AI Commentary\n\n"
+
+    def _insights(self, m: Dict[str, Any]) -> List[str]:
+        tr = self.lang == "tr"
+        out = []
+        if m["strongest"]:
+            out.append(f"En güçlü alan: {m['strongest']}." if tr else f"Strongest area: {m['strongest']}.")
+        if m["weakest"]:
+            out.append(f"Gelişim alanı: {m['weakest']}." if tr else f"Area to develop: {m['weakest']}.")
+        for label in m["improving"]:
+            out.append(f"{label} skorları yükseliyor." if tr else f"{label} scores are improving.")
+        return out
+
+    def _risk_flags(self, m: Dict[str, Any]) -> List[Dict[str, str]]:
+        tr = self.lang == "tr"
+        flags = [{"label": f"{label}: düşüş eğilimi" if tr else f"{label}: declining trend", "severity": "high"}
+                 for label in m["declining"]]
+        flags += [{"label": f"{label}: düşük doğruluk" if tr else f"{label}: low accuracy", "severity": "medium"}
+                  for label in m["low_accuracy"]]
+        return flags
+
+    def preview(self, raw: str) -> str:
+        return raw
+
+    def finalize(self, user_data: Dict[str, Any], report_type: str, raw: str) -> Dict[str, Any]:
+        metrics = compute_report_metrics(user_data, self.lang)
+        advice_title = "Öneriler" if self.lang == "tr" else "Recommendations"
+        heading = self._enrichment_heading()
+        base, _, commentary = raw.partition(heading)
+        sections, recommendations = [], []
+        for s in markdown_to_sections(base):
+            if s["title"] == advice_title:
+                recommendations = [line.lstrip("- ").strip() for line in s["body"].splitlines() if line.strip()]
+            else:
+                sections.append(s)
+        if commentary.strip():
+            sections.append({"title": heading.strip("\n# "), "body": commentary.strip()})
+        return validate_report({
+            "sections": sections,
+            "insights": self._insights(metrics),
+            "riskFlags": self._risk_flags(metrics),
+            "recommendations": recommendations,
+        })
+
+    def generate_report(self, user_data: Dict[str, Any], report_type: str) -> Dict[str, Any]:
+        return self.finalize(user_data, report_type, "".join(self.stream_report_text(user_data, report_type)))
+
+    def generate_report_text(self, user_data: Dict[str, Any], report_type: str) -> str:
+        return report_to_markdown(self.generate_report(user_data, report_type), self.lang)
+
+    def stream_report_text(self, user_data: Dict[str, Any], report_type: str, timeout: Optional[float] = None) -> Iterator[str]:
+        self.degraded = False
+        base = self._base(user_data, report_type)
+        yield base
+        if self.enrich_with is None:
+            return
+        heading_sent = False
+        try:
+            for chunk in self.enrich_with.stream_commentary(user_data, report_type, timeout=timeout):
+                if not heading_sent:
+                    heading_sent = True
+                    yield self._enrichment_heading()
+                yield chunk
+        except Exception:
+            # Enrichment is optional: the computed report stands on its own.
+            self.degraded = True
+            if heading_sent:
+                yield "\n\n_(Yorum tamamlanamadı.)_\n" if self.lang == "tr" else "\n\n_(Commentary incomplete.)_\n"
+
+    def generate_pdf(self, report_text: str) -> bytes:
+        return render_report_pdf(report_text)
@@ -0,0 +1,157 @@
+"""Structured report format shared by the Gemini and template engines.
+
+Reports are stored as {"sections", "insights", "riskFlags",
+"recommendations"} on the `reports` document so later pages can reuse them
+without calling the model again.
+"""
+import json
+import re
+from typing import Any, Dict, List
+
+SEVERITIES = ("low", "medium", "high")
+
+MAX_SECTIONS = 12
+MAX_ITEMS = 10
+MAX_TITLE = 120
+MAX_BODY = 2000
+MAX_ITEM = 300
+
+# OpenAPI-subset schema passed to Gemini as `response_schema`.
+REPORT_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "sections": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"title": {"type": "STRING"}, "body": {"type": "STRING"}},
+                "required": ["title", "body"],
+            },
+        },
+        "insights": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "riskFlags": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"label": {"type": "STRING"}, "severity": {"type": "STRING"}},
+                "required": ["label", "severity"],
+            },
+        },
+        "recommendations": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["sections", "insights", "riskFlags", "recommendations"],
+}
+
+
+def _text(v: Any, limit: int) -> str:
+    return str(v if v is not None else "").strip()[:limit]
+
+
+def _strings(v: Any) -> List[str]:
+    if not isinstance(v, list):
+        raise ValueError("beklenen liste")
+    return [s for s in (_text(x, MAX_ITEM) for x in v[:MAX_ITEMS]) if s]
+
+
+def validate_report(obj: Any) -> Dict[str, Any]:
+    """Check `obj` against REPORT_SCHEMA and return a size-capped copy.
+
+    Raises ValueError when required fields are missing or have the wrong
+    shape; string lengths and list sizes are truncated rather than rejected.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError("Rapor bir JSON nesnesi olmalı.")
+    sections = obj.get("sections")
+    if not isinstance(sections, list) or not sections:
+        raise ValueError("Rapor en az bir bölüm içermeli.")
+    clean_sections = []
+    for s in sections[:MAX_SECTIONS]:
+        if not isinstance(s, dict) or "title" not in s or "body" not in s:
+            raise ValueError("Bölümler title ve body alanları içermeli.")
+        clean_sections.append({"title": _text(s["title"], MAX_TITLE), "body": _text(s["body"], MAX_BODY)})
+    flags = obj.get("riskFlags", [])
+    if not isinstance(flags, list):
+        raise ValueError("riskFlags bir liste olmalı.")
+    clean_flags = []
+    for f in flags[:MAX_ITEMS]:
+        if not isinstance(f, dict) or not f.get("label"):
+            raise ValueError("riskFlags öğeleri label alanı içermeli.")
+        severity = str(f.get("severity", "low")).lower()
+        clean_flags.append({"label": _text(f["label"], MAX_ITEM), "severity": severity if severity in SEVERITIES else "low"})
+    return {
+        "sections": clean_sections,
+        "insights": _strings(obj.get("insights", [])),
+        "riskFlags": clean_flags,
+        "recommendations": _strings(obj.get("recommendations", [])),
+    }
+
+
+def parse_report_json(raw: str) -> Dict[str, Any]:
+    text = raw.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    try:
+        obj = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"Model geçerli JSON döndürmedi: {e}") from e
+    return validate_report(obj)
+
+
+_LABELS = {
+    "tr": {"insights": "Öne Çıkanlar", "riskFlags": "Risk İşaretleri", "recommendations": "Öneriler",
+           "low": "düşük", "medium": "orta", "high": "yüksek"},
+    "en": {"insights": "Key Insights", "riskFlags": "Risk Flags", "recommendations": "Recommendations",
+           "low": "low", "medium": "medium", "high": "high"},
+}
+
+
+def report_to_markdown(report: Dict[str, Any], lang: str = "tr") -> str:
+    labels = _LABELS.get(lang, _LABELS["tr"])
+    parts: List[str] = []
+    for s in report.get("sections", []):
+        parts.append(f"## {s['title']}\n\n{s['body']}" if s.get("title") else s.get("body", ""))
+    if report.get("insights"):
+        parts.append(f"## {labels['insights']}\n\n" + "\n".join(f"- {i}" for i in report["insights"]))
+    if report.get("riskFlags"):
+        parts.append(f"## {labels['riskFlags']}\n\n" + "\n".join(
+            f"- {f['label']} ({labels.get(f['severity'], f['severity'])})" for f in report["riskFlags"]))
+    if report.get("recommendations"):
+        parts.append(f"## {labels['recommendations']}\n\n" + "\n".join(f"- {r}" for r in report["recommendations"]))
+    return "\n\n".join(parts).strip() + "\n"
+
+
+_JSON_STRING = r'"((?:[^"\\]|\\.)*)"'
+_PARTIAL_FIELD = re.compile(r'"(title|body)"\s*:\s*' + _JSON_STRING)
+
+
+def preview_partial_json(raw: str) -> str:
+    """Best-effort markdown for a JSON report that is still streaming in.
+
+    Only fully received section titles and bodies are shown; the rest of
+    the document appears once the stream completes and validates.
+    """
+    parts: List[str] = []
+    for key, value in _PARTIAL_FIELD.findall(raw):
+        try:
+            value = json.loads(f'"{value}"')
+        except ValueError:
+            continue
+        parts.append(f"## {value}" if key == "title" else value)
+    return "\n\n".join(parts)
+
+
+def markdown_to_sections(markdown: str) -> List[Dict[str, str]]:
+    """Split markdown on `#`/`##` headings into schema sections."""
+    sections: List[Dict[str, str]] = []
+    title, body = "", []
+    for line in markdown.splitlines():
+        m = re.match(r"^#{1,2}\s+(.*)$", line)
+        if m:
+            if title or "".join(body).strip():
+                sections.append({"title": title, "body": "\n".join(body).strip()})
+            title, body = m.group(1).strip(), []
+        else:
+            body.append(line)
+    if title or "".join(body).strip():
+        sections.append({"title": title, "body": "\n".join(body).strip()})
+    return sections
@@ -1,31 +1,221 @@
 import json
+import time
 import streamlit as st
 from typing import Any, Dict, List
+from services import metrics
 from services.firebase import get_firestore_client
-from ai import ReportGenerator
+from services.cache import get_cache
+from services.dates import completed_at, to_ms
+from services.profile import get_profile, load_profile_doc
+from services.report_cache import compute_report_key, find_indexed_report, get_report_cache
+from services.report_jobs import JobTimeout, ReportJob, get_report_job_queue
+from services.llm import get_model_client
+from services.rate_limit import RateLimitExceeded, TokenBucket, get_user_rate_limiter
+from services.storage import load_report_pdf, store_report_pdf
+from services.tracing import span
+from ai import PROMPT_VERSION, build_report_generator
+from report_schema import report_to_markdown
 from google.cloud import firestore as gfs
 from datetime import datetime
 
 
-def _collect_user_data(uid: str, start: datetime = None, end: datetime = None, types: List[str] = None) -> Dict[str, Any]:
-    db = get_firestore_client()
-    user_doc = db.collection("users").document(uid).get()
-    profile = user_doc.to_dict() if user_doc.exists else {}
-    results = [d.to_dict() | {"id": d.id} for d in db.collection("testResults").where("userId", "==", uid).stream()]
-    # simple client-side filter
-    def norm_date(r: Dict[str, Any]) -> datetime:
-        v = r.get("metadata", {}).get("_completedAtStr") or r.get("metadata", {}).get("completedAt")
-        try:
-            return datetime.fromisoformat(str(v).replace("Z", "+00:00"))
-        except Exception:
-            return datetime.utcnow()
-    if start and end:
-        results = [r for r in results if start <= norm_date(r) <= end]
+REPORT_CONTENT_LIMIT = 10000
+JOB_POLL_SECONDS = 1.0
+PAST_REPORTS_LIMIT = 20
+
+
+def _fetch_user_results(uid: str) -> List[Dict[str, Any]]:
+    results = [d.to_dict() | {"id": d.id} for d in get_firestore_client().collection("testResults").where("userId", "==", uid).stream()]
+    metrics.firestore_read("testResults", results)
+    return results
+
+
+def _fetch_user_results_between(uid: str, start_ms: int, end_ms: int) -> List[Dict[str, Any]]:
+    # Served by the userId + completedAtMs composite index (DEPLOYMENT.md).
+    query = (get_firestore_client().collection("testResults").where("userId", "==", uid)
+             .where("completedAtMs", ">=", start_ms).where("completedAtMs", "<=", end_ms).order_by("completedAtMs"))
+    results = [d.to_dict() | {"id": d.id} for d in query.stream()]
+    metrics.firestore_read("testResults", results)
+    return results
+
+
+def _collect_user_data(uid: str, start: datetime = None, end: datetime = None, types: List[str] = None,
+                       profile: Dict[str, Any] = None) -> Dict[str, Any]:
+    with span("report.collect_user_data", profile_cached=profile is not None) as s:
+        if profile is None:
+            profile = load_profile_doc(uid)
+        if start and end:
+            lo, hi = to_ms(start), to_ms(end)
+            results = get_cache().get("results", uid, f"range_{lo}_{hi}", lambda: _fetch_user_results_between(uid, lo, hi))
+        else:
+            results = get_cache().get("results", uid, "list", lambda: _fetch_user_results(uid))
+        s.set_attribute("documents", len(results))
     if types:
         results = [r for r in results if r.get("testType") in types]
     return {"profile": profile, "results": results}
 
 
+def _log_report(uid: str, report_type: str, structured: Dict[str, Any], cache_key: str, model_name: str,
+                start_dt: datetime, end_dt: datetime, test_types: List[str], lang: str = "tr",
+                pdf_key: str = "", pdf_url: str = "") -> None:
+    # The structured report is the source of truth; markdown is re-derived from it on read.
+    doc = {
+        "userId": uid,
+        "reportType": report_type,
+        "generatedAt": gfs.SERVER_TIMESTAMP,
+        "structured": structured,
+        "lang": lang,
+        "pdfUrl": pdf_url,
+        "pdfKey": pdf_key,
+        "cacheKey": cache_key,
+        "model": model_name,
+        "promptVersion": PROMPT_VERSION,
+        "parameters": {"dateRange": {"start": str(start_dt), "end": str(end_dt)}, "testTypes": test_types,
+                       "insights": structured.get("insights", [])},
+    }
+    get_firestore_client().collection("reports").add(doc)
+    metrics.firestore_write("reports", doc)
+
+
+def _report_markdown(doc: Dict[str, Any]) -> str:
+    if doc.get("structured"):
+        return report_to_markdown(doc["structured"], doc.get("lang", "tr"))
+    return doc.get("content", "")
+
+
+def _recent_reports(uid: str, limit: int) -> List[Dict[str, Any]]:
+    # Needs the (userId, generatedAt desc) composite index.
+    db = get_firestore_client()
+    query = (db.collection("reports").where("userId", "==", uid)
+             .order_by("generatedAt", direction=gfs.Query.DESCENDING).limit(limit))
+    reports = [doc.to_dict() | {"id": doc.id} for doc in query.stream()]
+    metrics.firestore_read("reports", reports)
+    return reports
+
+
+def latest_report(uid: str) -> Dict[str, Any]:
+    """Most recent stored report for `uid` ({} if none)."""
+    reports = _recent_reports(uid, 1)
+    return reports[0] if reports else {}
+
+
+def _render_past_reports(uid: str) -> None:
+    st.subheader("Geçmiş Raporlar")
+    reports = [r for r in _recent_reports(uid, PAST_REPORTS_LIMIT) if r.get("pdfKey")]
+    if not reports:
+        st.caption("Kayıtlı PDF rapor yok.")
+        return
+    labels = {f"{str(r.get('generatedAt', ''))[:16]} · {r.get('reportType', '')} · {r.get('model', '')}": r for r in reports}
+    choice = labels[st.selectbox("Rapor", list(labels.keys()))]
+    # Only the selected PDF is fetched, once per selection.
+    loaded = st.session_state.get("_past_report_pdf")
+    if not loaded or loaded[0] != choice["pdfKey"]:
+        loaded = (choice["pdfKey"], load_report_pdf(choice["pdfKey"]))
+        st.session_state["_past_report_pdf"] = loaded
+    if loaded[1] is None:
+        st.warning("PDF depolamada bulunamadı.")
+        return
+    st.download_button("Seçili Raporu İndir", loaded[1], file_name=f"neuroai_{choice.get('reportType', 'rapor')}.pdf",
+                       mime="application/pdf", key="past_report_download")
+
+
+def render_latest_insights(uid: str) -> None:
+    """Show insights and risk flags from the last stored report, without calling the model."""
+    doc = latest_report(uid)
+    structured = doc.get("structured") or {}
+    insights = structured.get("insights") or doc.get("parameters", {}).get("insights", [])
+    if not insights and not structured.get("riskFlags"):
+        st.caption("Henüz kayıtlı rapor içgörüsü yok. Raporlar sayfasından rapor oluşturabilirsiniz.")
+        return
+    for item in insights:
+        st.markdown(f"- {item}")
+    icons = {"high": "🔴", "medium": "🟠", "low": "🟡"}
+    for flag in structured.get("riskFlags", []):
+        st.markdown(f"- {icons.get(flag.get('severity'), '🟡')} {flag.get('label', '')}")
+    generated = doc.get("generatedAt")
+    if generated:
+        st.caption(f"Kaynak: {doc.get('reportType', '')} raporu, {str(generated)[:16]}")
+
+
+def _run_report_job(job: ReportJob, limiter: TokenBucket) -> None:
+    with span("report.job", job_id=job.id, report_type=job.report_type, engine=job.params.get("engine", "gemini"),
+              attempt=job.attempts) as s:
+        _generate_job_report(job, limiter)
+        s.set_attribute("from_cache", job.from_cache)
+
+
+def _generate_job_report(job: ReportJob, limiter: TokenBucket) -> None:
+    params = job.params
+    start_dt, end_dt = params.get("start"), params.get("end")
+    data = _collect_user_data(job.uid, start_dt, end_dt, params.get("testTypes"), params.get("profile"))
+    gen = build_report_generator(params.get("engine", "gemini"), params.get("lang", "tr"))
+    if gen.uses_model and get_model_client().breaker.state == "open":
+        # Gemini is failing fast right now; serve the computed report instead.
+        gen = build_report_generator("template", params.get("lang", "tr"))
+        job.notice = "Gemini şu anda kullanılamıyor; hızlı şablon raporu oluşturuldu."
+    cache_key = compute_report_key(data, job.report_type, gen.model_name, PROMPT_VERSION)
+    cache = get_report_cache()
+    cached = cache.get(cache_key)
+    if cached is not None:
+        job.text, job.pdf = cached
+        job.from_cache = True
+        return
+
+    indexed = find_indexed_report(job.uid, cache_key)
+    if indexed and (indexed.get("structured") or len(indexed.get("content", "")) < REPORT_CONTENT_LIMIT):
+        # Same input was reported before; only the PDF has to be rebuilt.
+        text = _report_markdown(indexed)
+        job.from_cache = True
+    else:
+        if gen.uses_model and not limiter.acquire(timeout=job.remaining()):
+            raise JobTimeout("Gemini istek kotası için beklerken zaman aşımı.")
+        raw = ""
+        for chunk in gen.stream_report_text(data, job.report_type, timeout=job.remaining()):
+            job.check_deadline()
+            raw += chunk
+            job.partial_text = gen.preview(raw)
+        # Schema violations raise ValueError, which the queue retries.
+        structured = gen.finalize(data, job.report_type, raw)
+        text = report_to_markdown(structured, params.get("lang", "tr"))
+        if getattr(gen, "degraded", False):
+            # Keyed as a hybrid report, this text would be served without commentary from now on.
+            job.notice = "Gemini yorumu alınamadı; rapor yorumsuz gösteriliyor ve kaydedilmedi. Daha sonra tekrar deneyin."
+            job.degraded = True
+            job.text, job.pdf = text, gen.generate_pdf(text)
+            return
+
+    job.check_deadline()
+    # Content-addressed: an identical report already in storage is neither re-rendered nor re-uploaded.
+    pdf_key, pdf_url, pdf_bytes = store_report_pdf(text, gen.generate_pdf)
+    cache.put(cache_key, text, pdf_bytes)
+    job.text, job.pdf = text, pdf_bytes
+    if job.from_cache:
+        return
+
+    _log_report(job.uid, job.report_type, structured, cache_key, gen.model_name, start_dt, end_dt,
+                params.get("testTypes"), params.get("lang", "tr"), pdf_key, pdf_url)
+
+
+def _render_job(job: ReportJob) -> None:
+    st.subheader("Önizleme")
+    if not job.finished:
+        st.caption(f"Rapor hazırlanıyor… (durum: {job.status}, deneme: {job.attempts})")
+        st.markdown(job.partial_text + "▌" if job.partial_text else "")
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+    if job.status == "failed":
+        st.error(f"Rapor oluşturulamadı: {job.error}")
+        return
+    if job.notice:
+        st.warning(job.notice)
+    st.markdown(job.text)
+    st.download_button("PDF İndir", job.pdf, file_name=f"neuroai_{job.report_type}.pdf", mime="application/pdf")
+    if job.from_cache:
+        st.info("Aynı filtrelerle oluşturulmuş rapor önbellekten getirildi.")
+    elif not job.degraded:
+        st.success("Rapor kaydedildi.")
+
+
 def render_reports_page() -> None:
     st.title("📋 Raporlar")
     uid = st.session_state.user.get("uid") if st.session_state.user else None
@@ -34,18 +224,15 @@ def render_reports_page() -> None:
         return
 
     report_type = st.selectbox("Rapor Türü", ["general", "performance", "trend"], index=0)
+    engines = {"Hızlı (şablon)": "template", "Şablon + Gemini yorumu": "hybrid", "Gemini": "gemini"}
+    col_engine, col_lang = st.columns(2)
+    engine = engines[col_engine.selectbox("Rapor Motoru", list(engines.keys()), index=2)]
+    lang = col_lang.selectbox("Dil", ["tr", "en"], index=0)
 
     # Filters
-    db = get_firestore_client()
-    raw = [d.to_dict() for d in db.collection("testResults").where("userId", "==", uid).stream()]
+    raw = get_cache().get("results", uid, "list", lambda: _fetch_user_results(uid))
     # dates
-    def norm_date(r: Dict[str, Any]) -> datetime:
-        v = r.get("metadata", {}).get("_completedAtStr") or r.get("metadata", {}).get("completedAt")
-        try:
-            return datetime.fromisoformat(str(v).replace("Z", "+00:00"))
-        except Exception:
-            return datetime.utcnow()
-    dates = [norm_date(r) for r in raw] if raw else []
+    dates = [d for d in map(completed_at, raw) if d is not None]
     if dates:
         dmin, dmax = min(dates), max(dates)
         d1, d2 = st.date_input("Tarih Aralığı", value=(dmin.date(), dmax.date()))
@@ -55,27 +242,25 @@ def render_reports_page() -> None:
     types = sorted(list({r.get("testType", "") for r in raw}))
     selected_types = st.multiselect("Test Türleri", options=types, default=types)
 
+    queue = get_report_job_queue()
     if st.button("Rapor Oluştur", type="primary"):
-        with st.spinner("Rapor oluşturuluyor..."):
-            start_dt = datetime.combine(d1, datetime.min.time()) if d1 else None
-            end_dt = datetime.combine(d2, datetime.max.time()) if d2 else None
-            data = _collect_user_data(uid, start_dt, end_dt, selected_types)
-            gen = ReportGenerator()
-            text = gen.generate_report_text(data, report_type)
-            pdf_path = gen.generate_pdf(text)
-
-        st.subheader("Önizleme")
-        st.text_area("İçerik", text, height=320)
-        with open(pdf_path, "rb") as f:
-            st.download_button("PDF İndir", f, file_name=f"neuroai_{report_type}.pdf", mime="application/pdf")
-
-        # Log to Firestore
-        get_firestore_client().collection("reports").add({
-            "userId": uid,
-            "reportType": report_type,
-            "generatedAt": gfs.SERVER_TIMESTAMP,
-            "content": text[:10000],
-            "pdfUrl": "",
-            "parameters": {"dateRange": {"start": str(start_dt), "end": str(end_dt)}, "testTypes": selected_types, "insights": []},
-        })
-        st.success("Rapor kaydedildi.")
\ No newline at end of file
+        start_dt = datetime.combine(d1, datetime.min.time()) if d1 else None
+        end_dt = datetime.combine(d2, datetime.max.time()) if d2 else None
+        # The job thread has no session state, so the cached profile travels with the job.
+        params = {"start": start_dt, "end": end_dt, "testTypes": selected_types, "engine": engine, "lang": lang,
+                  "profile": get_profile(uid)}
+        try:
+            get_user_rate_limiter().check(uid, "report")
+            job = queue.submit(uid, report_type, params, _run_report_job)
+            st.session_state.report_job_id = job.id
+        except RateLimitExceeded as e:
+            st.warning(f"Kısa sürede çok sayıda rapor istendi. Lütfen yaklaşık {max(1.0, e.retry_after):.0f} sn "
+                       f"sonra tekrar deneyin.")
+
+    # The job outlives the page: coming back shows the running or finished report.
+    job = queue.get(st.session_state.get("report_job_id", "")) or queue.latest_for_user(uid)
+    if job is not None:
+        _render_job(job)
+
+    st.divider()
+    _render_past_reports(uid)
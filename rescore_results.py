@@ -0,0 +1,269 @@
+"""Re-score stored test results after a scoring rule change.
+
+    python rescore_results.py --dry-run --show 50   # what would change, nothing written
+    python rescore_results.py --workers 4           # write corrected metrics
+
+Streams `testResults` page by page in document order, re-evaluates every
+stored response of documents whose `scoringVersion` is older than
+`tests.SCORING_VERSION` on a process pool, and writes the corrected
+`score` / `accuracy` / `averageResponseTime` / Stroop analysis (and the
+per-response `correct` flags) back in batched commits. The last committed
+document id is checkpointed, so re-running the same command resumes.
+
+Responses can only be re-evaluated from what was stored with them: results
+saved before `meta.expected` existed keep their stored `correct` flag for
+question types whose answer is not in the document. Compacted results
+(see services.retention) are skipped; rehydrate them with --restore first.
+Imported results (scoringVersion 0, see import_results) are re-evaluated
+like any other; those imported without responses keep their scores.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from google.cloud import firestore as gfs
+
+from services.cache import get_cache
+from services.firebase import get_firestore_client
+from tests import SCORING_VERSION, WORD_RECALL_DIVISOR
+
+
+DEFAULT_CHECKPOINT = os.path.join(".cache", "rescore_checkpoint.json")
+# Fields compared and written back; dotted paths for the nested Stroop analysis.
+METRIC_FIELDS = ("score", "accuracy", "averageResponseTime", "analysis.stroopEffect", "analysis.errorRate")
+
+
+def _kind(question_id: str) -> str:
+    return str(question_id).rsplit("_", 1)[0]
+
+
+def _meta(responses: List[Dict[str, Any]], key: str) -> np.ndarray:
+    return np.array([(r.get("meta") or {}).get(key) for r in responses], dtype=object)
+
+
+def _as_numbers(values: np.ndarray) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    for i, v in enumerate(values):
+        try:
+            out[i] = int(str(v).strip())
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def _score_word_list(responses: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    recalled, total = _meta(responses, "recalled"), _meta(responses, "total")
+    known = np.array([r is not None and t is not None for r, t in zip(recalled, total)])
+    r = np.where(known, recalled, 0).astype(int)
+    t = np.where(known, total, 0).astype(int)
+    return r >= np.maximum(1, t // WORD_RECALL_DIVISOR), known
+
+
+def _score_pattern(responses: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    selected, expected = _meta(responses, "selected"), _meta(responses, "expected")
+    known = np.array([e is not None for e in expected])
+    correct = np.array([bool(k) and sorted(s or []) == sorted(e) for s, e, k in zip(selected, expected, known)])
+    return correct, known
+
+
+def _score_exact(responses: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    expected = _meta(responses, "expected")
+    given = np.array([r.get("response") for r in responses], dtype=object)
+    return given == expected, np.array([e is not None for e in expected])
+
+
+def _score_stripped(responses: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    expected = _meta(responses, "expected")
+    given = np.array([str(r.get("response")).strip() for r in responses], dtype=object)
+    return given == np.array([str(e).strip() for e in expected], dtype=object), np.array([e is not None for e in expected])
+
+
+def _score_integer(responses: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    expected = _meta(responses, "expected")
+    # NaN never equals NaN, so unparsable input scores as wrong, like evaluate_answer.
+    return _as_numbers(np.array([r.get("response") for r in responses], dtype=object)) == _as_numbers(expected), \
+        np.array([e is not None for e in expected])
+
+
+# question-id prefix -> vectorized scorer returning (correct, rule_applicable) per response
+SCORERS = {
+    "mem_words": _score_word_list,
+    "mem_num": _score_stripped,
+    "mem_pattern": _score_pattern,
+    "mem_pairs": _score_integer,
+    "att_present": _score_exact,
+    "att_count": _score_integer,
+    "stroop": _score_exact,
+}
+
+
+def rescore_chunk(docs: List[Tuple[str, str, List[Dict[str, Any]]]]) -> List[Tuple[str, Dict[str, Any], List[bool]]]:
+    """Worker entry point: (id, testType, responses) -> (id, metrics, per-response correct)."""
+    flat = [(i, r) for i, (_, _, responses) in enumerate(docs) for r in responses]
+    doc_idx = np.array([i for i, _ in flat], dtype=int)
+    rts = np.array([float(r.get("responseTime", 0.0)) for _, r in flat])
+    correct = np.array([bool(r.get("correct")) for _, r in flat])
+    kinds = np.array([_kind(r.get("questionId", "")) for _, r in flat], dtype=object)
+    for kind, scorer in SCORERS.items():
+        idx = np.flatnonzero(kinds == kind)
+        if len(idx):
+            new, applicable = scorer([flat[j][1] for j in idx])
+            correct[idx] = np.where(applicable, new, correct[idx])
+    condition = np.array([(r.get("meta") or {}).get("condition") for _, r in flat], dtype=object)
+
+    n_docs = len(docs)
+    counts = np.bincount(doc_idx, minlength=n_docs)
+    hits = np.bincount(doc_idx, weights=correct, minlength=n_docs)
+    rt_sums = np.bincount(doc_idx, weights=rts, minlength=n_docs)
+    cond_stats = {}
+    for name in ("congruent", "incongruent"):
+        mask = condition == name
+        cond_stats[name] = (np.bincount(doc_idx[mask], minlength=n_docs), np.bincount(doc_idx[mask], weights=rts[mask], minlength=n_docs))
+
+    out = []
+    for i, (doc_id, test_type, _) in enumerate(docs):
+        # Same arithmetic and rounding as CognitiveTest.calculate_metrics / save_results.
+        if counts[i] == 0:
+            metrics: Dict[str, Any] = {"score": 0, "accuracy": 0.0, "averageResponseTime": 0.0}
+        else:
+            accuracy = float(hits[i]) / int(counts[i]) * 100.0
+            metrics = {"score": int(hits[i]), "accuracy": round(accuracy, 2), "averageResponseTime": round(float(rt_sums[i]) / int(counts[i]), 3)}
+        if test_type == "stroop":
+            (c_n, c_sum), (i_n, i_sum) = cond_stats["congruent"], cond_stats["incongruent"]
+            effect = float(i_sum[i] / i_n[i] - c_sum[i] / c_n[i]) if c_n[i] and i_n[i] else 0.0
+            metrics["analysis.stroopEffect"] = round(effect, 3) if counts[i] else 0.0
+            metrics["analysis.errorRate"] = 100 - metrics["accuracy"]
+        out.append((doc_id, metrics, correct[doc_idx == i].tolist()))
+    return out
+
+
+def _stored(data: Dict[str, Any], field: str) -> Any:
+    node: Any = data
+    for part in field.split("."):
+        node = node.get(part) if isinstance(node, dict) else None
+    return node
+
+
+def _changes(data: Dict[str, Any], metrics: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    changes = {}
+    for field in METRIC_FIELDS:
+        if field in metrics:
+            old, new = _stored(data, field), metrics[field]
+            if not (isinstance(old, (int, float)) and abs(old - new) < 1e-9):
+                changes[field] = (old, new)
+    return changes
+
+
+class Checkpoint:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.state: Dict[str, Any] = {"scoringVersion": SCORING_VERSION, "lastId": None, "counters": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("scoringVersion") == SCORING_VERSION:
+                self.state = stored
+
+    def save(self, last_id: str, counters: Dict[str, int]) -> None:
+        self.state.update(lastId=last_id, counters=counters)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def run(workers: int, page_size: int, chunk_size: int, dry_run: bool, checkpoint: Optional[Checkpoint],
+        show: int = 20) -> Dict[str, int]:
+    db = get_firestore_client()
+    results = db.collection("testResults")
+    counters = {"scanned": 0, "current": 0, "archived": 0, "noResponses": 0, "changed": 0, "stamped": 0}
+    last_id = checkpoint.state["lastId"] if checkpoint else None
+    if checkpoint and not dry_run:
+        counters.update(checkpoint.state.get("counters", {}))
+    cursor = results.document(last_id).get() if last_id else None
+    touched_users = set()
+    shown = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # No order_by: Firestore returns documents by id, which is what the cursor resumes on.
+            page = list((results.start_after(cursor) if cursor is not None else results).limit(page_size).stream())
+            if not page:
+                break
+            cursor = page[-1]
+            todo: Dict[str, Dict[str, Any]] = {}
+            for snap in page:
+                data = snap.to_dict()
+                counters["scanned"] += 1
+                if int(data.get("scoringVersion") or 0) >= SCORING_VERSION:
+                    counters["current"] += 1
+                elif "responses" not in data:
+                    counters["archived"] += 1
+                elif not data["responses"]:
+                    # Imported summaries without trials: nothing to re-evaluate, keep the source's score.
+                    counters["noResponses"] += 1
+                else:
+                    todo[snap.id] = data
+            items = [(doc_id, data.get("testType", ""), data["responses"]) for doc_id, data in todo.items()]
+            chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+            batch = db.batch()
+            for doc_id, metrics, flags in (row for chunk in pool.map(rescore_chunk, chunks) for row in chunk):
+                data = todo[doc_id]
+                changes = _changes(data, metrics)
+                flags_changed = [bool(r.get("correct")) for r in data["responses"]] != flags
+                update: Dict[str, Any] = {"scoringVersion": SCORING_VERSION, "rescoredAt": gfs.SERVER_TIMESTAMP}
+                if changes or flags_changed:
+                    counters["changed"] += 1
+                    update.update({field: new for field, (_, new) in changes.items()})
+                    if flags_changed:
+                        update["responses"] = [{**r, "correct": c} for r, c in zip(data["responses"], flags)]
+                    if dry_run and shown < show:
+                        shown += 1
+                        diff = ", ".join(f"{f} {old} → {new}" for f, (old, new) in changes.items()) or "yalnızca yanıt doğruluk işaretleri"
+                        print(f"{doc_id} ({data.get('userId')}): {diff}")
+                else:
+                    counters["stamped"] += 1
+                if not dry_run:
+                    batch.update(results.document(doc_id), update)
+                    touched_users.add(data.get("userId"))
+            if not dry_run:
+                if todo:
+                    batch.commit()
+                if checkpoint:
+                    checkpoint.save(cursor.id, counters)
+            print(f"… {counters['scanned']} tarandı, {counters['changed']} değişti", flush=True)
+            if len(page) < page_size:
+                break
+    for uid in touched_users:
+        get_cache().invalidate("results", uid)
+    return counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--page-size", type=int, default=400, help="documents per read page and commit (≤ 500)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="documents per worker task")
+    parser.add_argument("--dry-run", action="store_true", help="print differences, write nothing")
+    parser.add_argument("--show", type=int, default=20, help="differences to print in --dry-run")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first document")
+    args = parser.parse_args()
+    if args.page_size > 500:
+        raise SystemExit("--page-size en fazla 500 olabilir (Firestore toplu yazma sınırı)")
+
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.state.update(lastId=None, counters={})
+    counters = run(args.workers, args.page_size, args.chunk_size, args.dry_run, checkpoint, args.show)
+    print(json.dumps({"scoringVersion": SCORING_VERSION, "dryRun": args.dry_run, **counters}))
+    if counters["changed"] and not args.dry_run:
+        print("Kohort özetlerini güncellemek için: python -m services.cohort_stats --rebuild")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
+from services import metrics
+from services.cache import get_cache
 from services.firebase import get_firestore_client
+from reports import render_latest_insights
+from rt_analytics import ANALYTICS_VERSION, analyze_results
 from typing import List, Dict, Any
-from datetime import datetime
 
 
 def _fetch_user_results(uid: str) -> List[Dict[str, Any]]:
@@ -14,14 +17,72 @@ def _fetch_user_results(uid: str) -> List[Dict[str, Any]]:
         item = d.to_dict()
         item["id"] = d.id
         results.append(item)
+    metrics.firestore_read("testResults", results)
     return results
 
 
-def _normalize_date(v: Any) -> datetime:
-    try:
-        return datetime.fromisoformat(str(v).replace("Z", "+00:00"))
-    except Exception:
-        return datetime.utcnow()
+# Time-bucket label -> frame column filled from the stored completedDay/Week/Month fields.
+BUCKETS = {"Gün": "Day", "Hafta": "Week", "Ay": "Month"}
+
+
+def _results_frame(data: List[Dict[str, Any]]) -> pd.DataFrame:
+    # Documents not yet backfilled (python -m services.dates backfill) have no date and are left out.
+    df = pd.DataFrame([
+        {
+            "Date": r["completedAtMs"],
+            "Score": r.get("score", 0),
+            "Test": r.get("testType", ""),
+            "Accuracy": r.get("accuracy", 0.0),
+            "AvgRT": r.get("averageResponseTime", 0.0),
+            "Day": r.get("completedDay"),
+            "Week": r.get("completedWeek"),
+            "Month": r.get("completedMonth"),
+        }
+        for r in data if r.get("completedAtMs") is not None
+    ], columns=["Date", "Score", "Test", "Accuracy", "AvgRT", *BUCKETS.values()])
+    df["Date"] = pd.to_datetime(df["Date"], unit="ms")
+    return df
+
+
+def _completed_key(r: Dict[str, Any]) -> int:
+    return r.get("completedAtMs") or 0
+
+
+def _render_rt_analytics(analytics: Dict[str, Any]) -> None:
+    tests = {t: a for t, a in analytics["tests"].items() if a.get("trials")}
+    if not tests:
+        st.write("Deneme düzeyinde veri yok.")
+        return
+    rows = []
+    for t, a in tests.items():
+        exg = a.get("ex_gaussian", {})
+        rows.append({
+            "Test": t, "Oturum": a["sessions"], "Deneme": a["trials"],
+            "Medyan RT": a.get("median"), "IQR": a.get("iqr"),
+            "μ": exg.get("mu"), "σ": exg.get("sigma"), "τ": exg.get("tau"),
+            "Hata sonrası yavaşlama": a["post_error_slowing"]["pes"],
+            "RT–doğruluk r": a["speed_accuracy"]["rt_accuracy_r"],
+            "IES": a["speed_accuracy"]["ies"],
+            "Hızlı tahmin %": round(a["flags"]["fast_guess_rate"] * 100, 1),
+            "Yavaş aykırı %": round(a["flags"]["slow_outlier_rate"] * 100, 1),
+        })
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    st.caption("Doğru yanıtların RT'leri (s) üzerinden; μ/σ/τ ex-Gauss uyumu, IES = ortalama doğru RT / doğruluk oranı.")
+
+    selected = st.selectbox("RT dağılımı", list(tests.keys()))
+    hist = tests[selected].get("histogram")
+    if hist:
+        edges = hist["edges"]
+        bars = pd.DataFrame({"RT": edges[:-1], "RT_end": edges[1:], "Deneme": hist["counts"]})
+        st.altair_chart(alt.Chart(bars).mark_bar().encode(
+            x=alt.X("RT:Q", title="Tepki süresi (s)"), x2="RT_end:Q", y=alt.Y("Deneme:Q", title="Deneme"),
+        ).properties(height=220), use_container_width=True)
+    inattentive = tests[selected]["flags"]["inattentive_sessions"]
+    if inattentive:
+        st.warning(f"{len(inattentive)} oturumda dikkatsizlik işareti var (çok hızlı/yavaş yanıtlar veya düşük doğruluk).")
+    archived = tests[selected].get("archived_sessions", 0)
+    if archived:
+        st.caption(f"{archived} eski oturumun denemeleri arşivde olduğu için dahil edilmedi.")
 
 
 def render_results_page() -> None:
@@ -31,21 +92,16 @@ def render_results_page() -> None:
         st.warning("Giriş gerekli")
         return
 
-    data = _fetch_user_results(uid)
+    cache = get_cache()
+    data = cache.get("results", uid, "list", lambda: _fetch_user_results(uid))
     if not data:
         st.info("Henüz sonuç yok.")
         return
 
-    df = pd.DataFrame([
-        {
-            "Date": (_normalize_date(r.get("metadata", {}).get("_completedAtStr") or r.get("metadata", {}).get("completedAt"))),
-            "Score": r.get("score", 0),
-            "Test": r.get("testType", ""),
-            "Accuracy": r.get("accuracy", 0.0),
-            "AvgRT": r.get("averageResponseTime", 0.0),
-        }
-        for r in data
-    ])
+    df = cache.get("results", uid, "results_frame", lambda: _results_frame(data), shared=False)
+    if df.empty:
+        st.info("Tarihli sonuç yok. Eski kayıtların tarih alanları henüz doldurulmamış olabilir.")
+        return
 
     # Filters
     types = sorted(df["Test"].unique().tolist())
@@ -53,15 +109,27 @@ def render_results_page() -> None:
     date_min, date_max = df["Date"].min(), df["Date"].max()
     d1, d2 = st.date_input("Tarih Aralığı", value=(date_min.date(), date_max.date()))
 
-    fdf = df[(df["Test"].isin(selected)) & (df["Date"].dt.date >= d1) & (df["Date"].dt.date <= d2)] if not df.empty else df
+    fdf = df[(df["Test"].isin(selected)) & (df["Date"].dt.date >= d1) & (df["Date"].dt.date <= d2)]
 
     st.subheader("Zaman Bazlı Performans")
-    chart = alt.Chart(fdf).mark_line(point=True).encode(
-        x=alt.X("Date:T", title="Tarih"),
-        y=alt.Y("Score:Q", title="Skor"),
-        color=alt.Color("Test:N", title="Test Türü"),
-        tooltip=["Date:T", "Test:N", "Score:Q"],
-    ).properties(height=320)
+    scale = st.radio("Zaman Ölçeği", ["Oturum", *BUCKETS], horizontal=True)
+    if scale == "Oturum":
+        chart = alt.Chart(fdf).mark_line(point=True).encode(
+            x=alt.X("Date:T", title="Tarih"),
+            y=alt.Y("Score:Q", title="Skor"),
+            color=alt.Color("Test:N", title="Test Türü"),
+            tooltip=["Date:T", "Test:N", "Score:Q"],
+        )
+    else:
+        col = BUCKETS[scale]
+        series = fdf.groupby([col, "Test"], as_index=False).agg(Score=("Score", "mean"), Count=("Score", "size"))
+        chart = alt.Chart(series).mark_line(point=True).encode(
+            x=alt.X(f"{col}:O", title=scale),
+            y=alt.Y("Score:Q", title="Ortalama Skor"),
+            color=alt.Color("Test:N", title="Test Türü"),
+            tooltip=[f"{col}:O", "Test:N", "Score:Q", "Count:Q"],
+        )
+    chart = chart.properties(height=320)
     st.altair_chart(chart, use_container_width=True)
 
     col1, col2 = st.columns(2)
@@ -76,7 +144,7 @@ def render_results_page() -> None:
         st.altair_chart(scat, use_container_width=True)
     with col2:
         st.subheader("Özet Tablosu")
-        show = fdf.sort_values("Date", ascending=False).copy()
+        show = fdf.drop(columns=list(BUCKETS.values())).sort_values("Date", ascending=False)
         show["Date"] = show["Date"].dt.strftime("%Y-%m-%d %H:%M")
         st.dataframe(show, use_container_width=True, hide_index=True)
 
@@ -90,6 +158,11 @@ def render_results_page() -> None:
     )
     st.altair_chart(bar, use_container_width=True)
 
+    # Trial-level analytics over all sessions; recomputed only when a new result bumps the cache version.
+    st.subheader("Tepki Süresi Dağılımı")
+    analytics = cache.get("results", uid, f"rt_analytics_v{ANALYTICS_VERSION}", lambda: analyze_results(data, _completed_key))
+    _render_rt_analytics(analytics)
+
     # Insights placeholder (simple heuristic)
     st.subheader("Performans İçgörüleri")
     if not fdf.empty:
@@ -97,4 +170,6 @@ def render_results_page() -> None:
         worst = agg.sort_values("Score").head(1)["Test"].values[0]
         st.write(f"En güçlü alan: {best}. Gelişim alanı: {worst}.")
     else:
-        st.write("Yeterli veri yok.")
\ No newline at end of file
+        st.write("Yeterli veri yok.")
+    st.markdown("**Son rapordan**")
+    render_latest_insights(uid)
\ No newline at end of file
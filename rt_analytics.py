@@ -0,0 +1,127 @@
+"""Trial-level reaction-time analytics across a user's sessions.
+
+All stored `responses` of one test type are flattened into NumPy arrays
+(RT, correctness, session index) and summarised without per-trial Python
+loops: median/IQR of correct RTs, an ex-Gaussian fit, post-error slowing,
+the speed-accuracy relation across sessions and fast-guess / slow-outlier
+flags. Sessions whose trials were archived by services.retention only
+contribute their session-level fields.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+ANALYTICS_VERSION = 1
+# Faster than this is an anticipation, not a response to the stimulus.
+FAST_GUESS_SECONDS = 0.2
+# Slow outliers lie beyond Q3 + SLOW_IQR_FACTOR * IQR of the user's correct RTs.
+SLOW_IQR_FACTOR = 3.0
+# A session with more flagged trials than this share, or accuracy below chance-ish, is marked.
+INATTENTIVE_FLAG_SHARE = 0.2
+INATTENTIVE_ACCURACY = 40.0
+HISTOGRAM_BINS = 20
+
+
+def _opt(v: float, n: int = 3) -> Optional[float]:
+    return round(float(v), n) if np.isfinite(v) else None
+
+
+def trial_arrays(results: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Flatten `responses` of the given results (chronological order expected) into arrays."""
+    sessions = [r for r in results if r.get("responses")]
+    lengths = np.array([len(r["responses"]) for r in sessions], dtype=int)
+    flat = [t for r in sessions for t in r["responses"]]
+    return {
+        "rt": np.array([float(t.get("responseTime", 0.0)) for t in flat]),
+        "correct": np.array([bool(t.get("correct")) for t in flat]),
+        "session": np.repeat(np.arange(len(sessions)), lengths),
+        "n_sessions": np.array(len(sessions)),
+    }
+
+
+def ex_gaussian_moments(rt: np.ndarray) -> Dict[str, Optional[float]]:
+    """Method-of-moments ex-Gaussian (mu, sigma, tau); tau is capped so sigma stays real."""
+    if len(rt) < 3:
+        return {"mu": None, "sigma": None, "tau": None}
+    m, s = rt.mean(), rt.std(ddof=1)
+    skew = float(((rt - m) ** 3).mean() / s ** 3) if s > 0 else 0.0
+    tau = s * (max(skew, 0.0) / 2.0) ** (1.0 / 3.0)
+    tau = min(tau, 0.95 * s)
+    return {"mu": _opt(m - tau), "sigma": _opt(np.sqrt(max(s ** 2 - tau ** 2, 0.0))), "tau": _opt(tau)}
+
+
+def post_error_slowing(rt: np.ndarray, correct: np.ndarray, session: np.ndarray) -> Dict[str, Any]:
+    """Robust PES: mean of RT(E+1) - RT(E-1) over errors flanked by correct trials of the same session."""
+    if len(rt) < 3:
+        return {"pes": None, "n": 0}
+    mid = np.arange(1, len(rt) - 1)
+    ok = (~correct[mid] & correct[mid - 1] & correct[mid + 1]
+          & (session[mid - 1] == session[mid]) & (session[mid + 1] == session[mid]))
+    diffs = rt[mid[ok] + 1] - rt[mid[ok] - 1]
+    return {"pes": _opt(diffs.mean()) if len(diffs) else None, "n": int(len(diffs))}
+
+
+def speed_accuracy(rt: np.ndarray, correct: np.ndarray, session: np.ndarray, n_sessions: int) -> Dict[str, Any]:
+    """Across sessions: correlation of mean RT with accuracy, and inverse efficiency (mean correct RT / P(correct))."""
+    counts = np.bincount(session, minlength=n_sessions)
+    acc = np.bincount(session, weights=correct, minlength=n_sessions) / np.maximum(counts, 1)
+    mean_rt = np.bincount(session, weights=rt, minlength=n_sessions) / np.maximum(counts, 1)
+    correct_counts = np.bincount(session[correct], minlength=n_sessions)
+    mean_correct_rt = np.bincount(session[correct], weights=rt[correct], minlength=n_sessions) / np.maximum(correct_counts, 1)
+    valid = counts > 0
+    r = None
+    if valid.sum() >= 3 and np.ptp(mean_rt[valid]) > 0 and np.ptp(acc[valid]) > 0:
+        r = _opt(np.corrcoef(mean_rt[valid], acc[valid])[0, 1])
+    ies = np.where(acc > 0, mean_correct_rt / np.where(acc > 0, acc, 1), np.nan)
+    return {"rt_accuracy_r": r, "ies": _opt(np.nanmedian(ies[valid])) if np.isfinite(ies[valid]).any() else None,
+            "session_accuracy": acc, "session_counts": counts}
+
+
+def outlier_flags(rt: np.ndarray, correct: np.ndarray) -> Dict[str, Any]:
+    correct_rt = rt[correct]
+    q1, q3 = np.percentile(correct_rt, [25, 75]) if len(correct_rt) else (np.nan, np.nan)
+    slow_limit = q3 + SLOW_IQR_FACTOR * (q3 - q1) if len(correct_rt) >= 4 else np.inf
+    fast, slow = rt < FAST_GUESS_SECONDS, rt > slow_limit
+    return {"fast": fast, "slow": slow, "slow_limit": _opt(slow_limit)}
+
+
+def analyze_test(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Distribution features for one test type's sessions."""
+    arrays = trial_arrays(results)
+    rt, correct, session = arrays["rt"], arrays["correct"], arrays["session"]
+    n_sessions = int(arrays["n_sessions"])
+    out: Dict[str, Any] = {"sessions": n_sessions, "archived_sessions": len(results) - n_sessions, "trials": int(len(rt))}
+    if not len(rt):
+        return out
+    correct_rt = rt[correct]
+    if len(correct_rt):
+        q1, med, q3 = np.percentile(correct_rt, [25, 50, 75])
+        out.update(median=_opt(med), iqr=_opt(q3 - q1))
+        counts, edges = np.histogram(correct_rt, bins=HISTOGRAM_BINS)
+        out["histogram"] = {"edges": [round(float(e), 4) for e in edges], "counts": counts.tolist()}
+        out["ex_gaussian"] = ex_gaussian_moments(correct_rt)
+    out["post_error_slowing"] = post_error_slowing(rt, correct, session)
+    sat = speed_accuracy(rt, correct, session, n_sessions)
+    out["speed_accuracy"] = {"rt_accuracy_r": sat["rt_accuracy_r"], "ies": sat["ies"]}
+    flags = outlier_flags(rt, correct)
+    flagged = flags["fast"] | flags["slow"]
+    flag_share = np.bincount(session, weights=flagged, minlength=n_sessions) / np.maximum(sat["session_counts"], 1)
+    inattentive = (flag_share > INATTENTIVE_FLAG_SHARE) | (sat["session_accuracy"] * 100.0 < INATTENTIVE_ACCURACY)
+    sessions = [r for r in results if r.get("responses")]
+    out["flags"] = {
+        "fast_guess_rate": _opt(flags["fast"].mean()),
+        "slow_outlier_rate": _opt(flags["slow"].mean()),
+        "slow_limit": flags["slow_limit"],
+        "inattentive_sessions": [sessions[i].get("id") for i in np.flatnonzero(inattentive)],
+    }
+    return out
+
+
+def analyze_results(results: List[Dict[str, Any]], date_key) -> Dict[str, Any]:
+    """Features per test type; `date_key(result)` orders sessions chronologically (PES needs trial order)."""
+    ordered = sorted(results, key=date_key)
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for r in ordered:
+        by_type.setdefault(r.get("testType", ""), []).append(r)
+    return {"version": ANALYTICS_VERSION, "tests": {t: analyze_test(rs) for t, rs in sorted(by_type.items())}}
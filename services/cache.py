@@ -0,0 +1,238 @@
+"""Two-level cache for per-user reads: an in-process LRU in front of a shared KV store.
+
+Keys are `{namespace}:{uid}:v{version}:{part}`. The version lives in the
+shared store and `invalidate(namespace, uid)` bumps it, so every replica
+misses on its next version check (at most `version_check_seconds` later;
+immediately on the replica that wrote). Stale entries are never deleted,
+they just stop being addressed and age out. Concurrent misses for one key
+are collapsed: threads of a replica wait on a per-key lock, replicas
+take a short lease in the shared store and the losers poll for the value.
+
+Cached values are shared between sessions; callers must not mutate them.
+"""
+import contextlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from services import metrics
+from services.config import secrets_section
+from services.session_store import json_dumps, json_loads
+
+
+class InProcessKV:
+    """Single-replica stand-in for the shared tier."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None or entry[1] < now:
+            self._data.pop(key, None)
+            return None
+        return entry[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key, time.time())
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set only if absent; True when this call created the key."""
+        now = time.time()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._data[key] = (value, now + ttl)
+            return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._live(key, time.time()) or 0) + 1
+            self._data[key] = (str(value).encode(), float("inf"))
+            return value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SqliteKV:
+    """Shared tier on a SQLite file, a local stand-in for Redis/Memcached."""
+
+    def __init__(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM kv WHERE key = ? AND expires >= ?", (key, time.time())).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, value, time.time() + ttl))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM kv WHERE key = ? AND expires < ?", (key, now))
+                created = self._conn.execute("INSERT OR IGNORE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                                             (key, value, now + ttl)).rowcount == 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return created
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+                value = int(bytes(row[0]) if row else 0) + 1
+                self._conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                                   (key, str(value).encode(), float("inf")))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+
+class TwoLevelCache:
+    def __init__(self, shared: Any, max_entries: int = 512, ttl_seconds: float = 3600.0,
+                 version_check_seconds: float = 1.0, lease_seconds: float = 10.0) -> None:
+        self.shared = shared
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self.lease_seconds = lease_seconds
+        self._local: "OrderedDict[str, Any]" = OrderedDict()
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._flights: Dict[str, list] = {}
+
+    def _version(self, namespace: str, uid: str) -> int:
+        vkey = f"v:{namespace}:{uid}"
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(vkey)
+        if cached and now - cached[1] < self.version_check_seconds:
+            return cached[0]
+        version = int(self.shared.get(vkey) or 0)
+        with self._lock:
+            self._versions[vkey] = (version, now)
+        return version
+
+    def invalidate(self, namespace: str, uid: str) -> None:
+        vkey = f"v:{namespace}:{uid}"
+        version = self.shared.incr(vkey)
+        with self._lock:
+            self._versions[vkey] = (version, time.monotonic())
+
+    def _local_get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if key not in self._local:
+                return False, None
+            self._local.move_to_end(key)
+            return True, self._local[key]
+
+    def _local_put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    @contextlib.contextmanager
+    def _single_flight(self, key: str) -> Iterator[None]:
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if flight[1] == 0:
+                    self._flights.pop(key, None)
+
+    def _wait_for_shared(self, key: str) -> Optional[bytes]:
+        deadline = time.monotonic() + self.lease_seconds
+        delay = 0.02
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            data = self.shared.get(key)
+            if data is not None or self.shared.get(f"lease:{key}") is None:
+                return data
+            delay = min(delay * 2, 0.5)
+        return None
+
+    def get(self, namespace: str, uid: str, part: str, loader: Callable[[], Any], shared: bool = True) -> Any:
+        """Cached `loader()`; `shared=False` keeps the value in this process only
+        (for objects such as DataFrames that are cheap to rebuild from a shared entry)."""
+        key = f"{namespace}:{uid}:v{self._version(namespace, uid)}:{part}"
+        found, value = self._local_get(key)
+        if found:
+            metrics.inc("cache_requests_total", namespace=namespace, tier="local")
+            return value
+        with self._single_flight(key):
+            found, value = self._local_get(key)
+            if found:
+                metrics.inc("cache_requests_total", namespace=namespace, tier="local")
+                return value
+            if not shared:
+                value = loader()
+                metrics.inc("cache_requests_total", namespace=namespace, tier="miss")
+                self._local_put(key, value)
+                return value
+            data = self.shared.get(key)
+            if data is None and not self.shared.add(f"lease:{key}", b"1", self.lease_seconds):
+                # Another replica is loading this key.
+                data = self._wait_for_shared(key)
+            if data is not None:
+                value = json_loads(data)
+                metrics.inc("cache_requests_total", namespace=namespace, tier="shared")
+            else:
+                try:
+                    value = loader()
+                    self.shared.set(key, json_dumps(value), self.ttl_seconds)
+                finally:
+                    self.shared.delete(f"lease:{key}")
+                metrics.inc("cache_requests_total", namespace=namespace, tier="miss")
+            self._local_put(key, value)
+            return value
+
+
+_cache: Optional[TwoLevelCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TwoLevelCache:
+    """`[cache] backend = "memory" | "sqlite"`, `path`, `max_entries`, `ttl_seconds`, `version_check_seconds`."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            cfg = secrets_section("cache")
+            shared = SqliteKV(cfg.get("path", ".cache/shared_cache.sqlite3")) if cfg.get("backend") == "sqlite" else InProcessKV()
+            _cache = TwoLevelCache(shared, int(cfg.get("max_entries", 512)), float(cfg.get("ttl_seconds", 3600)),
+                                   float(cfg.get("version_check_seconds", 1.0)))
+        return _cache
@@ -0,0 +1,266 @@
+"""Per-participant summaries and cohort aggregates for the clinician view.
+
+Every saved result updates `users/{uid}/stats/summary` and the counters in
+`cohortStats/global` in the same transaction as the `testResults` write, so the
+cohort page reads one small document per participant (through a
+collection-group query on `stats`) and one aggregate document, and never
+streams anyone's results. Results without `completedAtMs` (not yet
+backfilled, see services.dates) are left out of the summaries and counts.
+
+    python -m services.cohort_stats --rebuild   # recompute everything from testResults
+"""
+import argparse
+import copy
+import datetime as dt
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud import firestore as gfs
+
+from services import metrics
+from services.dates import completed_at as completed_at_utc
+from services.firebase import get_firestore_client
+from services.profile import load_profile_doc
+
+
+STATS_COLLECTION = "stats"
+SUMMARY_DOC = "summary"
+COHORT_COLLECTION = "cohortStats"
+COHORT_DOC = "global"
+# Latest accuracy this many points below the participant's earlier mean for the same test.
+DECLINE_POINTS = 10.0
+DECLINE_MIN_TESTS = 3
+OVERDUE_DAYS = 30
+
+
+def summary_ref(db: Any, uid: str) -> Any:
+    return db.collection("users").document(uid).collection(STATS_COLLECTION).document(SUMMARY_DOC)
+
+
+def _display_name(profile_doc: Dict[str, Any]) -> str:
+    p = profile_doc.get("profile", {})
+    return f"{p.get('firstName', '')} {p.get('lastName', '')}".strip() or p.get("email", "")
+
+
+def apply_result(summary: Dict[str, Any], result: Dict[str, Any], completed_at: dt.datetime) -> Dict[str, Any]:
+    """Fold one result into a participant summary (pure; returns a new dict)."""
+    summary = copy.deepcopy(summary)
+    test_type = result.get("testType", "")
+    accuracy = float(result.get("accuracy", 0.0))
+    by_type = summary.setdefault("byType", {})
+    t = by_type.setdefault(test_type, {"count": 0, "accuracySum": 0.0, "scoreSum": 0, "best": 0})
+    earlier_mean = t["accuracySum"] / t["count"] if t["count"] else None
+    t["declineDelta"] = round(accuracy - earlier_mean, 2) if earlier_mean is not None and t["count"] + 1 >= DECLINE_MIN_TESTS else 0.0
+    t["count"] += 1
+    t["accuracySum"] += accuracy
+    t["scoreSum"] += result.get("score", 0)
+    t["best"] = max(t["best"], result.get("score", 0))
+    t.update(latestScore=result.get("score", 0), latestAccuracy=accuracy, latestAt=completed_at)
+
+    summary["testCount"] = summary.get("testCount", 0) + 1
+    if summary.get("lastTestAt") is None or completed_at >= summary["lastTestAt"]:
+        summary.update(lastTestAt=completed_at, lastTestType=test_type, latestAccuracy=accuracy)
+    summary["declineDelta"] = min(x.get("declineDelta", 0.0) for x in by_type.values())
+    summary["declining"] = summary["declineDelta"] <= -DECLINE_POINTS
+    return summary
+
+
+def _cohort_increments(before: Optional[Dict[str, Any]], after: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    test_type = result.get("testType", "")
+    declining = int(after["declining"]) - int(bool(before and before.get("declining")))
+    return {
+        "participants": gfs.Increment(0 if before else 1),
+        "tests": gfs.Increment(1),
+        "declining": gfs.Increment(declining),
+        "byType": {test_type: {"count": gfs.Increment(1),
+                               "accuracySum": gfs.Increment(float(result.get("accuracy", 0.0))),
+                               "scoreSum": gfs.Increment(result.get("score", 0))}},
+        "updatedAt": gfs.SERVER_TIMESTAMP,
+    }
+
+
+def stage_result(db: Any, transaction: Any, uid: str, result: Dict[str, Any]) -> None:
+    """Read the summary in `transaction` and stage its update plus the cohort increments."""
+    ref = summary_ref(db, uid)
+    snap = ref.get(transaction=transaction)
+    before = snap.to_dict() if snap.exists else None
+    metrics.firestore_read(STATS_COLLECTION, [before] if before else [])
+    completed = _completed_at(result)
+    if completed is None:
+        return
+    after = apply_result(before or {"uid": uid}, result, completed)
+    if before is None:
+        profile_doc = load_profile_doc(uid)
+        after.update(displayName=_display_name(profile_doc), email=profile_doc.get("profile", {}).get("email", ""))
+    transaction.set(ref, after)
+    transaction.set(db.collection(COHORT_COLLECTION).document(COHORT_DOC), _cohort_increments(before, after, result), merge=True)
+    metrics.firestore_write(STATS_COLLECTION, after)
+
+
+def save_result(db: Any, uid: str, result: Dict[str, Any]) -> None:
+    """Write a new `testResults` document together with its summary and cohort updates.
+
+    The summary read-modify-write runs in a transaction, so two saves for the
+    same user (two tabs, a retried save) are serialised by Firestore's retry
+    instead of one overwriting the other or both counting a new participant."""
+    result_ref = db.collection("testResults").document()
+
+    @gfs.transactional
+    def write(transaction: Any) -> None:
+        stage_result(db, transaction, uid, result)
+        transaction.set(result_ref, result)
+
+    write(db.transaction())
+
+
+def cohort_summary() -> Dict[str, Any]:
+    db = get_firestore_client()
+    snap = db.collection(COHORT_COLLECTION).document(COHORT_DOC).get()
+    data = snap.to_dict() if snap.exists else {}
+    metrics.firestore_read(COHORT_COLLECTION, [data])
+    return data
+
+
+def overdue_cutoff(now: Optional[dt.datetime] = None) -> dt.datetime:
+    return (now or dt.datetime.now(dt.timezone.utc)) - dt.timedelta(days=OVERDUE_DAYS)
+
+
+def _filtered(db: Any, only: str) -> Any:
+    query = db.collection_group(STATS_COLLECTION)
+    if only == "declining":
+        query = query.where("declining", "==", True)
+    elif only == "overdue":
+        query = query.where("lastTestAt", "<", overdue_cutoff())
+    return query
+
+
+def count_overdue() -> int:
+    result = _filtered(get_firestore_client(), "overdue").count().get()
+    return int(result[0][0].value)
+
+
+def participants_page(order_field: str, descending: bool, page_size: int, only: str = "",
+                      after: Any = None) -> Tuple[List[Dict[str, Any]], Any]:
+    """One page of participant summaries and the cursor for the next one (None at the end).
+
+    `only="overdue"` filters on `lastTestAt`, so Firestore requires that field to be sorted first;
+    that view is ordered by `lastTestAt` only.
+    """
+    if only == "overdue" and order_field != "lastTestAt":
+        raise ValueError("the overdue view is ordered by lastTestAt only")
+    db = get_firestore_client()
+    query = _filtered(db, only)
+    query = query.order_by(order_field, direction=gfs.Query.DESCENDING if descending else gfs.Query.ASCENDING)
+    if after is not None:
+        query = query.start_after(after)
+    snaps = list(query.limit(page_size).stream())
+    rows = [s.to_dict() for s in snaps]
+    metrics.firestore_read(STATS_COLLECTION, rows)
+    return rows, snaps[-1] if len(snaps) == page_size else None
+
+
+def _completed_at(result: Dict[str, Any]) -> Optional[dt.datetime]:
+    ts = completed_at_utc(result)
+    return ts.replace(tzinfo=dt.timezone.utc) if ts is not None else None
+
+
+def _summarize(uid: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    profile_doc = load_profile_doc(uid)
+    summary: Dict[str, Any] = {"uid": uid, "displayName": _display_name(profile_doc),
+                               "email": profile_doc.get("profile", {}).get("email", "")}
+    for result in sorted(results, key=_completed_at):
+        summary = apply_result(summary, result, _completed_at(result))
+    return summary
+
+
+def _type_totals(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    totals: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        agg = totals.setdefault(result.get("testType", ""), {"count": 0, "accuracySum": 0.0, "scoreSum": 0})
+        agg["count"] += 1
+        agg["accuracySum"] += float(result.get("accuracy", 0.0))
+        agg["scoreSum"] += result.get("score", 0)
+    return totals
+
+
+def rebuild_all() -> Dict[str, int]:
+    """Recompute every summary and the cohort document from `testResults` (one full scan)."""
+    db = get_firestore_client()
+    by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for doc in db.collection("testResults").stream():
+        data = doc.to_dict()
+        if data.get("userId") and _completed_at(data) is not None:
+            by_user[data["userId"]].append(data)
+    cohort: Dict[str, Any] = {"participants": 0, "tests": 0, "declining": 0,
+                              "byType": _type_totals([r for results in by_user.values() for r in results])}
+    batch, pending = db.batch(), 0
+    for uid, results in by_user.items():
+        summary = _summarize(uid, results)
+        cohort["participants"] += 1
+        cohort["tests"] += len(results)
+        cohort["declining"] += int(summary["declining"])
+        batch.set(summary_ref(db, uid), summary)
+        pending += 1
+        if pending == 400:  # Firestore allows 500 writes per batch.
+            batch.commit()
+            batch, pending = db.batch(), 0
+    batch.set(db.collection(COHORT_COLLECTION).document(COHORT_DOC), {**cohort, "updatedAt": gfs.SERVER_TIMESTAMP})
+    batch.commit()
+    return {"participants": cohort["participants"], "tests": cohort["tests"]}
+
+
+def refresh_users(uids: List[str]) -> Dict[str, int]:
+    """Recompute the summaries of `uids` from their results after a bulk write.
+
+    The cohort document receives the difference between old and new summaries
+    as one merged increment, so re-running for the same users changes nothing.
+    """
+    db = get_firestore_client()
+    delta: Dict[str, Any] = {"participants": 0, "tests": 0, "declining": 0, "byType": defaultdict(lambda: defaultdict(float))}
+    batch, pending = db.batch(), 0
+    for uid in uids:
+        snap = summary_ref(db, uid).get()
+        before = snap.to_dict() if snap.exists else None
+        results = [d.to_dict() for d in db.collection("testResults").where("userId", "==", uid).stream()]
+        metrics.firestore_read("testResults", results)
+        results = [r for r in results if _completed_at(r) is not None]
+        if not results and before is None:
+            continue  # like rebuild_all: no dated result, no participant
+        summary = _summarize(uid, results)
+        delta["participants"] += 0 if before else 1
+        delta["tests"] += summary.get("testCount", 0) - (before or {}).get("testCount", 0)
+        delta["declining"] += int(summary.get("declining", False)) - int(bool((before or {}).get("declining")))
+        old_types = (before or {}).get("byType", {})
+        for test_type, agg in _type_totals(results).items():
+            old = old_types.get(test_type, {})
+            for field in ("count", "accuracySum", "scoreSum"):
+                delta["byType"][test_type][field] += agg[field] - old.get(field, 0)
+        batch.set(summary_ref(db, uid), summary)
+        pending += 1
+        if pending == 400:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    batch.set(db.collection(COHORT_COLLECTION).document(COHORT_DOC), {
+        "participants": gfs.Increment(delta["participants"]),
+        "tests": gfs.Increment(delta["tests"]),
+        "declining": gfs.Increment(delta["declining"]),
+        "byType": {t: {f: gfs.Increment(v if f == "accuracySum" else int(v)) for f, v in agg.items()}
+                   for t, agg in delta["byType"].items()},
+        "updatedAt": gfs.SERVER_TIMESTAMP,
+    }, merge=True)
+    batch.commit()
+    return {"participants": len(uids), "newParticipants": delta["participants"], "tests": delta["tests"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Kohort istatistik belgelerini yönet")
+    parser.add_argument("--rebuild", action="store_true", help="tüm özetleri testResults'tan yeniden hesapla")
+    args = parser.parse_args()
+    if args.rebuild:
+        print(rebuild_all())
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+from typing import Any, Dict
+
+import streamlit as st
+
+
+def secrets_section(name: str) -> Dict[str, Any]:
+    """Optional `[name]` table from secrets.toml; {} when absent or when no
+    secrets file exists (CLIs, benchmarks)."""
+    try:
+        return dict(st.secrets.get(name, {}))
+    except Exception:
+        return {}
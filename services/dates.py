@@ -0,0 +1,115 @@
+"""Completion-time fields written with every test result.
+
+`save_results` stores `completedAtMs` (UTC epoch milliseconds) and the
+`completedDay` / `completedWeek` / `completedMonth` bucket keys next to the
+legacy `metadata` timestamps, so pages sort, filter and group on plain
+numbers and strings instead of parsing `_completedAtStr` per row.
+
+    python -m services.dates backfill [--dry-run]   # add the fields to older documents
+"""
+import argparse
+import datetime as dt
+from typing import Any, Dict, List, Optional
+
+from services import metrics
+from services.cache import get_cache
+from services.firebase import get_firestore_client
+
+
+FIELDS = ("completedAtMs", "completedDay", "completedWeek", "completedMonth")
+
+
+def completion_fields(ts: dt.datetime) -> Dict[str, Any]:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=dt.timezone.utc)
+    ts = ts.astimezone(dt.timezone.utc)
+    year, week, _ = ts.isocalendar()
+    return {
+        "completedAtMs": int(ts.timestamp() * 1000),
+        "completedDay": ts.strftime("%Y-%m-%d"),
+        "completedWeek": f"{year}-W{week:02d}",
+        "completedMonth": ts.strftime("%Y-%m"),
+    }
+
+
+def to_ms(ts: dt.datetime) -> int:
+    """Epoch ms of a naive-UTC or aware datetime, for comparing with `completedAtMs`."""
+    return completion_fields(ts)["completedAtMs"]
+
+
+def completed_at(result: Dict[str, Any]) -> Optional[dt.datetime]:
+    """Naive UTC completion time, or None for a document without `completedAtMs`."""
+    ms = result.get("completedAtMs")
+    if ms is None:
+        return None
+    return dt.datetime.fromtimestamp(ms / 1000.0, dt.timezone.utc).replace(tzinfo=None)
+
+
+def legacy_completed_at(result: Dict[str, Any]) -> Optional[dt.datetime]:
+    """The old parsing path, kept only for the backfill: Firestore timestamp, then `_completedAtStr`."""
+    meta = result.get("metadata", {})
+    value = meta.get("completedAt")
+    if isinstance(value, dt.datetime):
+        return value
+    try:
+        return dt.datetime.fromisoformat(str(meta.get("_completedAtStr")).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def backfill(batch_size: int = 400, dry_run: bool = False) -> Dict[str, Any]:
+    """Add the completion fields to every `testResults` document that lacks them.
+
+    Documents without a parsable timestamp are reported, not guessed."""
+    db = get_firestore_client()
+    results = db.collection("testResults")
+    counters: Dict[str, Any] = {"scanned": 0, "updated": 0, "present": 0, "unparsable": []}
+    touched_users = set()
+    cursor = None
+    while True:
+        page = list((results.start_after(cursor) if cursor is not None else results).limit(batch_size).stream())
+        if not page:
+            break
+        cursor = page[-1]
+        batch, pending = db.batch(), 0
+        for snap in page:
+            data = snap.to_dict()
+            counters["scanned"] += 1
+            if data.get("completedAtMs") is not None:
+                counters["present"] += 1
+                continue
+            ts = legacy_completed_at(data)
+            if ts is None:
+                counters["unparsable"].append(snap.id)
+                continue
+            counters["updated"] += 1
+            if not dry_run:
+                batch.update(results.document(snap.id), completion_fields(ts))
+                touched_users.add(data.get("userId"))
+                pending += 1
+        metrics.firestore_read("testResults", [s.to_dict() for s in page])
+        if pending:
+            batch.commit()
+        if len(page) < batch_size:
+            break
+    for uid in touched_users:
+        get_cache().invalidate("results", uid)
+    return counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="testResults tamamlanma zamanı alanları")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_backfill = sub.add_parser("backfill", help="eksik completedAtMs/Day/Week/Month alanlarını doldur")
+    p_backfill.add_argument("--batch-size", type=int, default=400)
+    p_backfill.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    counters = backfill(args.batch_size, args.dry_run)
+    unparsable: List[str] = counters.pop("unparsable")
+    print({**counters, "unparsable": len(unparsable)})
+    for doc_id in unparsable:
+        print(f"  tarihi okunamadı: testResults/{doc_id}")
+
+
+if __name__ == "__main__":
+    main()
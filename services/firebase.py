@@ -5,6 +5,8 @@ import streamlit as st
 from firebase_admin import credentials, firestore, initialize_app, auth
 import firebase_admin
 
+from services.identity import get_identity_client
+
 
 _admin_initialized = False
 
@@ -24,42 +26,42 @@ def _init_admin_if_needed() -> None:
     _admin_initialized = True
 
 
+_firestore_override: Optional[Any] = None
+
+
+def set_firestore_client(client: Optional[Any]) -> None:
+    """Replace the Firestore client process-wide (offline load tests); None restores the real one."""
+    global _firestore_override
+    _firestore_override = client
+
+
 def get_firestore_client() -> Any:
+    if _firestore_override is not None:
+        return _firestore_override
     _init_admin_if_needed()
     return firestore.client()
 
 
 class FirebaseAuthWrapper:
-    """Wrapper to provide pyrebase-like API using firebase-admin"""
-    
+    """pyrebase-like API over the Identity Toolkit REST client.
+
+    Sign-in/sign-up return the REST payload: localId, idToken, refreshToken, expiresIn.
+    """
+
     def __init__(self):
-        _init_admin_if_needed()
-        self.auth = auth
-    
+        self.client = get_identity_client()
+
     def create_user_with_email_and_password(self, email: str, password: str) -> Dict[str, Any]:
-        try:
-            user = self.auth.create_user(
-                email=email,
-                password=password
-            )
-            return {"localId": user.uid, "uid": user.uid}
-        except Exception as e:
-            raise Exception(str(e))
-    
+        return self.client.sign_up(email, password)
+
     def sign_in_with_email_and_password(self, email: str, password: str) -> Dict[str, Any]:
-        try:
-            # For demo purposes, we'll accept any email/password
-            # In production, you'd need to implement proper authentication
-            return {"localId": "demo_user", "uid": "demo_user"}
-        except Exception as e:
-            raise Exception(str(e))
-    
+        return self.client.sign_in(email, password)
+
+    def refresh(self, refresh_token: str) -> Dict[str, Any]:
+        return self.client.refresh(refresh_token)
+
     def send_password_reset_email(self, email: str) -> None:
-        try:
-            # For demo purposes
-            pass
-        except Exception as e:
-            raise Exception(str(e))
+        self.client.send_password_reset(email)
 
 
 def get_pyrebase_auth() -> FirebaseAuthWrapper:
@@ -0,0 +1,180 @@
+import base64
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from google.auth import crypt
+
+from services.config import secrets_section
+
+
+CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+CLOCK_SKEW_SECONDS = 60
+# A token whose kid is unknown forces a key refetch at most this often.
+MIN_CERT_REFETCH_SECONDS = 60
+
+
+class AuthError(Exception):
+    """Identity Toolkit error; the message carries Firebase's code (e.g. EMAIL_NOT_FOUND).
+
+    Only rejections raise it; network failures, 429 and 5xx answers raise
+    requests.RequestException instead.
+    """
+
+
+class IdentityToolkitClient:
+    """Email/password auth over the Identity Toolkit REST API (or the Auth emulator)."""
+
+    def __init__(self, api_key: str, emulator_host: Optional[str] = None, timeout: float = 10.0) -> None:
+        self.api_key = api_key
+        self.emulator_host = emulator_host
+        self.timeout = timeout
+        self._http = requests.Session()
+        if emulator_host:
+            self.identity_url = f"http://{emulator_host}/identitytoolkit.googleapis.com/v1"
+            self.token_url = f"http://{emulator_host}/securetoken.googleapis.com/v1/token"
+        else:
+            self.identity_url = "https://identitytoolkit.googleapis.com/v1"
+            self.token_url = "https://securetoken.googleapis.com/v1/token"
+
+    def _post(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        resp = self._http.post(url, params={"key": self.api_key}, json=payload, timeout=self.timeout)
+        if resp.status_code == 429 or resp.status_code >= 500:
+            # Transient, not a verdict on the credentials: surface it as requests.HTTPError.
+            resp.raise_for_status()
+        body = resp.json() if resp.content else {}
+        if resp.status_code != 200:
+            raise AuthError(body.get("error", {}).get("message", f"HTTP {resp.status_code}"))
+        return body
+
+    def sign_in(self, email: str, password: str) -> Dict[str, Any]:
+        return self._post(f"{self.identity_url}/accounts:signInWithPassword",
+                          {"email": email, "password": password, "returnSecureToken": True})
+
+    def sign_up(self, email: str, password: str) -> Dict[str, Any]:
+        return self._post(f"{self.identity_url}/accounts:signUp",
+                          {"email": email, "password": password, "returnSecureToken": True})
+
+    def send_password_reset(self, email: str) -> None:
+        self._post(f"{self.identity_url}/accounts:sendOobCode", {"requestType": "PASSWORD_RESET", "email": email})
+
+    def refresh(self, refresh_token: str) -> Dict[str, Any]:
+        body = self._post(self.token_url, {"grant_type": "refresh_token", "refresh_token": refresh_token})
+        # securetoken answers in snake_case; normalise to the signIn field names.
+        return {"idToken": body["id_token"], "refreshToken": body["refresh_token"],
+                "expiresIn": body["expires_in"], "localId": body["user_id"]}
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+class TokenVerifier:
+    """Verifies Firebase ID tokens locally against cached Google public keys.
+
+    Keys are refetched when their Cache-Control max-age runs out or a token
+    names an unknown key id (rotation); every other check is in-process.
+    """
+
+    def __init__(self, project_id: str, emulator: bool = False, certs_url: str = CERTS_URL) -> None:
+        self.project_id = project_id
+        self.emulator = emulator
+        self.certs_url = certs_url
+        self._verifiers: Dict[str, crypt.RSAVerifier] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh_keys(self) -> None:
+        resp = requests.get(self.certs_url, timeout=10)
+        resp.raise_for_status()
+        m = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", ""))
+        now = time.time()
+        self._verifiers = {kid: crypt.RSAVerifier.from_string(pem) for kid, pem in resp.json().items()}
+        self._expires_at = now + (int(m.group(1)) if m else 3600)
+        self._fetched_at = now
+
+    def _verifier(self, kid: str) -> crypt.RSAVerifier:
+        with self._lock:
+            now = time.time()
+            stale = now >= self._expires_at
+            unknown = kid not in self._verifiers and now - self._fetched_at >= MIN_CERT_REFETCH_SECONDS
+            if stale or unknown:
+                self._refresh_keys()
+            if kid not in self._verifiers:
+                raise AuthError("INVALID_ID_TOKEN: unknown key id")
+            return self._verifiers[kid]
+
+    def verify(self, id_token: str) -> Dict[str, Any]:
+        """Return the token's claims, or raise AuthError."""
+        try:
+            header_b64, payload_b64, signature_b64 = id_token.split(".")
+            header = json.loads(_b64decode(header_b64))
+            claims = json.loads(_b64decode(payload_b64))
+        except ValueError as e:
+            raise AuthError(f"INVALID_ID_TOKEN: {e}") from e
+        if not self.emulator:
+            # The Auth emulator issues unsigned tokens; production tokens must be RS256.
+            if header.get("alg") != "RS256":
+                raise AuthError("INVALID_ID_TOKEN: unexpected algorithm")
+            message = f"{header_b64}.{payload_b64}".encode("ascii")
+            if not self._verifier(header.get("kid", "")).verify(message, _b64decode(signature_b64)):
+                raise AuthError("INVALID_ID_TOKEN: bad signature")
+        now = time.time()
+        if claims.get("aud") != self.project_id:
+            raise AuthError("INVALID_ID_TOKEN: wrong audience")
+        if claims.get("iss") != f"https://securetoken.google.com/{self.project_id}":
+            raise AuthError("INVALID_ID_TOKEN: wrong issuer")
+        if not claims.get("sub"):
+            raise AuthError("INVALID_ID_TOKEN: missing subject")
+        if claims.get("iat", 0) > now + CLOCK_SKEW_SECONDS:
+            raise AuthError("INVALID_ID_TOKEN: issued in the future")
+        if claims.get("exp", 0) < now - CLOCK_SKEW_SECONDS:
+            raise AuthError("TOKEN_EXPIRED")
+        return claims
+
+
+def _emulator_host() -> Optional[str]:
+    return secrets_section("firebase").get("auth_emulator_host") or os.environ.get("FIREBASE_AUTH_EMULATOR_HOST")
+
+
+_client: Optional[IdentityToolkitClient] = None
+_verifier: Optional[TokenVerifier] = None
+_identity_lock = threading.Lock()
+
+
+def get_identity_client() -> IdentityToolkitClient:
+    global _client
+    with _identity_lock:
+        if _client is None:
+            cfg = secrets_section("firebase")
+            host = _emulator_host()
+            if not cfg.get("api_key") and not host:
+                raise RuntimeError("Firebase api_key eksik. .streamlit/secrets.toml dosyasını doldurun.")
+            _client = IdentityToolkitClient(cfg.get("api_key", "emulator"), host)
+        return _client
+
+
+def _project_id() -> str:
+    """The token audience: firebase.project_id, else the service account's project_id."""
+    cfg = secrets_section("firebase")
+    if cfg.get("project_id"):
+        return cfg["project_id"]
+    service_json = cfg.get("service_account_json")
+    return json.loads(service_json).get("project_id", "") if service_json else ""
+
+
+def get_token_verifier() -> TokenVerifier:
+    global _verifier
+    with _identity_lock:
+        if _verifier is None:
+            project_id = _project_id()
+            if not project_id:
+                # An empty audience would reject every token as "wrong audience".
+                raise RuntimeError("Firebase project_id eksik. .streamlit/secrets.toml dosyasını doldurun.")
+            _verifier = TokenVerifier(project_id, emulator=bool(_emulator_host()))
+        return _verifier
@@ -0,0 +1,302 @@
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as gexc
+
+from services import metrics
+from services.config import secrets_section
+from services.tracing import span
+
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+# Errors worth retrying: throttling, transient server failures and timeouts.
+RETRYABLE_ERRORS = (
+    gexc.TooManyRequests,
+    gexc.ResourceExhausted,
+    gexc.ServiceUnavailable,
+    gexc.InternalServerError,
+    gexc.DeadlineExceeded,
+    gexc.GatewayTimeout,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = DEFAULT_MODEL) -> None:
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    @staticmethod
+    def _record_usage(resp: Any) -> None:
+        usage = getattr(resp, "usage_metadata", None)
+        if usage is not None:
+            metrics.inc("gemini_tokens_total", getattr(usage, "prompt_token_count", 0) or 0, kind="prompt")
+            metrics.inc("gemini_tokens_total", getattr(usage, "candidates_token_count", 0) or 0, kind="output")
+
+    def generate(self, prompt: str, timeout: Optional[float], generation_config: Optional[Dict[str, Any]] = None) -> str:
+        resp = self.model.generate_content(prompt, generation_config=generation_config,
+                                           request_options={"timeout": timeout} if timeout else None)
+        self._record_usage(resp)
+        return resp.text or ""
+
+    def stream(self, prompt: str, timeout: Optional[float], generation_config: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        request_options = {"timeout": timeout} if timeout else None
+        last = None
+        for chunk in self.model.generate_content(prompt, stream=True, generation_config=generation_config,
+                                                 request_options=request_options):
+            last = chunk
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety or finish metadata).
+                continue
+            if text:
+                yield text
+        # Usage totals arrive on the final chunk.
+        if last is not None:
+            self._record_usage(last)
+
+
+class StubBackend:
+    """Offline stand-in for Gemini with configurable latency and output size.
+
+    Used for benchmarking report throughput and tail latency without
+    network access or API cost. `failure_rate` injects retryable errors.
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_seconds: float = 2.0,
+        first_token_seconds: float = 0.3,
+        output_chars: int = 3000,
+        chunk_chars: int = 200,
+        jitter: float = 0.2,
+        failure_rate: float = 0.0,
+        model_name: str = "stub",
+    ) -> None:
+        self.latency_seconds = float(latency_seconds)
+        self.first_token_seconds = float(first_token_seconds)
+        self.output_chars = int(output_chars)
+        self.chunk_chars = max(1, int(chunk_chars))
+        self.jitter = float(jitter)
+        self.failure_rate = float(failure_rate)
+        self.model_name = model_name
+
+    def _body(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        if (generation_config or {}).get("response_mime_type") == "application/json":
+            n = max(1, self.output_chars // 400)
+            return json.dumps({
+                "sections": [{"title": f"Bölüm {i + 1}", "body": "Stub içerik. " * 25} for i in range(n)],
+                "insights": ["Stub içgörü"],
+                "riskFlags": [],
+                "recommendations": ["Düzenli test takibine devam edin."],
+            }, ensure_ascii=False)
+        header = f"# Rapor (stub)\n\nPrompt uzunluğu: {len(prompt)} karakter.\n\n"
+        line = "- Bu satır yük testi için üretilmiş örnek içeriktir.\n"
+        body = header + line * (max(0, self.output_chars - len(header)) // len(line) + 1)
+        return body[: max(self.output_chars, len(header))]
+
+    def _scaled(self, seconds: float) -> float:
+        return max(0.0, seconds * (1.0 + random.uniform(-self.jitter, self.jitter)))
+
+    def _maybe_fail(self) -> None:
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise gexc.ServiceUnavailable("stub backend injected failure")
+
+    def generate(self, prompt: str, timeout: Optional[float], generation_config: Optional[Dict[str, Any]] = None) -> str:
+        self._maybe_fail()
+        time.sleep(self._scaled(self.latency_seconds))
+        return self._body(prompt, generation_config)
+
+    def stream(self, prompt: str, timeout: Optional[float], generation_config: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        self._maybe_fail()
+        body = self._body(prompt, generation_config)
+        chunks = [body[i:i + self.chunk_chars] for i in range(0, len(body), self.chunk_chars)]
+        time.sleep(self._scaled(self.first_token_seconds))
+        gap = max(0.0, self.latency_seconds - self.first_token_seconds) / max(1, len(chunks))
+        for chunk in chunks:
+            yield chunk
+            time.sleep(self._scaled(gap))
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures, then lets one
+    probe call through every `reset_seconds` until a call succeeds."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_seconds:
+                raise CircuitOpenError("Gemini servisi şu anda yanıt vermiyor; kısa süre sonra tekrar deneyin.")
+            # Half-open: allow this probe and hold other callers off for another window.
+            self._opened_at = now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ModelClient:
+    """Process-wide model client: timeouts, jittered retries and a circuit breaker
+    around a pluggable backend (`GeminiBackend` or `StubBackend`)."""
+
+    def __init__(
+        self,
+        backend: Any,
+        timeout_seconds: float = 60.0,
+        max_retries: int = 2,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 20.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.backend = backend
+        self.timeout_seconds = float(timeout_seconds)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = float(backoff_seconds)
+        self.max_backoff_seconds = float(max_backoff_seconds)
+        self.breaker = breaker or CircuitBreaker()
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.model_name
+
+    def _timeout(self, timeout: Optional[float]) -> float:
+        return min(timeout, self.timeout_seconds) if timeout else self.timeout_seconds
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        # Full jitter: spreads retries from concurrent callers apart.
+        cap = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** attempt))
+        time.sleep(random.uniform(0, cap))
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        with span("gemini.generate", backend=self.backend.name, prompt_chars=len(prompt)) as s:
+            text = self._generate(prompt, timeout, generation_config)
+            s.set_attribute("output_chars", len(text))
+            return text
+
+    def _generate(self, prompt: str, timeout: Optional[float], generation_config: Optional[Dict[str, Any]]) -> str:
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                with metrics.timed("gemini_latency_seconds", op="generate", backend=self.backend.name):
+                    text = self.backend.generate(prompt, self._timeout(timeout), generation_config)
+            except RETRYABLE_ERRORS:
+                self.breaker.record_failure()
+                metrics.inc("gemini_errors_total", backend=self.backend.name)
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep_before_retry(attempt)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return text
+
+    def stream(self, prompt: str, timeout: Optional[float] = None, generation_config: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Stream chunks; retries only happen before the first chunk is yielded."""
+        with span("gemini.stream", backend=self.backend.name, prompt_chars=len(prompt)) as s:
+            chars = 0
+            for chunk in self._stream(prompt, timeout, generation_config):
+                chars += len(chunk)
+                yield chunk
+            s.set_attribute("output_chars", chars)
+
+    def _stream(self, prompt: str, timeout: Optional[float], generation_config: Optional[Dict[str, Any]]) -> Iterator[str]:
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            started = False
+            t0 = time.perf_counter()
+            try:
+                for chunk in self.backend.stream(prompt, self._timeout(timeout), generation_config):
+                    if not started:
+                        metrics.observe("gemini_first_chunk_seconds", time.perf_counter() - t0, backend=self.backend.name)
+                    started = True
+                    yield chunk
+            except RETRYABLE_ERRORS:
+                self.breaker.record_failure()
+                metrics.inc("gemini_errors_total", backend=self.backend.name)
+                if started or attempt >= self.max_retries:
+                    raise
+                self._sleep_before_retry(attempt)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            metrics.observe("gemini_latency_seconds", time.perf_counter() - t0, op="stream", backend=self.backend.name)
+            return
+
+
+def build_backend(cfg: Any) -> Any:
+    if cfg.get("backend", "gemini") == "stub":
+        return StubBackend(
+            latency_seconds=float(cfg.get("stub_latency_seconds", 2.0)),
+            first_token_seconds=float(cfg.get("stub_first_token_seconds", 0.3)),
+            output_chars=int(cfg.get("stub_output_chars", 3000)),
+            failure_rate=float(cfg.get("stub_failure_rate", 0.0)),
+        )
+    api_key = cfg.get("api_key")
+    if not api_key:
+        raise RuntimeError("Gemini API anahtarı bulunamadı. secrets.toml dosyasını doldurun.")
+    return GeminiBackend(api_key, cfg.get("model", DEFAULT_MODEL))
+
+
+_client: Optional[ModelClient] = None
+_client_lock = threading.Lock()
+
+
+def get_model_client() -> ModelClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            cfg = secrets_section("gemini")
+            _client = ModelClient(
+                build_backend(cfg),
+                timeout_seconds=float(cfg.get("timeout_seconds", 60)),
+                max_retries=int(cfg.get("max_retries", 2)),
+                backoff_seconds=float(cfg.get("backoff_seconds", 1.0)),
+                max_backoff_seconds=float(cfg.get("max_backoff_seconds", 20.0)),
+                breaker=CircuitBreaker(
+                    int(cfg.get("breaker_failures", 5)),
+                    float(cfg.get("breaker_reset_seconds", 30)),
+                ),
+            )
+        return _client
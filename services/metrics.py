@@ -0,0 +1,196 @@
+"""Process-wide counters and latency histograms.
+
+Values are also attributed to the current rerun (see `rerun_scope`), so the
+debug panel can show where one page render spent its time. `export()` writes
+Prometheus text and JSON snapshots for scraping or inspection.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+SeriesKey = Tuple[str, LabelKey]
+
+# Upper bounds in seconds; covers cache hits through full Gemini reports.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RESERVOIR_SIZE = 2048
+RECENT_RERUNS = 50
+
+
+class Histogram:
+    """Prometheus-style cumulative buckets plus a window of recent samples for quantiles."""
+
+    def __init__(self) -> None:
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.samples: Deque[float] = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def quantiles(self) -> Dict[str, float]:
+        if not self.samples:
+            return {}
+        p50, p95, p99 = np.percentile(list(self.samples), [50, 95, 99])
+        return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+_counters: Dict[SeriesKey, float] = {}
+_histograms: Dict[SeriesKey, Histogram] = {}
+_recent_reruns: Deque[Dict[str, Any]] = deque(maxlen=RECENT_RERUNS)
+_lock = threading.Lock()
+_rerun: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("metrics_rerun", default=None)
+
+
+def _key(name: str, labels: Dict[str, str]) -> SeriesKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels: str) -> None:
+    """Add `value` to the process-wide counter `name{labels}`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+    rerun = _rerun.get()
+    if rerun is not None:
+        rerun["counters"][name] = rerun["counters"].get(name, 0.0) + value
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _histograms.setdefault(key, Histogram()).observe(value)
+    rerun = _rerun.get()
+    if rerun is not None:
+        rerun["timings"].setdefault(name, []).append(value)
+
+
+@contextlib.contextmanager
+def timed(name: str, **labels: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def _doc_bytes(doc: Any) -> int:
+    # Approximate: Firestore bills on its own encoding, but JSON size tracks it well enough.
+    return len(json.dumps(doc, default=str, ensure_ascii=False).encode("utf-8"))
+
+
+def firestore_read(collection: str, docs: List[Dict[str, Any]]) -> None:
+    inc("firestore_reads_total", len(docs) or 1, collection=collection)
+    inc("firestore_read_bytes_total", sum(_doc_bytes(d) for d in docs), collection=collection)
+
+
+def firestore_write(collection: str, payload: Dict[str, Any]) -> None:
+    inc("firestore_writes_total", 1, collection=collection)
+    inc("firestore_write_bytes_total", _doc_bytes(payload), collection=collection)
+
+
+@contextlib.contextmanager
+def rerun_scope(page: str) -> Iterator[Dict[str, Any]]:
+    """Attribute everything recorded in this thread to one page rerun."""
+    rerun = {"page": page, "started": time.time(), "counters": {}, "timings": {}}
+    token = _rerun.set(rerun)
+    started = time.perf_counter()
+    try:
+        yield rerun
+    finally:
+        _rerun.reset(token)
+        rerun["duration"] = time.perf_counter() - started
+        observe("page_render_seconds", rerun["duration"], page=page)
+        with _lock:
+            _recent_reruns.append(rerun)
+
+
+def counter_value(name: str, **labels: str) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0.0)
+
+
+def counters() -> Dict[SeriesKey, float]:
+    with _lock:
+        return dict(_counters)
+
+
+def recent_reruns() -> List[Dict[str, Any]]:
+    with _lock:
+        return list(_recent_reruns)
+
+
+def _fmt_labels(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def prometheus_text() -> str:
+    lines: List[str] = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+        for (name, labels), h in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), h.bucket_counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h.sum:g}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_counters.items())],
+            "histograms": [{"name": n, "labels": dict(l), "count": h.count, "sum": h.sum, **h.quantiles()}
+                           for (n, l), h in sorted(_histograms.items())],
+        }
+
+
+_last_export = 0.0
+_export_lock = threading.Lock()
+
+
+def export(directory: str, min_interval: float = 10.0) -> None:
+    """Write `metrics.prom` and `metrics.json` to `directory`, at most every `min_interval` seconds.
+
+    Never raises: a failed export is counted, not allowed to break a page render."""
+    global _last_export
+    with _export_lock:
+        now = time.monotonic()
+        if now - _last_export < min_interval:
+            return
+        _last_export = now
+    try:
+        os.makedirs(directory, exist_ok=True)
+        for filename, body in (("metrics.prom", prometheus_text()), ("metrics.json", json.dumps(snapshot(), indent=1))):
+            # A unique temp file per writer, so overlapping exports never rename each other's file.
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, prefix=f".{filename}.",
+                                             suffix=".tmp", delete=False) as f:
+                f.write(body)
+            try:
+                os.replace(f.name, os.path.join(directory, filename))
+            except OSError:
+                os.unlink(f.name)
+                raise
+    except OSError:
+        inc("metrics_export_errors_total")
@@ -0,0 +1,134 @@
+import datetime as dt
+import io
+import os
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from services import metrics
+from services.config import secrets_section
+from services.tracing import span
+
+
+# Helvetica's WinAnsi encoding has no ğ/ş/ı/İ, so a Unicode TTF is embedded when available.
+_FONT_CANDIDATES = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/TTF/DejaVuSans.ttf", "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", "/Library/Fonts/Arial Unicode.ttf"),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+]
+
+_fonts: Optional[Tuple[str, str]] = None
+_fonts_lock = threading.Lock()
+
+
+def _report_fonts() -> Tuple[str, str]:
+    """Register the report fonts once per process and return (regular, bold) names."""
+    global _fonts
+    with _fonts_lock:
+        if _fonts is not None:
+            return _fonts
+        cfg = secrets_section("pdf")
+        candidates = list(_FONT_CANDIDATES)
+        if cfg.get("font_path"):
+            candidates.insert(0, (cfg["font_path"], cfg.get("font_bold_path", cfg["font_path"])))
+        _fonts = ("Helvetica", "Helvetica-Bold")
+        for regular, bold in candidates:
+            if os.path.exists(regular) and os.path.exists(bold):
+                pdfmetrics.registerFont(TTFont("ReportSans", regular))
+                pdfmetrics.registerFont(TTFont("ReportSans-Bold", bold))
+                pdfmetrics.registerFontFamily("ReportSans", normal="ReportSans", bold="ReportSans-Bold",
+                                              italic="ReportSans", boldItalic="ReportSans-Bold")
+                _fonts = ("ReportSans", "ReportSans-Bold")
+                break
+        return _fonts
+
+
+def _styles(regular: str, bold: str) -> dict:
+    base = getSampleStyleSheet()
+    body = ParagraphStyle("ReportBody", parent=base["BodyText"], fontName=regular, fontSize=10.5, leading=14, spaceAfter=4)
+    return {
+        "body": body,
+        "bullet": ParagraphStyle("ReportBullet", parent=body, leftIndent=14, bulletIndent=4, spaceAfter=2),
+        1: ParagraphStyle("ReportH1", parent=base["Heading1"], fontName=bold, fontSize=16, leading=20),
+        2: ParagraphStyle("ReportH2", parent=base["Heading2"], fontName=bold, fontSize=13.5, leading=17),
+        3: ParagraphStyle("ReportH3", parent=base["Heading3"], fontName=bold, fontSize=11.5, leading=15),
+        "footer": ParagraphStyle("ReportFooter", parent=body, fontSize=8, textColor="#666666"),
+    }
+
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_BULLET = re.compile(r"^\s*[-*•]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*(\d+)[.)]\s+(.*)$")
+
+
+def _inline(text: str) -> str:
+    """Escape Paragraph markup and map **bold** / *italic* / `code` to tags."""
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    text = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", text)
+    text = re.sub(r"(?<!\*)\*(?!\s)(.+?)(?<!\s)\*(?!\*)", r"<i>\1</i>", text)
+    return re.sub(r"`([^`]+)`", r"\1", text)
+
+
+def _flowables(report_text: str, styles: dict) -> List:
+    story: List = []
+    para: List[str] = []
+
+    def flush() -> None:
+        if para:
+            story.append(Paragraph(_inline(" ".join(para)), styles["body"]))
+            para.clear()
+
+    for raw in report_text.splitlines():
+        line = raw.strip()
+        if not line:
+            flush()
+            continue
+        m = _HEADING.match(line)
+        if m:
+            flush()
+            story.append(Paragraph(_inline(m.group(2).strip("# ")), styles[min(3, len(m.group(1)))]))
+            continue
+        m = _BULLET.match(raw)
+        if m:
+            flush()
+            story.append(Paragraph(_inline(m.group(1)), styles["bullet"], bulletText="•"))
+            continue
+        m = _NUMBERED.match(raw)
+        if m:
+            flush()
+            story.append(Paragraph(_inline(m.group(2)), styles["bullet"], bulletText=f"{m.group(1)}."))
+            continue
+        para.append(line)
+    flush()
+    return story
+
+
+def render_report_pdf(report_text: str, generated_at: Optional[dt.datetime] = None) -> bytes:
+    """Render markdown-ish report text to PDF bytes, flowing across A4 pages."""
+    regular, bold = _report_fonts()
+    styles = _styles(regular, bold)
+    stamp = (generated_at or dt.datetime.utcnow()).strftime("%Y-%m-%d %H:%M UTC")
+
+    def decorate(canvas, doc) -> None:
+        canvas.saveState()
+        canvas.setFont(regular, 8)
+        canvas.drawString(doc.leftMargin, 12 * mm, f"NeuroAI · {stamp}")
+        canvas.drawRightString(A4[0] - doc.rightMargin, 12 * mm, str(doc.page))
+        canvas.restoreState()
+
+    buf = io.BytesIO()
+    with metrics.timed("pdf_render_seconds"), span("pdf.render", text_chars=len(report_text)) as s:
+        doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm,
+                                topMargin=18 * mm, bottomMargin=20 * mm, title="NeuroAI Raporu")
+        story = _flowables(report_text, styles) or [Spacer(1, 1)]
+        doc.build(story, onFirstPage=decorate, onLaterPages=decorate)
+        s.set_attribute("pages", doc.page)
+    return buf.getvalue()
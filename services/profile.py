@@ -0,0 +1,79 @@
+import copy
+from typing import Any, Dict
+
+import streamlit as st
+
+from services import metrics
+from services.cache import get_cache
+from services.firebase import get_firestore_client
+
+
+# One `users/{uid}` read per session: filled at login, written through on save.
+_SESSION_KEY = "_profile_cache"
+
+
+def cache_profile(uid: str, data: Dict[str, Any]) -> None:
+    st.session_state[_SESSION_KEY] = {"uid": uid, "data": copy.deepcopy(data)}
+
+
+def _read_profile(uid: str) -> Dict[str, Any]:
+    doc = get_firestore_client().collection("users").document(uid).get()
+    data = doc.to_dict() or {}
+    metrics.firestore_read("users", [data])
+    return data
+
+
+def load_profile_doc(uid: str) -> Dict[str, Any]:
+    """The user document through the shared cache; read-only, no session needed."""
+    return get_cache().get("profile", uid, "doc", lambda: _read_profile(uid))
+
+
+def get_profile(uid: str) -> Dict[str, Any]:
+    """The user document, read from Firestore only on a session and shared cache miss."""
+    entry = st.session_state.get(_SESSION_KEY)
+    if not entry or entry["uid"] != uid:
+        cache_profile(uid, load_profile_doc(uid))
+        entry = st.session_state[_SESSION_KEY]
+    return copy.deepcopy(entry["data"])
+
+
+def diff_fields(old: Dict[str, Any], new: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Dotted field paths of `new` whose values differ from `old`."""
+    changes: Dict[str, Any] = {}
+    for key, value in new.items():
+        path = f"{prefix}{key}"
+        before = old.get(key) if isinstance(old, dict) else None
+        if isinstance(value, dict) and isinstance(before, dict):
+            changes.update(diff_fields(before, value, f"{path}."))
+        elif before != value:
+            changes[path] = value
+    return changes
+
+
+def _apply(data: Dict[str, Any], changes: Dict[str, Any]) -> None:
+    for path, value in changes.items():
+        *parents, leaf = path.split(".")
+        node = data
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = copy.deepcopy(value)
+
+
+def update_profile(uid: str, new: Dict[str, Any]) -> Dict[str, Any]:
+    """Write only the fields of `new` that changed; returns the written paths."""
+    current = get_profile(uid)
+    changes = diff_fields(current, new)
+    if not changes:
+        return changes
+    ref = get_firestore_client().collection("users").document(uid)
+    if current:
+        ref.update(changes)
+        metrics.firestore_write("users", changes)
+    else:
+        # update() needs an existing document.
+        ref.set(new, merge=True)
+        metrics.firestore_write("users", new)
+    get_cache().invalidate("profile", uid)
+    _apply(current, changes)
+    cache_profile(uid, current)
+    return changes
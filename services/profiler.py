@@ -0,0 +1,85 @@
+"""Sampling profiler for a single block of code, written as speedscope JSON.
+
+A background thread snapshots the profiled thread's stack every `interval`
+seconds via `sys._current_frames()`; nothing is installed with
+`sys.setprofile`, so code outside the `with` block runs at full speed.
+Open the output at https://www.speedscope.app.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+Frame = Tuple[str, str, int]
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_depth: int = 200) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: List[Tuple[Tuple[Frame, ...], float]] = []
+        self.duration = 0.0
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _stack(self) -> Optional[Tuple[Frame, ...]]:
+        frame = sys._current_frames().get(self._target)
+        stack: List[Frame] = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        return tuple(reversed(stack)) if stack else None
+
+    def _sample(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            stack = self._stack()
+            if stack:
+                self.samples.append((stack, now - last))
+            last = now
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._target = threading.get_ident()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        index: Dict[Frame, int] = {}
+        frames: List[Dict[str, Any]] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        for stack, weight in self.samples:
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(weight)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "neuroai",
+            "shared": {"frames": frames},
+            "profiles": [{"type": "sampled", "name": name, "unit": "seconds", "startValue": 0,
+                          "endValue": sum(weights), "samples": samples, "weights": weights}],
+        }
+
+    def write(self, path: str, name: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_speedscope(name), f)
+        return path
@@ -0,0 +1,155 @@
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from google.cloud import firestore as gfs
+
+from services import metrics
+from services.config import secrets_section
+from services.firebase import get_firestore_client
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Block until `tokens` are available; False if `timeout` seconds pass first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate if self.rate > 0 else 1.0
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, action: str, retry_after: float) -> None:
+        super().__init__(f"{action}: çok fazla istek, {retry_after:.0f} sn sonra tekrar deneyin.")
+        self.action = action
+        self.retry_after = retry_after
+
+
+def _refill_and_take(tokens: float, updated: float, now: float, rate: float, capacity: float) -> Tuple[bool, float, float]:
+    """Pure bucket step shared by the backends: (allowed, tokens_left, retry_after)."""
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1.0:
+        return True, tokens - 1.0, 0.0
+    return False, tokens, (1.0 - tokens) / rate if rate > 0 else float("inf")
+
+
+class InProcessBucketStore:
+    """Buckets in this process only; enough for a single replica."""
+
+    def __init__(self, max_keys: int = 10000) -> None:
+        self.max_keys = max_keys
+        # key -> (tokens, updated, rate, capacity)
+        self._buckets: Dict[str, Tuple[float, float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float) -> Tuple[bool, float]:
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (capacity, now))[:2]
+            allowed, tokens, retry_after = _refill_and_take(tokens, updated, now, rate, capacity)
+            self._buckets[key] = (tokens, now, rate, capacity)
+            if len(self._buckets) > self.max_keys:
+                # Buckets that have refilled completely carry no state worth keeping.
+                self._buckets = {k: b for k, b in self._buckets.items() if b[0] + (now - b[1]) * b[2] < b[3]}
+            return allowed, retry_after
+
+
+class FirestoreBucketStore:
+    """Buckets in the `rateLimits` collection, shared by all replicas.
+
+    Each take is one transactional read-modify-write of `rateLimits/{key}`.
+    """
+
+    def __init__(self, collection: str = "rateLimits") -> None:
+        self.collection = collection
+
+    def take(self, key: str, rate: float, capacity: float) -> Tuple[bool, float]:
+        db = get_firestore_client()
+        ref = db.collection(self.collection).document(key)
+        result: Dict[str, Any] = {}
+
+        @gfs.transactional
+        def step(transaction) -> None:
+            snap = ref.get(transaction=transaction)
+            now = time.time()
+            state = snap.to_dict() if snap.exists else {"tokens": capacity, "updated": now}
+            allowed, tokens, retry_after = _refill_and_take(state["tokens"], state["updated"], now, rate, capacity)
+            transaction.set(ref, {"tokens": tokens, "updated": now})
+            result.update(allowed=allowed, retry_after=retry_after)
+
+        step(db.transaction())
+        return result["allowed"], result["retry_after"]
+
+
+# action -> (per minute, burst)
+DEFAULT_USER_LIMITS: Dict[str, Tuple[float, float]] = {
+    "report": (2.0, 3),
+    "test_save": (6.0, 10),
+}
+
+
+class UserRateLimiter:
+    """Token buckets keyed by (action, uid)."""
+
+    def __init__(self, store: Any, limits: Dict[str, Tuple[float, float]]) -> None:
+        self.store = store
+        self.limits = limits
+
+    def check(self, uid: str, action: str) -> None:
+        """Consume one token for `uid`/`action`, or raise RateLimitExceeded."""
+        if action not in self.limits:
+            return
+        per_minute, burst = self.limits[action]
+        allowed, retry_after = self.store.take(f"{action}:{uid}", per_minute / 60.0, burst)
+        if not allowed:
+            metrics.inc("rate_limit_rejections_total", action=action)
+            raise RateLimitExceeded(action, retry_after)
+
+
+_user_limiter: Optional[UserRateLimiter] = None
+_user_limiter_lock = threading.Lock()
+
+
+def get_user_rate_limiter() -> UserRateLimiter:
+    """`[rate_limits] backend = "memory" | "firestore"`, `<action>_per_minute`, `<action>_burst`."""
+    global _user_limiter
+    with _user_limiter_lock:
+        if _user_limiter is None:
+            cfg = secrets_section("rate_limits")
+            limits = {action: (float(cfg.get(f"{action}_per_minute", rate)), float(cfg.get(f"{action}_burst", burst)))
+                      for action, (rate, burst) in DEFAULT_USER_LIMITS.items()}
+            store = FirestoreBucketStore() if cfg.get("backend") == "firestore" else InProcessBucketStore()
+            _user_limiter = UserRateLimiter(store, limits)
+        return _user_limiter
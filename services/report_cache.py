@@ -0,0 +1,131 @@
+import datetime as dt
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from services import metrics
+from services.config import secrets_section
+from services.firebase import get_firestore_client
+
+
+# Profile fields that change on every login and must not affect the report key.
+_VOLATILE_FIELDS = {"lastLogin", "createdAt"}
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items() if k not in _VOLATILE_FIELDS}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def compute_report_key(user_data: Dict[str, Any], report_type: str, model_name: str, prompt_version: Any) -> str:
+    """Content hash of the filtered report input.
+
+    Results are ordered by document id so the key does not depend on the
+    order Firestore streams them in; any new result inside the selected
+    range changes the key, which is what invalidates older entries.
+    """
+    results = sorted(user_data.get("results", []), key=lambda r: str(r.get("id", "")))
+    payload = {
+        "profile": _normalize(user_data.get("profile", {})),
+        "results": _normalize(results),
+        "reportType": report_type,
+        "model": model_name,
+        "promptVersion": prompt_version,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    """Local LRU store of generated report text and PDF bytes, keyed by content hash."""
+
+    def __init__(self, root: str, max_entries: int = 200) -> None:
+        self.root = root
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, None]" = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.root, key)
+        return base + ".txt", base + ".pdf"
+
+    def _load_index(self) -> None:
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".txt"):
+                path = os.path.join(self.root, name)
+                entries.append((os.path.getmtime(path), name[:-4]))
+        for _, key in sorted(entries):
+            self._index[key] = None
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            if key not in self._index:
+                return None
+            text_path, pdf_path = self._paths(key)
+            try:
+                with open(text_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                with open(pdf_path, "rb") as f:
+                    pdf = f.read()
+            except OSError:
+                self._index.pop(key, None)
+                return None
+            self._index.move_to_end(key)
+            os.utime(text_path)
+            return text, pdf
+
+    def put(self, key: str, text: str, pdf: bytes) -> None:
+        with self._lock:
+            text_path, pdf_path = self._paths(key)
+            with open(pdf_path, "wb") as f:
+                f.write(pdf)
+            # Text is written last: its presence marks a complete entry.
+            with open(text_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            self._index[key] = None
+            self._index.move_to_end(key)
+            while len(self._index) > self.max_entries:
+                old, _ = self._index.popitem(last=False)
+                for path in self._paths(old):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+_cache: Optional[ReportCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache() -> ReportCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            cfg = secrets_section("report_cache")
+            _cache = ReportCache(cfg.get("dir", ".cache/reports"), int(cfg.get("max_entries", 200)))
+        return _cache
+
+
+def find_indexed_report(uid: str, key: str) -> Optional[Dict[str, Any]]:
+    """Return the stored `reports` document generated from the same input, if any."""
+    db = get_firestore_client()
+    query = db.collection("reports").where("userId", "==", uid).where("cacheKey", "==", key).limit(1)
+    for doc in query.stream():
+        data = doc.to_dict()
+        metrics.firestore_read("reports", [data])
+        return data
+    metrics.firestore_read("reports", [])
+    return None
@@ -0,0 +1,153 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from services.config import secrets_section
+from services.llm import RETRYABLE_ERRORS, CircuitOpenError
+from services.rate_limit import TokenBucket
+
+
+class JobTimeout(Exception):
+    pass
+
+
+@dataclass
+class ReportJob:
+    id: str
+    uid: str
+    report_type: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    status: str = "queued"  # queued | running | done | failed
+    attempts: int = 0
+    partial_text: str = ""
+    text: str = ""
+    pdf: bytes = b""
+    error: str = ""
+    notice: str = ""
+    from_cache: bool = False
+    degraded: bool = False  # shown but neither cached nor logged
+    created_at: float = field(default_factory=time.time)
+    finished_at: float = 0.0
+    deadline: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check_deadline(self) -> None:
+        if time.monotonic() > self.deadline:
+            raise JobTimeout(f"Rapor işi {self.id} zaman aşımına uğradı.")
+
+
+JobHandler = Callable[[ReportJob, TokenBucket], None]
+
+
+class ReportJobQueue:
+    """Bounded worker pool for report jobs.
+
+    The handler does the actual work and calls `limiter.acquire()` before
+    each Gemini request, so the rate limit is shared by every worker in the
+    process. Transient model errors are retried by the model client only, so
+    when they reach the queue the client has already given up and the job
+    fails; one job never multiplies the client's retries. Other failures
+    (e.g. a report that violates the schema) are retried with exponential
+    backoff as long as the per-job deadline allows it, each attempt taking
+    a fresh limiter token for its one model request.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        rate_per_minute: float = 30.0,
+        burst: int = 5,
+        max_attempts: int = 3,
+        timeout_seconds: float = 120.0,
+        backoff_seconds: float = 2.0,
+        retention_seconds: float = 3600.0,
+    ) -> None:
+        self.limiter = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_attempts = max(1, int(max_attempts))
+        self.timeout_seconds = float(timeout_seconds)
+        self.backoff_seconds = float(backoff_seconds)
+        self.retention_seconds = float(retention_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="report-job")
+        self._jobs: Dict[str, ReportJob] = {}
+        self._latest: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, uid: str, report_type: str, params: Dict[str, Any], handler: JobHandler) -> ReportJob:
+        job = ReportJob(id=uuid.uuid4().hex, uid=uid, report_type=report_type, params=params)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._latest[uid] = job.id
+        self._executor.submit(self._run, job, handler)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest_for_user(self, uid: str) -> Optional[ReportJob]:
+        with self._lock:
+            job_id = self._latest.get(uid)
+            return self._jobs.get(job_id) if job_id else None
+
+    def active_jobs(self) -> List[ReportJob]:
+        with self._lock:
+            return [j for j in self._jobs.values() if not j.finished]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        stale = [k for k, j in self._jobs.items() if j.finished and j.finished_at < cutoff]
+        for k in stale:
+            job = self._jobs.pop(k)
+            if self._latest.get(job.uid) == k:
+                self._latest.pop(job.uid, None)
+
+    def _run(self, job: ReportJob, handler: JobHandler) -> None:
+        job.status = "running"
+        job.deadline = time.monotonic() + self.timeout_seconds
+        while True:
+            job.attempts += 1
+            job.partial_text = ""
+            try:
+                handler(job, self.limiter)
+                job.status = "done"
+                break
+            except (JobTimeout, CircuitOpenError, *RETRYABLE_ERRORS) as e:
+                job.status, job.error = "failed", str(e)
+                break
+            except Exception as e:
+                delay = self.backoff_seconds * (2 ** (job.attempts - 1))
+                if job.attempts >= self.max_attempts or delay >= job.remaining():
+                    job.status, job.error = "failed", str(e)
+                    break
+                time.sleep(delay)
+        job.finished_at = time.time()
+
+
+_queue: Optional[ReportJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_report_job_queue() -> ReportJobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            cfg = secrets_section("report_jobs")
+            _queue = ReportJobQueue(
+                max_workers=int(cfg.get("workers", 4)),
+                rate_per_minute=float(cfg.get("rate_per_minute", 30)),
+                burst=int(cfg.get("burst", 5)),
+                max_attempts=int(cfg.get("max_attempts", 3)),
+                timeout_seconds=float(cfg.get("timeout_seconds", 120)),
+                backoff_seconds=float(cfg.get("backoff_seconds", 2)),
+            )
+        return _queue
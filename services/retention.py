@@ -0,0 +1,183 @@
+"""Tiered retention for `testResults`: raw trials of old sessions move to archive blobs.
+
+    python -m services.retention compact --days 180
+    python -m services.retention rehydrate <resultId> [--restore]
+
+Compaction pages through results completed before the cutoff, uploads each
+document's `responses` as gzipped JSON to the artifact store under
+`trials/{uid}/{resultId}.json.gz`, and replaces the field with `trialSummary`
+(counts, RT histogram and quantiles) plus an `archive` pointer. Score,
+accuracy and RT fields are untouched, so charts and reports do not change.
+Documents that already have `archive` are skipped, and the blob key is
+deterministic, so an interrupted run can simply be started again.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from google.cloud import firestore as gfs
+
+from services import metrics
+from services.cache import get_cache
+from services.config import secrets_section
+from services.dates import to_ms
+from services.firebase import get_firestore_client
+from services.session_store import json_dumps, json_loads
+from services.storage import get_artifact_store
+
+
+ARCHIVE_FORMAT = 1
+DEFAULT_RAW_DAYS = 180
+DEFAULT_BATCH_SIZE = 200
+# Response-time histogram bucket edges in seconds; the last bucket is open-ended.
+RT_EDGES = [0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0]
+
+
+def archive_key(uid: str, result_id: str) -> str:
+    return f"trials/{uid}/{result_id}.json.gz"
+
+
+def trial_summary(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    rts = np.array([float(r.get("responseTime", 0.0)) for r in responses]) if responses else np.zeros(0)
+    summary: Dict[str, Any] = {
+        "count": len(responses),
+        "correct": sum(1 for r in responses if r.get("correct")),
+        "rtHistogram": {"edges": RT_EDGES, "counts": np.bincount(np.searchsorted(RT_EDGES, rts, side="right"),
+                                                                 minlength=len(RT_EDGES) + 1).tolist()},
+    }
+    if len(rts):
+        p50, p90 = np.percentile(rts, [50, 90])
+        summary.update(rtMean=round(float(rts.mean()), 3), rtMedian=round(float(p50), 3), rtP90=round(float(p90), 3))
+    conditions: Dict[str, Dict[str, Any]] = {}
+    for r in responses:
+        condition = (r.get("meta") or {}).get("condition")
+        if condition:
+            c = conditions.setdefault(condition, {"count": 0, "correct": 0, "rtSum": 0.0})
+            c["count"] += 1
+            c["correct"] += int(bool(r.get("correct")))
+            c["rtSum"] += float(r.get("responseTime", 0.0))
+    if conditions:
+        summary["byCondition"] = {k: {"count": c["count"], "correct": c["correct"], "rtMean": round(c["rtSum"] / c["count"], 3)}
+                                  for k, c in conditions.items()}
+    return summary
+
+
+def _archive_blob(result_id: str, data: Dict[str, Any]) -> bytes:
+    payload = {"format": ARCHIVE_FORMAT, "resultId": result_id, "userId": data.get("userId"), "responses": data["responses"]}
+    # mtime=0 keeps the bytes (and the sha256) identical across re-runs.
+    return gzip.compress(json_dumps(payload), mtime=0)
+
+
+def compact(days: Optional[int] = None, batch_size: Optional[int] = None, limit: Optional[int] = None,
+            dry_run: bool = False, store=None) -> Dict[str, int]:
+    """Archive the raw trials of results older than `days`; returns counters."""
+    cfg = secrets_section("retention")
+    days = int(days if days is not None else cfg.get("raw_days", DEFAULT_RAW_DAYS))
+    batch_size = int(batch_size or cfg.get("batch_size", DEFAULT_BATCH_SIZE))
+    store = store or get_artifact_store()
+    db = get_firestore_client()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    base = db.collection("testResults").where("completedAtMs", "<", to_ms(cutoff)).order_by("completedAtMs")
+
+    stats = {"scanned": 0, "compacted": 0, "skipped": 0, "bytes": 0}
+    touched_users = set()
+    last = None
+    while limit is None or stats["compacted"] < limit:
+        page = list((base.start_after(last) if last is not None else base).limit(batch_size).stream())
+        if not page:
+            break
+        last = page[-1]
+        batch = db.batch()
+        pending = 0
+        for snap in page:
+            if limit is not None and stats["compacted"] >= limit:
+                break
+            stats["scanned"] += 1
+            data = snap.to_dict()
+            if data.get("archive") or not data.get("responses"):
+                stats["skipped"] += 1
+                continue
+            blob = _archive_blob(snap.id, data)
+            stats["compacted"] += 1
+            stats["bytes"] += len(blob)
+            if dry_run:
+                continue
+            key = archive_key(data.get("userId", "_"), snap.id)
+            url = store.put(key, blob, "application/gzip")
+            batch.update(db.collection("testResults").document(snap.id), {
+                "responses": gfs.DELETE_FIELD,
+                "trialSummary": trial_summary(data["responses"]),
+                "archive": {"format": ARCHIVE_FORMAT, "key": key, "url": url, "bytes": len(blob),
+                            "sha256": hashlib.sha256(blob).hexdigest(), "compactedAt": gfs.SERVER_TIMESTAMP},
+            })
+            touched_users.add(data.get("userId"))
+            pending += 1
+        metrics.firestore_read("testResults", [s.to_dict() for s in page])
+        if pending:
+            # The blobs are uploaded before the documents stop pointing at raw trials.
+            batch.commit()
+            metrics.inc("retention_compacted_total", float(pending))
+        if len(page) < batch_size:
+            break
+    for uid in touched_users:
+        get_cache().invalidate("results", uid)
+    return stats
+
+
+def rehydrate(result_id: str, restore: bool = False, store=None) -> Dict[str, Any]:
+    """The result document with its raw `responses`, loaded from the archive if compacted.
+
+    `restore=True` writes the trials back into Firestore and drops the archive pointer
+    (the blob is kept, so a later compaction reuses the same key).
+    """
+    store = store or get_artifact_store()
+    ref = get_firestore_client().collection("testResults").document(result_id)
+    snap = ref.get()
+    if not snap.exists:
+        raise KeyError(f"testResults/{result_id} yok")
+    data = snap.to_dict()
+    metrics.firestore_read("testResults", [data])
+    archive = data.get("archive")
+    if not archive:
+        return data
+    blob = store.get(archive["key"])
+    if hashlib.sha256(blob).hexdigest() != archive.get("sha256"):
+        raise ValueError(f"arşiv sağlama toplamı uyuşmuyor: {archive['key']}")
+    payload = json_loads(gzip.decompress(blob))
+    if payload.get("format") != ARCHIVE_FORMAT:
+        raise ValueError(f"bilinmeyen arşiv biçimi {payload.get('format')}")
+    data["responses"] = payload["responses"]
+    if restore:
+        ref.update({"responses": payload["responses"], "archive": gfs.DELETE_FIELD, "trialSummary": gfs.DELETE_FIELD})
+        get_cache().invalidate("results", data.get("userId", ""))
+        data.pop("archive")
+        data.pop("trialSummary", None)
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="testResults saklama katmanları")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_compact = sub.add_parser("compact", help="eski oturumların ham denemelerini arşivle")
+    p_compact.add_argument("--days", type=int, help=f"bu günden eski sonuçlar (varsayılan [retention] raw_days / {DEFAULT_RAW_DAYS})")
+    p_compact.add_argument("--batch-size", type=int)
+    p_compact.add_argument("--limit", type=int, help="en fazla bu kadar belge sıkıştır")
+    p_compact.add_argument("--dry-run", action="store_true")
+    p_rehydrate = sub.add_parser("rehydrate", help="bir oturumun ham denemelerini getir")
+    p_rehydrate.add_argument("result_id")
+    p_rehydrate.add_argument("--restore", action="store_true", help="denemeleri Firestore'a geri yaz")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        print(compact(args.days, args.batch_size, args.limit, args.dry_run))
+    else:
+        data = rehydrate(args.result_id, args.restore)
+        print(json.dumps(data["responses"], ensure_ascii=False, default=str, indent=1))
+
+
+if __name__ == "__main__":
+    main()
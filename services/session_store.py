@@ -0,0 +1,273 @@
+"""Session state kept outside the Streamlit process.
+
+Registered `st.session_state` keys are mirrored to a `SessionStore` under a
+session id carried in the `?sid=` query parameter, so a reconnect to any
+replica (or to a restarted one) resumes the same page and test progress.
+
+The sid is not a credential: login state and tokens are never stored, and
+a stored session is bound to the uid that wrote it. Its fields are loaded
+only after the tab has signed in and the ID token verifies for that same
+uid; a link carrying someone else's sid gets a fresh sid instead. After
+every rerun only the fields whose encoded bytes changed are written back.
+"""
+import contextlib
+import datetime as dt
+import hashlib
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import streamlit as st
+
+from services import metrics
+from services.config import secrets_section
+from services.identity import AuthError, get_token_verifier
+
+
+DEFAULT_TTL_SECONDS = 12 * 3600
+_SID_PARAM = "sid"
+_SID_KEY = "_session_id"
+_DIGESTS_KEY = "_session_digests"
+_OWNER_KEY = "_session_owner"
+# Stored alongside the fields; a session is only ever loaded for this uid.
+_OWNER_FIELD = "_owner"
+SWEEP_SECONDS = 60.0
+
+
+class InProcessSessionStore:
+    """Single-process store; survives reconnects, not restarts.
+
+    A daemon thread drops expired sessions every `sweep_seconds`, so sids that
+    are never loaded again do not accumulate."""
+
+    def __init__(self, sweep_seconds: float = SWEEP_SECONDS) -> None:
+        self._sessions: Dict[str, Tuple[float, Dict[str, bytes]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_loop, args=(sweep_seconds,),
+                                         name="session-store-sweep", daemon=True)
+        self._sweeper.start()
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires, _) in self._sessions.items() if expires < now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def load(self, sid: str) -> Dict[str, bytes]:
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None or entry[0] < time.time():
+                self._sessions.pop(sid, None)
+                return {}
+            return dict(entry[1])
+
+    def save(self, sid: str, fields: Dict[str, bytes], ttl: float) -> None:
+        with self._lock:
+            _, stored = self._sessions.get(sid, (0.0, {}))
+            stored.update(fields)
+            self._sessions[sid] = (time.time() + ttl, stored)
+
+
+class SqliteSessionStore:
+    """Shared key-value store on a SQLite file, a local stand-in for Redis:
+    every replica on the host that points at the same file sees the same sessions."""
+
+    def __init__(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, expires REAL NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS session_fields ("
+                               "sid TEXT NOT NULL, field TEXT NOT NULL, value BLOB NOT NULL, PRIMARY KEY (sid, field))")
+
+    def load(self, sid: str) -> Dict[str, bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT expires FROM sessions WHERE sid = ?", (sid,)).fetchone()
+            if row is None or row[0] < time.time():
+                return {}
+            rows = self._conn.execute("SELECT field, value FROM session_fields WHERE sid = ?", (sid,)).fetchall()
+        return {field: bytes(value) for field, value in rows}
+
+    def save(self, sid: str, fields: Dict[str, bytes], ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT OR REPLACE INTO sessions (sid, expires) VALUES (?, ?)", (sid, now + ttl))
+                self._conn.executemany("INSERT OR REPLACE INTO session_fields (sid, field, value) VALUES (?, ?, ?)",
+                                       [(sid, k, v) for k, v in fields.items()])
+                self._conn.execute("DELETE FROM session_fields WHERE sid IN (SELECT sid FROM sessions WHERE expires < ?)", (now,))
+                self._conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+def _encode_value(obj: Any) -> Any:
+    if isinstance(obj, dt.datetime):
+        return {"$dt": obj.isoformat()}
+    raise TypeError(f"{type(obj).__name__} is not session-serializable")
+
+
+def _decode_value(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and "$dt" in obj:
+        return dt.datetime.fromisoformat(obj["$dt"])
+    return obj
+
+
+def json_dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=_encode_value).encode("utf-8")
+
+
+def json_loads(data: bytes) -> Any:
+    return json.loads(data.decode("utf-8"), object_hook=_decode_value)
+
+
+Codec = Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]
+
+# session_state key -> (encode, decode); pages with non-JSON state register their own codec.
+_codecs: Dict[str, Codec] = {
+    key: (json_dumps, json_loads)
+    for key in ("active_page", "_saved_last_result")
+}
+
+
+def register(key: str, encode: Callable[[Any], bytes], decode: Callable[[bytes], Any]) -> None:
+    _codecs[key] = (encode, decode)
+
+
+_store: Optional[Any] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> Any:
+    """`[session_store] backend = "memory" | "sqlite"`, `path`, `ttl_seconds`."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            cfg = secrets_section("session_store")
+            if cfg.get("backend") == "sqlite":
+                _store = SqliteSessionStore(cfg.get("path", ".cache/sessions.sqlite3"))
+            else:
+                _store = InProcessSessionStore(float(cfg.get("sweep_seconds", SWEEP_SECONDS)))
+        return _store
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _new_sid() -> str:
+    sid = secrets.token_urlsafe(24)
+    st.query_params[_SID_PARAM] = sid
+    return sid
+
+
+def _session_id() -> str:
+    """The tab keeps the sid it started with; a different `?sid=` pasted later is ignored."""
+    sid = st.session_state.get(_SID_KEY)
+    if sid is None:
+        sid = st.query_params.get(_SID_PARAM) or _new_sid()
+        st.session_state[_SID_KEY] = sid
+    elif st.query_params.get(_SID_PARAM) != sid:
+        st.query_params[_SID_PARAM] = sid
+    return sid
+
+
+def _verified_uid() -> Optional[str]:
+    """uid of this tab's own sign-in, re-checked against its ID token."""
+    tokens = st.session_state.get("auth_tokens")
+    if not st.session_state.get("is_authenticated") or not tokens:
+        return None
+    try:
+        claims = get_token_verifier().verify(tokens["idToken"])
+    except AuthError:
+        # Expired: auth.ensure_valid_session refreshes it, the next rerun binds.
+        return None
+    return claims["sub"] if claims["sub"] == tokens.get("uid") else None
+
+
+def _bind(sid: str, uid: str) -> None:
+    """Attach the tab's session to `uid`, loading stored fields only if `uid` wrote them."""
+    with metrics.timed("session_store_load_seconds"):
+        stored = get_session_store().load(sid)
+    owner = json_loads(stored[_OWNER_FIELD]) if _OWNER_FIELD in stored else None
+    if stored and owner != uid:
+        metrics.inc("session_store_foreign_sid_total")
+        sid = _new_sid()
+        st.session_state[_SID_KEY] = sid
+        stored = {}
+    digests: Dict[str, str] = {}
+    for key, data in stored.items():
+        if key in _codecs:
+            st.session_state[key] = _codecs[key][1](data)
+            digests[key] = _digest(data)
+    if _OWNER_FIELD in stored:
+        digests[_OWNER_FIELD] = _digest(stored[_OWNER_FIELD])
+    st.session_state[_OWNER_KEY] = uid
+    st.session_state[_DIGESTS_KEY] = digests
+
+
+def _flush(sid: str, uid: str) -> None:
+    digests = st.session_state[_DIGESTS_KEY]
+    dirty: Dict[str, bytes] = {}
+    values = {key: st.session_state[key] for key in _codecs if key in st.session_state}
+    values[_OWNER_FIELD] = uid
+    for key, value in values.items():
+        encode = _codecs[key][0] if key in _codecs else json_dumps
+        data = encode(value)
+        digest = _digest(data)
+        if digests.get(key) != digest:
+            dirty[key] = data
+            digests[key] = digest
+    if dirty:
+        ttl = float(secrets_section("session_store").get("ttl_seconds", DEFAULT_TTL_SECONDS))
+        with metrics.timed("session_store_save_seconds"):
+            get_session_store().save(sid, dirty, ttl)
+        metrics.inc("session_store_bytes_written_total", float(sum(len(v) for v in dirty.values())))
+
+
+@contextlib.contextmanager
+def session_sync() -> Iterator[None]:
+    """Wrap a whole rerun: bind and load once signed in, write dirty fields at the end.
+
+    Nothing is loaded or written for a signed-out tab. Signing in as another
+    user in the same tab moves it to a fresh sid. The write runs in `finally`
+    because `st.rerun()` and `st.stop()` end a rerun by raising, usually right
+    after the state change that has to be saved."""
+    sid = _session_id()
+    owner = st.session_state.get(_OWNER_KEY)
+    tokens = st.session_state.get("auth_tokens") or {}
+    if st.session_state.get("is_authenticated") and tokens.get("uid") != owner:
+        if owner is not None:
+            sid = _new_sid()
+            st.session_state[_SID_KEY] = sid
+            # Rotate once: until the new uid binds, the tab has no owner, so a
+            # token that does not verify yet does not mint a sid every rerun.
+            del st.session_state[_OWNER_KEY]
+        uid = _verified_uid()
+        if uid:
+            _bind(sid, uid)
+            sid = st.session_state[_SID_KEY]
+    try:
+        yield
+    finally:
+        owner = st.session_state.get(_OWNER_KEY)
+        tokens = st.session_state.get("auth_tokens") or {}
+        if owner is not None and st.session_state.get("is_authenticated") and tokens.get("uid") == owner:
+            _flush(sid, owner)
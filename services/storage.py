@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+
+from services.config import secrets_section
+from services.firebase import _init_admin_if_needed
+
+
+class LocalArtifactStore:
+    """Filesystem stand-in for object storage (development, tests, single host)."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return self.url(key)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def url(self, key: str) -> str:
+        return "file://" + os.path.abspath(self._path(key))
+
+
+class GCSArtifactStore:
+    """Cloud Storage bucket (the Firebase project's bucket by default)."""
+
+    def __init__(self, bucket_name: str, prefix: str = "") -> None:
+        _init_admin_if_needed()
+        from firebase_admin import storage
+
+        self.bucket = storage.bucket(bucket_name)
+        self.prefix = prefix.strip("/")
+
+    def _name(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key: str) -> bool:
+        return self.bucket.blob(self._name(key)).exists()
+
+    def put(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        blob = self.bucket.blob(self._name(key))
+        blob.upload_from_string(data, content_type=content_type)
+        return self.url(key)
+
+    def get(self, key: str) -> bytes:
+        return self.bucket.blob(self._name(key)).download_as_bytes()
+
+    def delete(self, key: str) -> None:
+        blob = self.bucket.blob(self._name(key))
+        if blob.exists():
+            blob.delete()
+
+    def url(self, key: str) -> str:
+        return f"gs://{self.bucket.name}/{self._name(key)}"
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """`[storage] backend = "gcs" | "local"`; defaults to GCS when the Firebase
+    bucket is configured, otherwise a local directory."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            cfg = secrets_section("storage")
+            bucket = cfg.get("bucket") or secrets_section("firebase").get("storage_bucket")
+            backend = cfg.get("backend", "gcs" if bucket else "local")
+            if backend == "gcs":
+                _store = GCSArtifactStore(bucket, cfg.get("prefix", ""))
+            else:
+                _store = LocalArtifactStore(cfg.get("dir", ".cache/artifacts"))
+        return _store
+
+
+# Part of the PDF key: bump when the renderer output changes.
+PDF_RENDER_VERSION = 1
+
+
+def report_pdf_key(report_text: str) -> str:
+    digest = hashlib.sha256(f"{PDF_RENDER_VERSION}\n{report_text}".encode("utf-8")).hexdigest()
+    return f"reports/{digest}.pdf"
+
+
+def store_report_pdf(report_text: str, render, store=None) -> "tuple[str, str, bytes]":
+    """Return (key, url, pdf) for `report_text`, rendering and uploading only
+    if no identical report is stored yet. `render(text) -> bytes`."""
+    store = store or get_artifact_store()
+    key = report_pdf_key(report_text)
+    if store.exists(key):
+        return key, store.url(key), store.get(key)
+    pdf = render(report_text)
+    return key, store.put(key, pdf, "application/pdf"), pdf
+
+
+def load_report_pdf(key: str, store=None) -> Optional[bytes]:
+    store = store or get_artifact_store()
+    try:
+        return store.get(key)
+    except Exception:
+        return None
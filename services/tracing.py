@@ -0,0 +1,123 @@
+"""Minimal tracing: nested spans exported as OTLP/JSON lines.
+
+Each finished span is written as one ExportTraceServiceRequest per line, the
+format the OpenTelemetry Collector's `otlpjsonfile` receiver reads. Sampling
+is decided once per trace at the root span, so enabled-but-unsampled traces
+cost a random() call and a context variable lookup.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from services.config import secrets_section
+
+
+SERVICE_NAME = "neuroai"
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes: Dict[str, Any] = {}
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class JsonlExporter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, span: Span) -> None:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": [otlp_span]}],
+        }]}, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Tracer:
+    def __init__(self, exporter: Optional[JsonlExporter], sample_rate: float = 1.0) -> None:
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        parent = self._current.get()
+        if parent is None:
+            sampled = self.exporter is not None and random.random() < self.sample_rate
+            span = Span(name, f"{random.getrandbits(128):032x}", None, sampled)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, parent.sampled)
+        for key, value in attributes.items():
+            span.set_attribute(key, value)
+        token = self._current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._current.reset(token)
+            span.end_ns = time.time_ns()
+            if span.sampled:
+                self.exporter.export(span)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """`[tracing] enabled`, `sample_rate` (0..1) and `path` of the JSONL file."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            cfg = secrets_section("tracing")
+            exporter = JsonlExporter(cfg.get("path", ".cache/traces.jsonl")) if cfg.get("enabled", False) else None
+            _tracer = Tracer(exporter, float(cfg.get("sample_rate", 1.0)))
+        return _tracer
+
+
+def span(name: str, **attributes: Any):
+    """`with span("report.collect", uid=uid) as s: ...` on the process tracer."""
+    return get_tracer().span(name, **attributes)
@@ -1,12 +1,11 @@
 import streamlit as st
 from typing import Any, Dict
-from services.firebase import get_firestore_client
+from services.profile import get_profile, update_profile
 
 
 def _load_profile(uid: str) -> Dict[str, Any]:
-    db = get_firestore_client()
-    doc = db.collection("users").document(uid).get()
-    return doc.to_dict() or {}
+    # Served from the session cache; reruns of this page do not hit Firestore.
+    return get_profile(uid)
 
 
 def render_settings_page() -> None:
@@ -52,10 +51,9 @@ def render_settings_page() -> None:
     datashare = st.checkbox("Veri Paylaşımı", value=bool(prefs.get("dataSharing", False)))
 
     if st.button("Kaydet", type="primary"):
-        db = get_firestore_client()
         medical_combined = ", ".join(medical_sel + ([medical_other] if medical_other else []))
         family_combined = ", ".join(family_sel + ([family_other] if family_other else []))
-        db.collection("users").document(uid).set({
+        changed = update_profile(uid, {
             "profile": {
                 "firstName": first_name,
                 "lastName": last_name,
@@ -71,7 +69,7 @@ def render_settings_page() -> None:
                 "notifications": bool(notifications),
                 "dataSharing": bool(datashare),
             },
-        }, merge=True)
+        })
         st.session_state.user["profile"] = {
             "firstName": first_name,
             "lastName": last_name,
@@ -81,4 +79,4 @@ def render_settings_page() -> None:
             "medicalConditions": medical_combined,
             "familyMedicalHistory": family_combined,
         }
-        st.success("Kaydedildi")
\ No newline at end of file
+        st.success("Kaydedildi" if changed else "Değişiklik yok")
\ No newline at end of file
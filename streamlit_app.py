@@ -14,12 +14,16 @@ import base64
 
 # Import our modules
 from services.firebase import get_firestore_client, get_pyrebase_auth
-from auth import render_auth_page
+from auth import ensure_valid_session, render_auth_page
 from dashboard import render_dashboard_page
 from tests import render_tests_page
 from results import render_results_page
 from reports import render_reports_page
 from settings import render_settings_page
+from cohort import is_clinician, render_cohort_page
+from debug_panel import profile_scope, record_rerun, render_debug_panel
+from services import metrics
+from services.session_store import session_sync
 
 # Set page config
 st.set_page_config(
@@ -118,11 +122,15 @@ def render_sidebar() -> None:
                 ("📋 Raporlar", "Raporlar"),
                 ("⚙️ Ayarlar", "Ayarlar"),
             ]
+            if is_clinician():
+                nav_options.append(("👥 Kohort", "Kohort"))
             
+            pages = [opt[1] for opt in nav_options]
             nav = st.selectbox(
                 "Sayfa Seçin",
-                options=[opt[1] for opt in nav_options],
-                index=0,
+                options=pages,
+                # Follow active_page so a resumed session (or a dashboard shortcut) keeps its page.
+                index=pages.index(st.session_state.active_page) if st.session_state.active_page in pages else 0,
                 label_visibility="collapsed"
             )
             
@@ -144,21 +152,31 @@ PAGE_RENDERERS = {
     "Sonuçlar": render_results_page,
     "Raporlar": render_reports_page,
     "Ayarlar": render_settings_page,
+    "Kohort": render_cohort_page,
     "Auth": render_auth_page,
 }
 
 def main() -> None:
-    ensure_session_defaults()
-    render_sidebar()
+    with session_sync():
+        ensure_session_defaults()
+        ensure_valid_session()
+        render_sidebar()
 
-    active = st.session_state.active_page
-    if active != "Auth" and not st.session_state.is_authenticated:
-        st.warning("Lütfen giriş yapın")
-        render_auth_page()
-        return
+        active = st.session_state.active_page
+        if active != "Auth" and not st.session_state.is_authenticated:
+            st.warning("Lütfen giriş yapın")
+            render_auth_page()
+            return
 
-    renderer = PAGE_RENDERERS.get(active, render_dashboard_page)
-    renderer()
+        renderer = PAGE_RENDERERS.get(active, render_dashboard_page)
+        # st.rerun() raises out of the renderer (every navigation and job poll), so the
+        # rerun is recorded on the way out rather than after the block.
+        try:
+            with metrics.rerun_scope(active) as rerun, profile_scope(active):
+                renderer()
+        finally:
+            record_rerun(rerun)
+            render_debug_panel()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,10 +1,18 @@
 import time
 import random
+import struct
+import zlib
 import datetime as dt
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
 import streamlit as st
+from services import metrics as obs
+from services import cohort_stats, session_store
+from services.cache import get_cache
+from services.dates import completion_fields
 from services.firebase import get_firestore_client
+from services.rate_limit import RateLimitExceeded, get_user_rate_limiter
+from services.tracing import span
 from google.cloud import firestore as gfs
 
 
@@ -17,6 +25,11 @@ class ResponseItem:
     meta: Dict[str, Any] = field(default_factory=dict)
 
 
+_ENGINE_FORMAT = 1
+# A rate-limited save of a finished test is retried on its own, at most this long apart.
+SAVE_RETRY_POLL_SECONDS = 5.0
+
+
 @dataclass
 class CognitiveTest:
     test_type: str
@@ -30,6 +43,26 @@ class CognitiveTest:
     question_started_at: float = 0.0
     question_runtime_meta: Dict[str, Any] = field(default_factory=dict)
 
+    def to_bytes(self) -> bytes:
+        """Compact form for the session store: positional JSON, zlib-compressed."""
+        state = [
+            self.test_type, self.phase, self.questions, self.practice_questions,
+            [[r.questionId, r.response, r.correct, r.responseTime, r.meta] for r in self.responses],
+            [[r.questionId, r.response, r.correct, r.responseTime, r.meta] for r in self.practice_responses],
+            self.current_index, self.started_at, self.question_started_at, self.question_runtime_meta,
+        ]
+        return bytes([_ENGINE_FORMAT]) + zlib.compress(session_store.json_dumps(state), 6)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CognitiveTest":
+        if data[0] != _ENGINE_FORMAT:
+            raise ValueError(f"unknown engine format {data[0]}")
+        (test_type, phase, questions, practice_questions, responses, practice_responses,
+         current_index, started_at, question_started_at, runtime_meta) = session_store.json_loads(zlib.decompress(data[1:]))
+        return cls(test_type, phase, questions, practice_questions,
+                   [ResponseItem(*r) for r in responses], [ResponseItem(*r) for r in practice_responses],
+                   current_index, started_at, question_started_at, runtime_meta)
+
     def start(self) -> None:
         self.started_at = time.time()
         self.current_index = 0
@@ -107,8 +140,15 @@ class CognitiveTest:
         return metrics
 
     def save_results(self, uid: str) -> None:
+        with span("test.save_results", test_type=self.test_type, responses=len(self.responses)):
+            self._save_results(uid)
+
+    def _save_results(self, uid: str) -> None:
+        # Raises RateLimitExceeded before any Firestore write.
+        get_user_rate_limiter().check(uid, "test_save")
         db = get_firestore_client()
         metrics = self.calculate_metrics()
+        completed = dt.datetime.now(dt.timezone.utc)
         payload = {
             "userId": uid,
             "testType": self.test_type,
@@ -116,10 +156,12 @@ class CognitiveTest:
             "accuracy": metrics.get("accuracy", 0.0),
             "averageResponseTime": metrics.get("avg_rt", 0.0),
             "responses": [r.__dict__ for r in self.responses],
+            "scoringVersion": SCORING_VERSION,
+            **completion_fields(completed),
             "metadata": {
                 "duration": max(0.0, time.time() - self.started_at),
                 "completedAt": gfs.SERVER_TIMESTAMP,
-                "_completedAtStr": dt.datetime.utcnow().isoformat() + "Z",
+                "_completedAtStr": completed.replace(tzinfo=None).isoformat() + "Z",
             },
             "analysis": {
                 "strengths": [],
@@ -132,7 +174,10 @@ class CognitiveTest:
                 "stroopEffect": self.calculate_metrics().get("stroop_effect", 0.0),
                 "errorRate": 100 - self.calculate_metrics().get("accuracy", 0.0),
             })
-        db.collection("testResults").add(payload)
+        # The result and the clinician-view summaries commit together.
+        cohort_stats.save_result(db, uid, payload)
+        obs.firestore_write("testResults", payload)
+        get_cache().invalidate("results", uid)
 
 
 # ---------- Question Generators and Evaluators ----------
@@ -278,6 +323,12 @@ def generate_stroop_trials(n: int) -> List[Dict[str, Any]]:
     return questions
 
 
+# Stored with every result; bump when a rule below changes and run rescore_results.py.
+SCORING_VERSION = 1
+# Word-list recall passes when at least 1/WORD_RECALL_DIVISOR of the words are recalled.
+WORD_RECALL_DIVISOR = 3
+
+
 def evaluate_answer(test_type: str, q: Dict[str, Any], user_input: Any, runtime_meta: Dict[str, Any]) -> (bool, Dict[str, Any]):
     meta: Dict[str, Any] = {}
     if test_type == "memory":
@@ -286,9 +337,11 @@ def evaluate_answer(test_type: str, q: Dict[str, Any], user_input: Any, runtime_
             typed = {w.strip().lower() for w in str(user_input).replace("\n", " ").split(" ") if w.strip()}
             recalled = len(presented.intersection(typed))
             meta.update({"recalled": recalled, "total": len(presented)})
-            return recalled >= max(1, len(presented)//3), meta
+            return recalled >= max(1, len(presented)//WORD_RECALL_DIVISOR), meta
+        # `expected` is kept in meta so stored results can be re-scored later.
         if q["type"] == "number_sequence":
-            return str(user_input).strip() == str(q.get("digits", "")).strip(), meta
+            meta["expected"] = str(q.get("digits", "")).strip()
+            return str(user_input).strip() == meta["expected"], meta
         if q["type"] == "pattern_3x3":
             try:
                 sel = sorted([int(x) for x in (user_input or [])])
@@ -298,6 +351,7 @@ def evaluate_answer(test_type: str, q: Dict[str, Any], user_input: Any, runtime_
             meta.update({"selected": sel, "expected": q.get("positions", [])})
             return correct, meta
         if q["type"] == "paired_associate":
+            meta["expected"] = q.get("answer")
             try:
                 return int(str(user_input).strip()) == int(q.get("answer")), meta
             except Exception:
@@ -305,15 +359,17 @@ def evaluate_answer(test_type: str, q: Dict[str, Any], user_input: Any, runtime_
         return False, meta
     if test_type == "attention":
         if q["type"] == "target_present":
-            expected = "Var" if q.get("answer") else "Yok"
-            return user_input == expected, meta
+            meta["expected"] = "Var" if q.get("answer") else "Yok"
+            return user_input == meta["expected"], meta
         if q["type"] == "target_count":
+            meta["expected"] = q.get("answer", 0)
             try:
                 return int(user_input) == int(q.get("answer", 0)), meta
             except Exception:
                 return False, meta
     if test_type == "stroop":
         meta["condition"] = q.get("condition")
+        meta["expected"] = q.get("answer")
         # Compare user's selection with the ink color (not the word meaning)
         return user_input == q.get("answer"), meta
     return False, meta
@@ -330,6 +386,22 @@ def _ensure_test_state() -> None:
         }
 
 
+def _encode_test_state(state: Dict[str, Any]) -> bytes:
+    engine = state.get("engine")
+    head = struct.pack("?B", bool(state.get("active")), len(state["type"])) + state["type"].encode("ascii")
+    return head + (engine.to_bytes() if engine is not None else b"")
+
+
+def _decode_test_state(data: bytes) -> Dict[str, Any]:
+    active, type_len = struct.unpack_from("?B", data)
+    body = data[2 + type_len:]
+    return {"active": active, "type": data[2:2 + type_len].decode("ascii"),
+            "engine": CognitiveTest.from_bytes(body) if body else None}
+
+
+session_store.register("test_state", _encode_test_state, _decode_test_state)
+
+
 def _start_test(selected: str) -> None:
     engine = CognitiveTest(selected)
     engine.load_questions()
@@ -516,6 +588,9 @@ def _render_phase(engine: CognitiveTest) -> None:
     if engine.phase == "instructions":
         _render_instructions(engine)
         return
+    if engine.phase == "finished":
+        # Results are rendered by the caller; no more questions to show.
+        return
 
     if engine.is_finished_phase():
         if engine.phase == "practice":
@@ -618,15 +693,26 @@ def render_tests_page() -> None:
         if engine.test_type == "stroop":
             st.metric("Stroop Etkisi", f"{metrics.get('stroop_effect', 0.0)} s")
 
-        # Auto-save results to avoid loss
+        # Auto-save results to avoid loss. The engine stays in the session until the save
+        # goes through, so a rate-limited save is retried instead of dropped.
         uid = st.session_state.user.get("uid") if st.session_state.user else None
+        retry_in = None
         if uid and not st.session_state.get("_saved_last_result"):
-            engine.save_results(uid)
-            st.session_state["_saved_last_result"] = True
-            st.success("Sonuçlar kaydedildi.")
-
-        if st.button("🏠 Ana Sayfaya Dön", type="primary", use_container_width=True):
+            try:
+                engine.save_results(uid)
+                st.session_state["_saved_last_result"] = True
+                st.success("Sonuçlar kaydedildi.")
+            except RateLimitExceeded as e:
+                retry_in = min(max(e.retry_after, 0.5), SAVE_RETRY_POLL_SECONDS)
+                st.warning(f"Kısa sürede çok sayıda test kaydedildi. Sonuçlarınız korunuyor ve "
+                           f"yaklaşık {e.retry_after:.0f} sn içinde otomatik olarak kaydedilecek.")
+
+        unsaved = bool(uid) and not st.session_state.get("_saved_last_result")
+        if st.button("🏠 Ana Sayfaya Dön", type="primary", use_container_width=True, disabled=unsaved):
             st.session_state.test_state = {"active": False, "type": selected_code, "engine": None}
             st.session_state.active_page = "Ana Sayfa"
             st.session_state["_saved_last_result"] = False
+            st.rerun()
+        if retry_in is not None:
+            time.sleep(retry_in)
             st.rerun()
\ No newline at end of file
@@ -0,0 +1,131 @@
+import base64
+import json
+import time
+
+import pytest
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt
+
+from services import identity
+from services.identity import AuthError, IdentityToolkitClient, TokenVerifier
+
+PROJECT_ID = "neuroai-test"
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+@pytest.fixture(scope="module")
+def keypair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    public_pem = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                               serialization.PublicFormat.SubjectPublicKeyInfo)
+    return crypt.RSASigner.from_string(private_pem), crypt.RSAVerifier.from_string(public_pem)
+
+
+@pytest.fixture
+def verifier(keypair):
+    v = TokenVerifier(PROJECT_ID)
+    now = time.time()
+    v._verifiers, v._expires_at, v._fetched_at = {"k1": keypair[1]}, now + 3600, now
+    return v
+
+
+def _token(signer, kid="k1", alg="RS256", **overrides):
+    now = int(time.time())
+    claims = {"aud": PROJECT_ID, "iss": f"https://securetoken.google.com/{PROJECT_ID}", "sub": "uid-1",
+              "iat": now, "exp": now + 3600, **overrides}
+    signing_input = f"{_b64(json.dumps({'alg': alg, 'kid': kid}).encode())}.{_b64(json.dumps(claims).encode())}"
+    return f"{signing_input}.{_b64(signer.sign(signing_input.encode()))}"
+
+
+def test_valid_token(keypair, verifier):
+    assert verifier.verify(_token(keypair[0]))["sub"] == "uid-1"
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ({"aud": "other-project"}, "wrong audience"),
+    ({"iss": "https://securetoken.google.com/other-project"}, "wrong issuer"),
+    ({"exp": int(time.time()) - 3600}, "TOKEN_EXPIRED"),
+    ({"sub": ""}, "missing subject"),
+])
+def test_rejected_claims(keypair, verifier, overrides, message):
+    with pytest.raises(AuthError, match=message):
+        verifier.verify(_token(keypair[0], **overrides))
+
+
+def test_unknown_kid(keypair, verifier):
+    with pytest.raises(AuthError, match="unknown key id"):
+        verifier.verify(_token(keypair[0], kid="k2"))
+
+
+def test_unknown_kid_refetches_keys_once_per_window(keypair, verifier, monkeypatch):
+    fetches = []
+
+    def refresh_keys():
+        fetches.append(1)
+        verifier._fetched_at = time.time()
+
+    monkeypatch.setattr(verifier, "_refresh_keys", refresh_keys)
+    verifier._fetched_at = 0.0
+    for _ in range(2):
+        with pytest.raises(AuthError, match="unknown key id"):
+            verifier.verify(_token(keypair[0], kid="k2"))
+    assert len(fetches) == 1
+
+
+def test_bad_signature(verifier):
+    other = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = other.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                              serialization.NoEncryption())
+    with pytest.raises(AuthError, match="bad signature"):
+        verifier.verify(_token(crypt.RSASigner.from_string(pem)))
+
+
+def test_unsigned_token_outside_emulator(keypair, verifier):
+    header, payload, _ = _token(keypair[0]).split(".")
+    header = _b64(json.dumps({"alg": "none", "kid": "k1"}).encode())
+    with pytest.raises(AuthError, match="unexpected algorithm"):
+        verifier.verify(f"{header}.{payload}.")
+
+
+@pytest.mark.parametrize("firebase, expected", [
+    ({"project_id": PROJECT_ID}, PROJECT_ID),
+    ({"service_account_json": json.dumps({"project_id": PROJECT_ID})}, PROJECT_ID),
+])
+def test_verifier_project_id(monkeypatch, firebase, expected):
+    monkeypatch.setattr(identity, "secrets_section", lambda name: firebase)
+    monkeypatch.setattr(identity, "_verifier", None)
+    assert identity.get_token_verifier().project_id == expected
+
+
+def test_verifier_without_project_id(monkeypatch):
+    monkeypatch.setattr(identity, "secrets_section", lambda name: {"service_account_json": "{}"})
+    monkeypatch.setattr(identity, "_verifier", None)
+    with pytest.raises(RuntimeError, match="project_id"):
+        identity.get_token_verifier()
+
+
+def _client_answering(status, body):
+    resp = requests.Response()
+    resp.status_code, resp._content = status, json.dumps(body).encode()
+    client = IdentityToolkitClient("key")
+    client._http.post = lambda *args, **kwargs: resp
+    return client
+
+
+def test_rejected_refresh_is_auth_error():
+    client = _client_answering(400, {"error": {"message": "TOKEN_EXPIRED"}})
+    with pytest.raises(AuthError, match="TOKEN_EXPIRED"):
+        client.refresh("r")
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_transient_refresh_failure_is_not_auth_error(status):
+    with pytest.raises(requests.HTTPError):
+        _client_answering(status, {}).refresh("r")
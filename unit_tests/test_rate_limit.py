@@ -0,0 +1,32 @@
+import pytest
+
+from services.rate_limit import _refill_and_take
+
+
+def test_takes_a_token_from_a_full_bucket():
+    assert _refill_and_take(5.0, 100.0, 100.0, rate=1.0, capacity=5.0) == (True, 4.0, 0.0)
+
+
+def test_empty_bucket_denies_with_retry_after():
+    allowed, tokens, retry_after = _refill_and_take(0.25, 100.0, 100.0, rate=0.5, capacity=5.0)
+    assert not allowed
+    assert tokens == 0.25
+    assert retry_after == pytest.approx(1.5)
+
+
+def test_refill_over_elapsed_time():
+    allowed, tokens, _ = _refill_and_take(0.0, 100.0, 103.0, rate=0.5, capacity=5.0)
+    assert allowed
+    assert tokens == pytest.approx(0.5)
+
+
+def test_refill_is_capped_at_capacity():
+    assert _refill_and_take(2.0, 0.0, 1000.0, rate=1.0, capacity=5.0) == (True, 4.0, 0.0)
+
+
+def test_clock_going_backwards_adds_nothing():
+    assert _refill_and_take(0.5, 100.0, 90.0, rate=1.0, capacity=5.0)[:2] == (False, 0.5)
+
+
+def test_zero_rate_never_refills():
+    assert _refill_and_take(0.0, 0.0, 1e6, rate=0.0, capacity=5.0) == (False, 0.0, float("inf"))
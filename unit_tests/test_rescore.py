@@ -0,0 +1,60 @@
+import pytest
+
+from rescore_results import rescore_chunk
+from tests import WORD_RECALL_DIVISOR
+
+
+def _response(qid, response, expected=None, correct=False, rt=1.0, **meta):
+    if expected is not None:
+        meta["expected"] = expected
+    return {"questionId": qid, "response": response, "correct": correct, "responseTime": rt, "meta": meta}
+
+
+def test_stroop_rescored_from_expected():
+    responses = [
+        _response("stroop_1", "red", "red", correct=False, rt=0.5, condition="congruent"),
+        _response("stroop_2", "blue", "green", correct=True, rt=0.9, condition="incongruent"),
+        _response("stroop_3", "red", "red", correct=True, rt=0.7, condition="incongruent"),
+    ]
+    [(doc_id, metrics, flags)] = rescore_chunk([("d1", "stroop", responses)])
+    assert doc_id == "d1"
+    assert flags == [True, False, True]
+    assert metrics["score"] == 2
+    assert metrics["accuracy"] == 66.67
+    assert metrics["averageResponseTime"] == 0.7
+    assert metrics["analysis.stroopEffect"] == pytest.approx(0.3)
+    assert metrics["analysis.errorRate"] == pytest.approx(33.33)
+
+
+def test_number_answers_and_legacy_flags():
+    responses = [
+        _response("mem_num_1", " 123 ", "123"),
+        # Saved before meta.expected existed: the stored flag stands.
+        _response("mem_num_2", "999", correct=True),
+        _response("att_count_1", "7", 7),
+        _response("att_count_2", "x", 3, correct=True),
+    ]
+    [(_, metrics, flags)] = rescore_chunk([("d2", "attention", responses)])
+    assert flags == [True, True, True, False]
+    assert metrics == {"score": 3, "accuracy": 75.0, "averageResponseTime": 1.0}
+
+
+def test_word_recall_threshold():
+    total = 2 * WORD_RECALL_DIVISOR
+    responses = [
+        _response("mem_words_1", "", recalled=2, total=total),
+        _response("mem_words_2", "", recalled=1, total=total, correct=True),
+    ]
+    [(_, _, flags)] = rescore_chunk([("d3", "memory", responses)])
+    assert flags == [True, False]
+
+
+def test_documents_in_one_chunk_are_scored_separately():
+    out = rescore_chunk([
+        ("a", "stroop", [_response("stroop_1", "red", "red", condition="congruent")]),
+        ("b", "memory", []),
+    ])
+    assert [doc_id for doc_id, _, _ in out] == ["a", "b"]
+    assert out[0][1]["score"] == 1 and out[0][1]["analysis.stroopEffect"] == 0.0
+    assert out[1][1] == {"score": 0, "accuracy": 0.0, "averageResponseTime": 0.0}
+    assert out[1][2] == []